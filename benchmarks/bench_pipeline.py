@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Times the hot paths of the analysis and generation pipeline on synthetic tables, recording rows/s and peak memory.
+# Results can be saved as a baseline and later runs compared against it, to catch regressions before a release.
+# Timings are only comparable between runs on the same machine.
+#
+# Usage (from the repository root):
+#     python -m benchmarks.bench_pipeline [--scale X] [--repeat N] [--only NAME] [--save FILE] [--compare FILE]
+
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import Callable, Dict, List, Tuple
+
+from pytrackdat.analysis import (
+    create_design_file_rows_from_inference,
+    extract_data_from_relation_file,
+    infer_column_type,
+    infer_column_type_from_profile,
+    profile_relation_file,
+)
+from pytrackdat.common import field_to_py_code
+from pytrackdat.generation import create_admin, create_api, create_models, design_to_relations
+
+
+# Relative slowdown (or growth in peak memory) over the baseline which counts as a regression.
+DEFAULT_THRESHOLD = 0.2
+
+SPECIES = ("Esox lucius", "Sander vitreus", "Perca flavescens", "Micropterus salmoides", "Lepomis gibbosus")
+SITES = ("Big Clear Lake", "Buck Lake", "Crow Lake", "Devil Lake", "Lake Opinicon", "Loon Lake")
+
+
+def _date(rng: random.Random) -> str:
+    return "20{:02d}-{:02d}-{:02d}".format(rng.randint(0, 20), rng.randint(1, 12), rng.randint(1, 28))
+
+
+# Table name: (number of rows at scale 1, row generator). The first column of every table is its key.
+TABLES = {
+    # Narrow and long, with a mix of types
+    "narrow": (100000, lambda i, rng: (
+        "S{:07d}".format(i), rng.choice(SPECIES), rng.choice(SITES), rng.choice(("M", "F", "")),
+        str(rng.randint(10, 900)), "{:.2f}".format(rng.uniform(0.1, 40)), _date(rng))),
+
+    # Wide: many short columns
+    "wide": (5000, lambda i, rng: (str(i),) + tuple(
+        str(rng.randint(0, 50)) if c % 3 == 0 else rng.choice(SITES) if c % 3 == 1 else "{:.1f}".format(rng.random())
+        for c in range(199))),
+
+    # High-cardinality text and numbers
+    "high_cardinality": (50000, lambda i, rng: (
+        "{:032x}".format(rng.getrandbits(128)), "Note {} {}".format(i, rng.getrandbits(40)),
+        str(rng.getrandbits(48)), "{:.6f}".format(rng.uniform(-1e6, 1e6)))),
+
+    # Dates in the formats the analyzer recognizes (not times, which generated sites do not support yet)
+    "dated": (50000, lambda i, rng: (
+        str(i), _date(rng),
+        "{:02d}/{:02d}/19{:02d}".format(rng.randint(1, 28), rng.randint(1, 12), rng.randint(0, 99)),
+        "{}/{}/20{:02d}".format(rng.randint(1, 28), rng.randint(1, 12), rng.randint(0, 20)),
+        rng.choice(("", _date(rng))))),
+
+    # Integers and decimals, including human-formatted ones
+    "numeric": (50000, lambda i, rng: (
+        str(i), str(rng.randint(-10000, 10000)), "{:,}".format(rng.randint(1000, 10 ** 9)),
+        "{:.3f}".format(rng.uniform(-1000, 1000)), "{:,.2f}".format(rng.uniform(1000, 10 ** 7)),
+        rng.choice(("", str(rng.randint(0, 5)))))),
+}
+
+
+def generate_table(name: str, path: str, scale: float, seed: int = 0) -> Tuple[Tuple[str, ...], int]:
+    """
+    Writes a synthetic relation file and returns its header and number of rows.
+    """
+
+    n_rows, row_generator = TABLES[name]
+    n_rows = max(int(n_rows * scale), 1)
+    rng = random.Random(seed)
+
+    rows = [row_generator(i, rng) for i in range(n_rows)]
+    header = tuple("{} {}".format(name.title().replace("_", " "), c) for c in range(len(rows[0])))
+
+    with open(path, "w", newline="") as tf:
+        writer = csv.writer(tf)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    return header, n_rows
+
+
+def build_design_file(tables: Dict[str, str]) -> str:
+    """
+    Builds a design file for the given (relation name: file) tables the same way ptd-analyze does, with each table's
+    first column as its key.
+    """
+
+    design_rows = []
+
+    for rn, rf in tables.items():
+        fields, profiles = profile_relation_file(rf)
+        keys = {rn: (field_to_py_code(fields[0]), profiles[0].unique_values)}
+
+        design_rows.append([rn, "new field name", "data type", "nullable?", "null values", "default",
+                            "description", "show in table?", "additional fields..."])
+        for f, profile in zip(fields, profiles):
+            new_name = field_to_py_code(f)
+            design_rows.extend(create_design_file_rows_from_inference(
+                f, new_name, infer_column_type_from_profile(rn, new_name, profile, keys)))
+        design_rows.append([])
+
+    max_length = max(len(r) for r in design_rows)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in design_rows:
+        writer.writerow(r + [""] * (max_length - len(r)))
+
+    return buf.getvalue()
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Tuple[float, int]:
+    """
+    Returns the best time over `repeat` runs of a function, and the peak memory it allocated in an additional run
+    (which is traced separately, since tracing slows allocations down.)
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def run_benchmarks(scale: float, repeat: int, only: List[str]) -> Dict[str, Dict[str, float]]:
+    results = {}
+    directory = tempfile.mkdtemp(prefix="ptd-bench-")
+
+    def record(name: str, fn: Callable[[], object], count: int, unit: str = "rows"):
+        if only and not any(o in name for o in only):
+            return
+
+        seconds, peak = measure(fn, repeat)
+        results[name] = {"seconds": seconds, "{}_per_second".format(unit): count / seconds, "peak_memory": peak}
+        print("    {:<48} {:>9.4f}s {:>14,.0f} {:<8} {:>9.1f} MB".format(
+            name, seconds, count / seconds, unit + "/s", peak / 1024 / 1024))
+
+    try:
+        tables = {}
+
+        for name in TABLES:
+            path = os.path.join(directory, "{}.csv".format(name))
+            header, n_rows = generate_table(name, path, scale)
+            tables[name] = path
+
+            data, _ = extract_data_from_relation_file(path)
+            columns = list(zip(*data))
+            del data
+
+            record("extract_data_from_relation_file/{}".format(name),
+                   lambda: extract_data_from_relation_file(path), n_rows)
+            record("infer_column_type/{}".format(name),
+                   lambda: [infer_column_type(name, field_to_py_code(f), c) for f, c in zip(header, columns)],
+                   n_rows)
+
+        design = build_design_file(tables)
+
+        def parse_design():
+            return design_to_relations(io.StringIO(design), False)
+
+        relations = parse_design()
+        n_fields = sum(len(r.fields) for r in relations)
+
+        # Generation steps scale with the number of fields rather than rows.
+        record("design_to_relations", parse_design, n_fields, "fields")
+        record("create_models", lambda: create_models(relations, False), n_fields, "fields")
+        record("create_admin", lambda: create_admin(relations, "bench", False), n_fields, "fields")
+        record("create_api", lambda: create_api(relations, "bench", False), n_fields, "fields")
+
+    finally:
+        shutil.rmtree(directory)
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> bool:
+    """
+    Prints each benchmark's change from the baseline, and returns whether any got slower or used more memory by more
+    than the threshold.
+    """
+
+    regressed = False
+
+    print("\nComparison with baseline (threshold: +{:.0%}):".format(threshold))
+    for name, result in results.items():
+        if name not in baseline:
+            print("    {:<48} (not in baseline)".format(name))
+            continue
+
+        time_change = result["seconds"] / baseline[name]["seconds"] - 1
+        memory_change = result["peak_memory"] / max(baseline[name]["peak_memory"], 1) - 1
+        flags = [label for label, change in (("TIME", time_change), ("MEMORY", memory_change)) if change > threshold]
+        regressed = regressed or len(flags) > 0
+
+        print("    {:<48} time {:>+7.1%}  memory {:>+7.1%}  {}".format(
+            name, time_change, memory_change, "REGRESSION ({})".format(", ".join(flags)) if flags else "ok"))
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_pipeline")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiplier for the number of rows in each synthetic table (default: 1.)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the best is kept.")
+    parser.add_argument("--only", action="append", default=[], metavar="NAME",
+                        help="Only run benchmarks whose name contains NAME (may be repeated.)")
+    parser.add_argument("--save", metavar="FILE", help="Save the results as a baseline.")
+    parser.add_argument("--compare", metavar="FILE", help="Compare the results with a saved baseline.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown counted as a regression (default: {}.)".format(DEFAULT_THRESHOLD))
+    args = parser.parse_args()
+
+    print("Running pipeline benchmarks (scale {}, best of {}):".format(args.scale, args.repeat))
+    results = run_benchmarks(args.scale, args.repeat, args.only)
+
+    if args.save:
+        with open(args.save, "w") as bf:
+            json.dump({"scale": args.scale, "results": results}, bf, indent=2, sort_keys=True)
+        print("\nSaved baseline to '{}'.".format(args.save))
+
+    if args.compare:
+        with open(args.compare, "r") as bf:
+            baseline = json.load(bf)
+
+        if baseline["scale"] != args.scale:
+            print("Error: The baseline was recorded at scale {}.".format(baseline["scale"]))
+            sys.exit(1)
+
+        if compare(results, baseline["results"], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
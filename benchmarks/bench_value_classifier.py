@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Compares classify_value with the chained re.match cascade it replaced.
+# Usage (from the repository root): python -m benchmarks.bench_value_classifier [number_of_values]
+
+import random
+import re
+import sys
+import timeit
+
+from pytrackdat.common import *
+
+
+def classify_value_cascade(v: str):
+    if re.match(RE_INTEGER, v):
+        return VC_INTEGER, None
+    if re.match(RE_INTEGER_HUMAN, v):
+        return VC_INTEGER_HUMAN, None
+    if re.match(RE_DECIMAL, v.lower()) or re.match(RE_DECIMAL_HUMAN, v.lower()):
+        if "e" in v.lower():
+            return VC_FLOAT, None
+        return VC_DECIMAL if re.match(RE_DECIMAL, v.lower()) else VC_DECIMAL_HUMAN, None
+    for i, df in enumerate(DATE_FORMATS):
+        if re.match(df[0], v):
+            return VC_DATE, i
+    for i, tf in enumerate(TIME_FORMATS):
+        if re.match(tf[0], v):
+            return VC_TIME, i
+    return VC_OTHER, None
+
+
+def random_value(rng: random.Random) -> str:
+    return rng.choice((
+        lambda: str(rng.randint(-100000, 100000)),
+        lambda: "{:,}".format(rng.randint(1000, 10 ** 9)),
+        lambda: "{:.4f}".format(rng.uniform(-1000, 1000)),
+        lambda: "{:.3e}".format(rng.uniform(1, 10 ** 9)),
+        lambda: "{:,.2f}".format(rng.uniform(1000, 10 ** 7)),
+        lambda: "20{:02d}-{:02d}-{:02d}".format(rng.randint(0, 20), rng.randint(1, 12), rng.randint(1, 28)),
+        lambda: "{:02d}/{:02d}/19{:02d}".format(rng.randint(1, 28), rng.randint(1, 12), rng.randint(0, 99)),
+        lambda: "{:02d}:{:02d}".format(rng.randint(0, 23), rng.randint(0, 59)),
+        lambda: rng.choice(("Esox lucius", "Sander vitreus", "F", "M", "U", "NA", "", "true", "n/a")),
+    ))()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(42)
+    values = [random_value(rng) for _ in range(n)]
+
+    mismatches = [v for v in values if classify_value(v) != classify_value_cascade(v)]
+    if mismatches:
+        print("Error: classifiers disagree on {} values, e.g. {}".format(len(mismatches), mismatches[:5]))
+        exit(1)
+
+    cascade_time = min(timeit.repeat(lambda: [classify_value_cascade(v) for v in values], number=1, repeat=3))
+    single_time = min(timeit.repeat(lambda: [classify_value(v) for v in values], number=1, repeat=3))
+
+    print("Classified {} values:".format(n))
+    print("    re.match cascade: {:.3f}s ({:,.0f} values/s)".format(cascade_time, n / cascade_time))
+    print("    classify_value:   {:.3f}s ({:,.0f} values/s)".format(single_time, n / single_time))
+    print("    Speedup: {:.1f}x".format(cascade_time / single_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -30,18 +30,66 @@
 #    text where the choices are way less than the number of rows -> max length text choice field
 #    highly deviant text (excluding blanks) -> text field
 
-# LIMITATION: memory must be enough to ingest the CSV file to analyze
+# Relation files are streamed row by row into one ColumnProfile per column, so memory use scales with the number of
+# columns (and the number of distinct values in key-like columns) rather than with the number of rows.
 
+import argparse
 import csv
 import re
 import sys
 
-from typing import Dict, List, Optional, Sequence, Tuple
-
-from .common import *
+from contextlib import closing
+from decimal import Decimal
 
+from concurrent.futures import ProcessPoolExecutor
+from typing import Container, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
-__all__ = ["infer_column_type", "create_design_file_rows_from_inference", "main"]
+from .analysis_cache import *
+from .common import *
+from .dependencies import *
+from .profiling import timer_from_args
+from .readers import *
+from .sketches import *
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed by the optional columnar backend
+    np = None
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl is only needed to read Excel workbooks
+    openpyxl = None
+
+
+__all__ = [
+    "AnalysisError",
+    "ColumnProfile",
+    "ColumnSketch",
+    "KeyIndex",
+    "infer_column_type_from_profile",
+    "infer_column_type",
+    "create_design_file_rows_from_inference",
+    "feed_rows",
+    "feed_rows_columnar",
+    "profile_rows",
+    "profile_relation_file",
+    "profile_relations",
+    "describe_sample",
+    "RelationAnalysis",
+    "check_analysis_options",
+    "find_relation_key",
+    "infer_relation_types",
+    "analyze_rows",
+    "analyze_files",
+    "find_relation_dependencies",
+    "propose_relation_splits",
+    "main",
+]
+
+
+class AnalysisError(Exception):
+    pass
 
 
 ALTERNATE_THRESHOLD = 0.5
@@ -50,6 +98,44 @@ MAX_CHOICE_LENGTH = 24
 CHAR_FIELD_MAX_LENGTH = 48
 CHAR_FIELD_LENGTH = 128
 
+# Decimal fields get this many more digits before the decimal point than the values seen need, to leave room for later
+# values. Decimal places are capped (values with more of them are rounded), and columns whose values would need more
+# digits than MAX_DECIMAL_DIGITS in all are given a float field instead.
+DECIMAL_HEADROOM_DIGITS = 2
+MAX_DECIMAL_PLACES = 10
+MAX_DECIMAL_DIGITS = 30
+
+# Upper bounds on the number of distinct values a ColumnProfile remembers for each category; the inference rules only
+# compare the sizes of these sets to small constants, so anything past these caps cannot change the result.
+MAX_TRACKED_INTEGER_VALUES = 3
+MAX_TRACKED_NON_NUMERIC_VALUES = 10
+MAX_TRACKED_OTHER_VALUES = 2
+# Columns with more distinct values than this are not considered as possible foreign keys.
+MAX_TRACKED_REFERENCE_VALUES = 2048
+# Longest value a (manual) key can hold; columns with longer values cannot reference another relation's key.
+MAX_KEY_VALUE_LENGTH = 127
+
+# Number of distinct values a ColumnProfile counts before classifying them as a batch.
+MAX_PENDING_VALUES = 4096
+# Number of rows between checks of the pending value counts when profiles are fed whole rows at a time.
+FLUSH_CHECK_INTERVAL = 256
+
+# Number of rows profiled per relation when running in approximate mode without an explicit sample size.
+DEFAULT_SAMPLE_SIZE = 10000
+# Number of distinct values checked exactly for duplicates before a key candidate's values are sketched instead.
+MAX_EXACT_KEY_CHECK_VALUES = 65536
+
+# Number of rows read into each chunk of column arrays by the columnar backend.
+COLUMNAR_CHUNK_ROWS = 16384
+
+# Smallest group of columns worth handing to a separate worker process when analyzing in parallel.
+MIN_COLUMNS_PER_JOB = 4
+# Files are split into ranges of rows of at least this many bytes for parallel analysis.
+MIN_BYTES_PER_JOB = 1024 * 1024
+
+# Suffixes dropped from the name of a determinant field to name the relation split off from its dependents.
+RE_SPLIT_NAME_SUFFIX = re.compile(r"_(name|id|code|number)$")
+
 
 def strip_blank_fields(fields: tuple) -> tuple:
     blank_tail = len(fields)
@@ -59,86 +145,496 @@ def strip_blank_fields(fields: tuple) -> tuple:
     return fields[:blank_tail]
 
 
-def infer_column_type(
-    relation: str,
-    name: str,
-    col: Sequence[str],
-    keys: Optional[Dict[str, Tuple[str, Sequence]]] = None
-) -> Dict:
-    detected_type = "unknown"
-    nullable = False
-    null_values = []
-    choices = []
-    max_length = -1
-    is_key = False
-    include_alternate = False
+class ColumnProfile:
+    """
+    Accumulates the statistics needed to infer the type of a single column, one
+    value at a time. Incoming values are first counted, and each distinct value
+    is then classified once with its count as a weight, so columns that repeat a
+    handful of values only pay for a handful of regex matches. Memory use is
+    bounded by the distinct-value caps below, except for key candidates, whose
+    values must be kept until a duplicate or a blank value rules the column out
+    as a key.
+
+    Once the values seen so far rule out every numeric, date, time, choice and
+    boolean outcome, the column's type is settled: only text or an integer field
+    with an alternate text field remain possible, and which of the two is decided
+    by the share of integer values alone. From then on values are only checked
+    for being numbers: the counts, the numeric ranges and digits, the maximum
+    length and the key and reference checks are kept up to date, but the capped
+    sets and choice counts are not.
+    """
+
+    def __init__(self):
+        self.total = 0
+
+        self.integer_values = 0
+        self.decimal_values = 0
+        self.float_values = 0
+        self.date_values = 0
+        self.time_values = 0
+
+        # Capped sets - the inference rules only ever compare their sizes to small constants.
+        self.integer_values_set = set()
+        self.non_numeric_values = set()
+        self.other_values = set()
+
+        # Value counts for choice / boolean inference; None once there are too many distinct values.
+        self.value_counts = {}  # type: Optional[Dict[str, int]]
+
+        # All values seen so far while the column could still be a key; None once it cannot.
+        self.unique_values = set()  # type: Optional[Set[str]]
+
+        # Distinct non-blank values, for checking whether the column references another relation's key; None once
+        # there are too many.
+        self.reference_values = set()  # type: Optional[Set[str]]
+        self.blank_values = 0
+
+        self.max_seen_length = -1
+        self.max_seen_decimals = -1
+
+        # Range of the integer values, and the most digits before the decimal point of any number, for choosing
+        # compact numeric field types.
+        self.min_integer = None  # type: Optional[int]
+        self.max_integer = None  # type: Optional[int]
+        self.max_integer_digits = 0
+
+        # When the profile was built from a sample of rows: the number of rows in the whole column, a description of
+        # how the column's key candidacy was decided over all of its values, and whether the column is probably a key
+        # even though duplicates could not be ruled out exactly (it is then not inferred as one.)
+        self.population = None  # type: Optional[int]
+        self.key_check = None  # type: Optional[str]
+        self.key_sketch = None  # type: Optional[ColumnSketch]
+        self.probable_key = False
+
+        # Whether the type can no longer change, other than between the alternate integer and text outcomes.
+        self.type_settled = False
+
+        # Values which have been counted but not yet classified.
+        self._pending = {}  # type: Dict[str, int]
+
+    def add(self, str_v: str):
+        pending = self._pending
+        if str_v in pending:
+            pending[str_v] += 1
+        else:
+            pending[str_v] = 1
+            if len(pending) >= MAX_PENDING_VALUES:
+                self.flush()
+
+    def add_counts(self, values: Iterable[str], counts: Iterable[int]):
+        """
+        Adds pre-counted values, as if each value had been added `count` times.
+        """
+
+        pending = self._pending
+        for str_v, count in zip(values, counts):
+            pending[str_v] = pending.get(str_v, 0) + count
+
+        if len(pending) >= MAX_PENDING_VALUES:
+            self.flush()
+
+    def flush(self):
+        """
+        Classifies all pending distinct values, weighting each by the number of times it was seen.
+        """
+
+        add = self._add_settled if self.type_settled else self._add_distinct
+        for str_v, count in self._pending.items():
+            add(str_v, count)
+        self._pending.clear()
+
+        if not self.type_settled:
+            self.type_settled = self._type_is_settled()
+
+    def merge(self, other: "ColumnProfile"):
+        """
+        Adds the values of another (exact) profile of the same column, as if they had been added to this one. The
+        inference rules only depend on the sizes of the capped sets, or on their contents while below the cap, so
+        merged profiles infer the same types as a single profile of all the values.
+        """
+
+        self.flush()
+        other.flush()
+
+        self.total += other.total
+        self.integer_values += other.integer_values
+        self.decimal_values += other.decimal_values
+        self.float_values += other.float_values
+        self.date_values += other.date_values
+        self.time_values += other.time_values
+        self.blank_values += other.blank_values
+
+        for values, other_values, cap in ((self.integer_values_set, other.integer_values_set,
+                                           MAX_TRACKED_INTEGER_VALUES),
+                                          (self.non_numeric_values, other.non_numeric_values,
+                                           MAX_TRACKED_NON_NUMERIC_VALUES),
+                                          (self.other_values, other.other_values, MAX_TRACKED_OTHER_VALUES)):
+            for v in other_values:
+                if len(values) >= cap:
+                    break
+                values.add(v)
+
+        if self.value_counts is not None and other.value_counts is not None:
+            for v, count in other.value_counts.items():
+                self.value_counts[v] = self.value_counts.get(v, 0) + count
+            if len(self.value_counts) > MAX_CHOICES:
+                self.value_counts = None
+        else:
+            self.value_counts = None
+
+        if self.unique_values is not None and other.unique_values is not None and \
+                self.unique_values.isdisjoint(other.unique_values):
+            self.unique_values |= other.unique_values
+        else:
+            self.unique_values = None
 
-    integer_values = 0
-    decimal_values = 0
-    float_values = 0
+        if self.reference_values is not None and other.reference_values is not None:
+            self.reference_values |= other.reference_values
+            if len(self.reference_values) > MAX_TRACKED_REFERENCE_VALUES:
+                self.reference_values = None
+        else:
+            self.reference_values = None
 
-    integer_values_set = set()
+        self.max_seen_length = max(self.max_seen_length, other.max_seen_length)
+        self.max_seen_decimals = max(self.max_seen_decimals, other.max_seen_decimals)
+        self.max_integer_digits = max(self.max_integer_digits, other.max_integer_digits)
+        if other.min_integer is not None:
+            self._add_integer_range(other.min_integer, other.max_integer)
 
-    all_values = set()
-    all_values_counts = {}
+        # Every condition for settling only ever becomes true, so a merge keeps a settled profile settled.
+        self.type_settled = self._type_is_settled()
 
-    date_values = 0
-    time_values = 0
+    def _type_is_settled(self) -> bool:
+        # With 2+ other values, no date or time outcome is left (they need all values, or all but one, to be dates or
+        # times); with 10+ non-numeric values, neither are the non-alternate numeric ones, and the text rule always
+        # applies. Without value counts, the column cannot be a choice or boolean field.
+        return (self.value_counts is None and
+                len(self.non_numeric_values) >= MAX_TRACKED_NON_NUMERIC_VALUES and
+                len(self.other_values) >= MAX_TRACKED_OTHER_VALUES)
 
-    non_numeric_values = set()
-    other_values = set()
+    def _add_settled(self, str_v: str, count: int):
+        self.total += count
 
-    max_seen_length = -1
-    max_seen_decimals = -1
+        self._add_number(str_v, count, classify_value(str_v)[0])
 
-    for v in col:
-        str_v = str(v).strip()
+        self.max_seen_length = max(self.max_seen_length, len(str_v))
 
-        if re.match(RE_INTEGER, str_v) or re.match(RE_INTEGER_HUMAN, str_v):
-            integer_values += 1
-            integer_values_set.add(int(re.sub(RE_NUMBER_GROUP_SEPARATOR, "", str_v)))
+        self._add_reference(str_v, count)
 
-        elif re.match(RE_DECIMAL, str_v.lower()) or re.match(RE_DECIMAL_HUMAN, str_v.lower()):
-            decimal_values += 1
-            max_seen_decimals = max(
-                max_seen_decimals,
-                (len(re.sub(RE_NUMBER_GROUP_SEPARATOR, "", str_v).split(".")[-1].split("e")[0])
-                 if "." in str_v else -1)
-            )
+    def _add_distinct(self, str_v: str, count: int):
+        self.total += count
 
-            if "e" in str_v:
-                float_values += 1
+        value_class, _ = classify_value(str_v)
 
-        else:
-            non_numeric_values.add(str_v)
+        if not self._add_number(str_v, count, value_class):
+            if len(self.non_numeric_values) < MAX_TRACKED_NON_NUMERIC_VALUES:
+                self.non_numeric_values.add(str_v)
+
+            if value_class == VC_DATE:
+                self.date_values += count
 
-            if any(re.match(df[0], str_v) is not None for df in DATE_FORMATS):
-                date_values += 1
+            elif value_class == VC_TIME:
+                self.time_values += count
 
-            elif any(re.match(df[0], str_v) is not None for df in TIME_FORMATS):
-                time_values += 1
+            elif len(self.other_values) < MAX_TRACKED_OTHER_VALUES:
+                self.other_values.add(str_v)
 
+        self.max_seen_length = max(self.max_seen_length, len(str_v))
+
+        if self.value_counts is not None:
+            if str_v in self.value_counts:
+                self.value_counts[str_v] += count
+            elif len(self.value_counts) < MAX_CHOICES:
+                self.value_counts[str_v] = count
+            else:
+                # Too many distinct values for a choice field, stop counting.
+                self.value_counts = None
+
+        self._add_reference(str_v, count)
+
+    def _add_number(self, str_v: str, count: int, value_class: str) -> bool:
+        """
+        Updates the counts and ranges of numeric values with a value, if it is a number. Returns whether it was.
+        """
+
+        if value_class in VC_INTEGER_CLASSES:
+            self.integer_values += count
+            n = int(str_v) if value_class == VC_INTEGER else int(re.sub(RE_NUMBER_GROUP_SEPARATOR, "", str_v))
+            self._add_integer_range(n, n)
+            self.max_integer_digits = max(self.max_integer_digits, len(str(abs(n))))
+            if len(self.integer_values_set) < MAX_TRACKED_INTEGER_VALUES:
+                self.integer_values_set.add(n)
+            return True
+
+        if value_class in VC_DECIMAL_CLASSES:
+            self.decimal_values += count
+
+            # Digits before and after the decimal point, once any exponent is applied
+            _, digits, exponent = Decimal(re.sub(RE_NUMBER_GROUP_SEPARATOR, "", str_v)).as_tuple()
+            self.max_seen_decimals = max(self.max_seen_decimals, -exponent if exponent < 0 else 0)
+            self.max_integer_digits = max(self.max_integer_digits, len(digits) + exponent)
+
+            if value_class == VC_FLOAT:
+                self.float_values += count
+            return True
+
+        return False
+
+    def _add_integer_range(self, low: int, high: int):
+        if self.min_integer is None:
+            self.min_integer, self.max_integer = low, high
+        else:
+            self.min_integer = min(self.min_integer, low)
+            self.max_integer = max(self.max_integer, high)
+
+    def _add_reference(self, str_v: str, count: int):
+        if self.unique_values is not None:
+            if count > 1 or str_v == "" or str_v in self.unique_values:
+                self.unique_values = None
             else:
-                other_values.add(str_v)
+                self.unique_values.add(str_v)
+
+        if str_v == "":
+            self.blank_values += count
+        elif self.reference_values is not None:
+            if len(str_v) > MAX_KEY_VALUE_LENGTH:
+                self.reference_values = None
+            elif len(self.reference_values) < MAX_TRACKED_REFERENCE_VALUES:
+                self.reference_values.add(str_v)
+            elif str_v not in self.reference_values:
+                self.reference_values = None
+
+
+class ColumnSketch:
+    """
+    Summary of every value in a column, used to decide key candidacy when the
+    column's type is only inferred from a sample of its rows. The first values are
+    checked exactly; past that, a HyperLogLog sketch estimates the number of
+    distinct values, and a Bloom filter detects duplicates (it never misses one,
+    but may report false ones.) Sketching stops as soon as the column is proven
+    not to be a key.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.has_blank = False
+        self.has_duplicate = False
+
+        self._exact = set()  # type: Optional[Set[str]]
+        self.distinct = None  # type: Optional[HyperLogLog]
+        self.duplicates = None  # type: Optional[BloomFilter]
+
+    @property
+    def live(self) -> bool:
+        return not (self.has_blank or self.has_duplicate)
+
+    def add(self, str_v: str) -> bool:
+        """
+        Adds a value to the sketch. Returns False once the column can no longer be a key.
+        """
+
+        if str_v == "":
+            self.has_blank = True
+
+        elif self._exact is not None:
+            if str_v in self._exact:
+                self.has_duplicate = True
+            else:
+                self._exact.add(str_v)
+                if len(self._exact) >= MAX_EXACT_KEY_CHECK_VALUES:
+                    self._start_sketching()
+
+        else:
+            h = stable_hash(str_v)
+            self.distinct.add(h)
+            self.duplicates.add(h)
+
+        if not self.live:
+            self._exact = None
+            self.distinct = None
+            self.duplicates = None
+            return False
+
+        return True
+
+    def _start_sketching(self):
+        self.distinct = HyperLogLog()
+        self.duplicates = BloomFilter()
+        for v in self._exact:
+            h = stable_hash(v)
+            self.distinct.add(h)
+            self.duplicates.add(h)
+        self._exact = None
+
+    def __contains__(self, str_v: str) -> bool:
+        if self._exact is not None:
+            return str_v in self._exact
+        if self.duplicates is not None:
+            return stable_hash(str_v) in self.duplicates
+        return False
+
+    @property
+    def exactly_unique(self) -> bool:
+        # A Bloom filter has no false negatives, so no hits means no duplicates.
+        return self.live and (self.duplicates is None or self.duplicates.hits == 0)
+
+    @property
+    def possibly_unique(self) -> bool:
+        return self.exactly_unique or (
+            self.live and
+            self.duplicates.consistent_with_unique() and
+            self.distinct.estimate() >= self.total * (1 - 3 * self.distinct.relative_error))
+
+    def describe(self) -> str:
+        if self.has_blank:
+            return "has blank values"
+        if self.has_duplicate:
+            return "has duplicate values"
+        if self.exactly_unique:
+            return "no duplicates in all {:,} rows".format(self.total)
+        return "~{:,.0f} distinct values in {:,} rows (+/- {:.1%})".format(
+            self.distinct.estimate(), self.total, 3 * self.distinct.relative_error)
+
+
+def describe_sample(profile: ColumnProfile, is_key: bool = False) -> Optional[str]:
+    """
+    Describes how far a profile built from a sample can be trusted, or returns None if the profile is exact.
+    """
+
+    if profile.population is None or profile.population <= profile.total:
+        return None
+
+    # Rule of three: if something never happens in n random draws, with 95% confidence it happens in under 3/n of the
+    # population.
+    note = "inferred from a random sample of {:,} of {:,} rows; 95% confidence that under {:.2%} of values differ " \
+           "from the sample".format(profile.total, profile.population, min(3 / max(profile.total, 1), 1))
+
+    if is_key and profile.key_check is not None:
+        note += "; key: {}".format(profile.key_check)
+    elif profile.probable_key:
+        note += "; probably a key ({}), but duplicates could not be ruled out: set the type to '{}' if every value " \
+                "is unique".format(profile.key_check, DT_MANUAL_KEY)
+
+    return note
+
+
+class KeyIndex:
+    """
+    Index of the key values of every relation, used to find columns which refer to
+    another relation's key. Keys whose values are all known are merged into a
+    single hash table mapping each value to a bitmask of the relations whose key
+    contains it, so a column is checked against every relation at once, one value
+    at a time, stopping at the first value no relation contains. Keys which were
+    only sketched (in approximate mode) are probed through their Bloom filters.
+    """
+
+    def __init__(self, keys: Dict[str, Tuple[str, Container]]):
+        self.relations = list(keys)
+        self._relations_by_value = {}  # type: Dict[str, int]
+        self._filters = []  # type: List[Tuple[int, Container]]
+
+        for i, (_, values) in enumerate(keys.values()):
+            if isinstance(values, ColumnSketch):
+                self._filters.append((1 << i, values))
+                continue
+
+            for v in values:
+                self._relations_by_value[v] = self._relations_by_value.get(v, 0) | (1 << i)
+
+    def find_references(self, relation: str, values: Iterable[str]) -> List[str]:
+        """
+        Returns the (other) relations whose keys contain every one of the given values.
+        """
+
+        candidates = (1 << len(self.relations)) - 1
+        if relation in self.relations:
+            candidates &= ~(1 << self.relations.index(relation))
+
+        found_value = False
+
+        for v in values:
+            found_value = True
+            mask = self._relations_by_value.get(v, 0)
+            for bit, values_filter in self._filters:
+                if candidates & bit and v in values_filter:
+                    mask |= bit
+
+            candidates &= mask
+            if not candidates:
+                return []
+
+        return [r for i, r in enumerate(self.relations) if candidates & (1 << i)] if found_value else []
+
+
+def infer_foreign_key(relation: str, name: str, profile: ColumnProfile, key_index: KeyIndex) -> Optional[str]:
+    """
+    Returns the relation whose key the column refers to, if any.
+    """
+
+    if profile.reference_values is None:
+        return None
+
+    # Columns with few distinct values (integers, booleans, short codes, dates) are contained in other keys all too
+    # easily; also require the column's name to contain the relation's name as whole words, e.g. site_id or site_name
+    # for site but not website_count.
+    targets = [t for t in key_index.find_references(relation, profile.reference_values)
+               if re.search(r"(^|_){}(_|$)".format(re.escape(field_to_py_code(t))), field_to_py_code(name))]
+
+    return targets[0] if targets else None
 
-        max_seen_length = max(max_seen_length, len(str_v))
-        all_values.add(str_v)
-        all_values_counts[str_v] = all_values_counts.get(str_v, 0) + 1
+
+def infer_column_type_from_profile(
+    relation: str,
+    name: str,
+    profile: ColumnProfile,
+    keys: Optional[Dict[str, Tuple[str, Container]]] = None,
+    key_index: Optional[KeyIndex] = None
+) -> Dict:
+    detected_type = "unknown"
+    nullable = False
+    null_values = []
+    choices = []
+    max_length = -1
+    is_key = False
+    include_alternate = False
+
+    profile.flush()
+
+    is_key_column = profile.unique_values is not None and (keys is None or keys.get(relation, (None, None))[0] == name)
+    foreign_key_target = (infer_foreign_key(relation, name, profile, key_index)
+                          if key_index is not None and not is_key_column else None)
+
+    total = profile.total
+    integer_values = profile.integer_values
+    decimal_values = profile.decimal_values
+    float_values = profile.float_values
+    date_values = profile.date_values
+    time_values = profile.time_values
+
+    integer_values_set = profile.integer_values_set
+    non_numeric_values = profile.non_numeric_values
+    other_values = profile.other_values
+
+    max_seen_length = profile.max_seen_length
+    max_seen_decimals = profile.max_seen_decimals
 
     # Keys:
     #  - If keys aren't specified or this field is in fact the key, allow the key type to be inferred.
 
-    if len(all_values) == len(col) and "" not in all_values and (keys is None or
-                                                                 keys.get(relation, (None, None))[0] == name):
+    if is_key_column:
         detected_type = DT_MANUAL_KEY
         nullable = False
         is_key = True
 
-    # TODO: Infer foreign keys for non-integers??? When do we infer foreign keys vs. ints?
+    # Foreign keys:
+
+    elif foreign_key_target is not None:
+        detected_type = DT_FOREIGN_KEY
+        nullable = profile.blank_values > 0
 
     # Integers:
 
-    elif integer_values == len(col):
+    elif integer_values == total:
         detected_type = DT_INTEGER
         nullable = False
 
@@ -148,30 +644,33 @@ def infer_column_type(
         nullable = True
         # TODO: DO WE WANT NULL VALUES HERE?
 
-    elif integer_values > 0 and len(non_numeric_values) > 1 and ((integer_values / len(col)) >= ALTERNATE_THRESHOLD):
+    elif integer_values > 0 and len(non_numeric_values) > 1 and ((integer_values / total) >= ALTERNATE_THRESHOLD):
         detected_type = DT_INTEGER
         nullable = True
         include_alternate = True
 
     # Decimals: TODO: more
 
-    elif decimal_values > 0 and len(non_numeric_values) in (0, 1):
-        # Integer or decimal values -> use a decimal field.
-        # TODO: Find number of digits!!!
+    elif decimal_values > 0 and len(non_numeric_values) in (0, 1) and \
+            profile.max_integer_digits + DECIMAL_HEADROOM_DIGITS + min(max_seen_decimals, MAX_DECIMAL_PLACES) <= \
+            MAX_DECIMAL_DIGITS:
+        # Integer or decimal values -> use a decimal field, with room for the values seen (see MAX_DECIMAL_DIGITS.)
         detected_type = DT_DECIMAL
         nullable = (len(non_numeric_values) == 1)
-        max_length = max_seen_length + max_seen_decimals + 4
+        max_seen_decimals = min(max_seen_decimals, MAX_DECIMAL_PLACES)
+        max_length = profile.max_integer_digits + DECIMAL_HEADROOM_DIGITS + max_seen_decimals
 
     # Floats: TODO: more
 
-    elif float_values > 0 and len(non_numeric_values) in (0, 1):
-        # Integer, decimal or float values in column -> use a float field.
+    elif decimal_values > 0 and len(non_numeric_values) in (0, 1):
+        # Integer, decimal or float values in column -> use a float field; also for decimal values too large or too
+        # precise for a decimal field.
         detected_type = DT_FLOAT
         nullable = (len(non_numeric_values) == 1)
 
     # Dates:
 
-    elif date_values == len(col):
+    elif date_values == total:
         detected_type = DT_DATE
         nullable = False
         # TODO: Detect date format and make additional settings with date format
@@ -183,7 +682,7 @@ def infer_column_type(
 
     # Times:
 
-    elif time_values == len(col):
+    elif time_values == total:
         detected_type = DT_TIME
         nullable = False
         # TODO: Detect time format and make additional settings with time format
@@ -195,11 +694,13 @@ def infer_column_type(
 
     # Enums:
 
-    elif (len([a for a in all_values if a.strip() != ""]) < MAX_CHOICES and max_seen_length < MAX_CHOICE_LENGTH and
-          sum(v for a, v in all_values_counts.items() if a.strip() != "") >= 2 * len(all_values)):
+    elif (profile.value_counts is not None and
+          len([a for a in profile.value_counts if a != ""]) < MAX_CHOICES and
+          max_seen_length < MAX_CHOICE_LENGTH and
+          sum(v for a, v in profile.value_counts.items() if a != "") >= 2 * len(profile.value_counts)):
         detected_type = DT_TEXT
-        nullable = ("" in all_values)
-        choices = sorted(all_values)
+        nullable = ("" in profile.value_counts)
+        choices = sorted(profile.value_counts)
         in_choices = {c.lower() for c in choices}
         max_length = max_seen_length * 2
 
@@ -213,7 +714,7 @@ def infer_column_type(
 
     # TODO: I don't like this logic
 
-    elif integer_values < max(len(col) / 10, 10) or len(non_numeric_values) >= 10:
+    elif integer_values < max(total / 10, 10) or len(non_numeric_values) >= 10:
         detected_type = DT_TEXT
         nullable = False
         if max_seen_length <= CHAR_FIELD_MAX_LENGTH and "note" not in name and "comment" not in name:
@@ -227,12 +728,29 @@ def infer_column_type(
         "max_length": max_length,
         "is_key": is_key,
         "include_alternate": include_alternate,
+        "foreign_key_target": foreign_key_target,
 
-        "max_seen_decimals": max_seen_decimals
+        "max_seen_decimals": max_seen_decimals,
+        "min_value": profile.min_integer,
+        "max_value": profile.max_integer,
     }
 
 
-def create_design_file_rows_from_inference(old_name: str, new_name: str, inference: Dict) -> List[List[str]]:
+def infer_column_type(
+    relation: str,
+    name: str,
+    col: Iterable[str],
+    keys: Optional[Dict[str, Tuple[str, Container]]] = None,
+    key_index: Optional[KeyIndex] = None
+) -> Dict:
+    profile = ColumnProfile()
+    for v in col:
+        profile.add(str(v).strip())
+    return infer_column_type_from_profile(relation, name, profile, keys, key_index)
+
+
+def create_design_file_rows_from_inference(old_name: str, new_name: str, inference: Dict,
+                                           note: Optional[str] = None) -> List[List[str]]:
     f_type = inference["detected_type"]
 
     choices = (inference["choices"] if len(inference["choices"]) > 0 and inference["detected_type"] != DT_BOOLEAN
@@ -245,18 +763,23 @@ def create_design_file_rows_from_inference(old_name: str, new_name: str, inferen
         nullable=inference["nullable"],  # Whether the field is nullable
         null_values=inference["null_values"],  # What value(s) will become null in the database
         default="",  # The default value for the field (optional, null/blank if left empty)
-        description="!fill me in!",  # Field description
+        description="!fill me in!" + (" ({})".format(note) if note else ""),  # Field description
         show_in_table=(f_type not in {DT_TEXT, *GIS_DATA_TYPES} or
                        (f_type == DT_TEXT and (len(inference["choices"]) > 0 or inference["max_length"] > 0))),
         additional_fields=(
             # IF DECIMAL: Max length and decimal placement:
             *((inference["max_length"], inference["max_seen_decimals"]) if inference["detected_type"] == DT_DECIMAL
               else ()),
+            # IF INTEGER: Range of values:
+            *((inference["min_value"], inference["max_value"])
+              if inference["detected_type"] == DT_INTEGER and inference["min_value"] is not None else ()),
             # IF TEXT/ENUM: Max length:
             *((inference["max_length"],) if inference["detected_type"] == DT_TEXT and inference["max_length"] > 0
               else ()),
             # IF ENUM: Choices:
             *(("{} ".format(DESIGN_SEPARATOR).join(choices),) if choices is not None else ()),
+            # IF FOREIGN KEY: Target relation:
+            *((inference["foreign_key_target"],) if inference["detected_type"] == DT_FOREIGN_KEY else ()),
         ),
         choices=choices,  # Not used here?
     )
@@ -268,145 +791,757 @@ def create_design_file_rows_from_inference(old_name: str, new_name: str, inferen
     return design_file_rows
 
 
-def extract_data_from_relation_file(rf):
-    data = []
-    with open(rf, "r", encoding="utf-8-sig") as ff:
-        data_reader = csv.reader(ff, delimiter=",")
-
-        # TODO: strip or no? might cause errors but could handle in import.
-        fields = strip_blank_fields(tuple(f for f in next(data_reader)))
-
-        if len(fields) == 0:
-            exit_with_error("Error: No fields detected")
-
-        d = next(data_reader)
-        while True:
-            try:
-                row = [x.strip() for x in d]
-                if any(c != "" for c in row):
-                    # Skip blank rows, they're likely CSV artifacts
-                    data.append(row)
-                d = next(data_reader)
-            except StopIteration:
-                break
-
-        if fields is None:
-            fields = []
+def read_relation_header(data_reader: Iterator[List[str]]) -> Tuple[str, ...]:
+    # TODO: strip or no? might cause errors but could handle in import.
+    fields = strip_blank_fields(tuple(f for f in next(data_reader, ())))
 
-    return data, fields
+    if len(fields) == 0:
+        raise AnalysisError("Error: No fields detected")
 
+    return fields
 
-def main():
-    print_license()
 
-    args = sys.argv[1:]
+def iter_non_blank_rows(data_reader: Iterator[List[str]]) -> Iterator[List[str]]:
+    # Skip blank rows, they're likely CSV artifacts
+    return (d for d in data_reader if any(c.strip() for c in d))
 
-    if len(args) % 2 != 1 or len(args) < 3:
-        print("Usage: ptd-analyze design_out.csv relation_1_name file1.csv [relation_2_name file2.csv] ...")
-        exit(1)
 
-    design_file = args[0]  # Name for output
-    relations = tuple(zip(args[1::2], map(str.lower, args[2::2])))  # Split pairs of file name, relation name
+def iter_relation_rows(data_reader: Iterator[List[str]]) -> Iterator[List[str]]:
+    for d in data_reader:
+        row = [x.strip() for x in d]
+        if any(c != "" for c in row):
+            # Skip blank rows, they're likely CSV artifacts
+            yield row
 
-    if len(set(args[1::2])) < len(args[1::2]):
-        print("Error: You cannot use the same relation name(s) for more than one table:")
 
-        duplicates = set(r for r in args[1::2] if len([r2 for r2 in args[1::2] if r2 == r]) > 1)
-        for r in duplicates:
-            print("\t{}".format(r))
+def read_relation_file_rows(rf, start: int = 0, end: Optional[int] = None) -> Iterator[List[str]]:
+    """
+    Parses the rows of a relation file in the byte range [start, end), which must begin and end on record boundaries
+    (the header row is included if start is 0.) Compressed files are decompressed as they are read, and workbook sheets
+    (see split_sheet_path) are streamed; these can only be read as a whole.
+    """
 
-        exit(1)
+    if is_workbook_path(rf):
+        if start != 0:
+            raise ValueError("Cannot read a byte range of workbook '{}'".format(rf))
 
-    keys = {}
+        try:
+            yield from iter_workbook_rows(rf)
+        except ValueError as e:  # Missing sheet
+            raise AnalysisError("Error: {}".format(e))
 
-    # Pass 1: Find key candidates and possible foreign keys
-    for rn, rf in relations:
-        print("Finding keys for relation '{}'...".format(rn))
+        return
 
-        data, fields = extract_data_from_relation_file(rf)
+    if detect_file_compression(rf) is not None:
+        if start != 0:
+            raise ValueError("Cannot read a byte range of compressed file '{}'".format(rf))
 
-        for i, f in enumerate(fields):
-            new_name = field_to_py_code(f)
+        with open_text(rf) as ff:
+            yield from csv.reader(ff, delimiter=",")
 
-            col = tuple(d[i] for d in data)
-            inference = infer_column_type(rn, new_name, col)
+        return
 
-            if inference["is_key"]:
-                keys[rn] = (new_name, col)
-                print("    Field '{}' identified as a key".format(new_name))
-                break
+    with MappedCSVFile(rf) as mf:
+        yield from mf.iter_rows(start, end)
 
-        print()
 
-    # Pass 2: Determine other column data types
-    design_file_rows = []
-    for rn, rf in relations:
-        print("Detecting types for fields in relation '{}'...".format(rn))
+def extract_data_from_relation_file(rf):
+    with closing(read_relation_file_rows(rf)) as data_reader:
+        fields = read_relation_header(data_reader)
+        data = list(iter_relation_rows(data_reader))
+
+    return data, fields
+
+
+def feed_rows(profiles: List[ColumnProfile], rows: Iterable[List[str]]):
+    """
+    Adds each row's values to the matching column profiles. Equivalent to calling ColumnProfile.add for every cell, but
+    counts values directly into the profiles' pending tables to avoid a method call per cell.
+    """
+
+    # noinspection PyProtectedMember
+    pending_tables = [p._pending for p in profiles]
+    n_fields = len(profiles)
+
+    for i, row in enumerate(rows, 1):
+        if len(row) < n_fields:
+            # Treat missing trailing cells as blank values
+            row.extend([""] * (n_fields - len(row)))
+
+        for pending, v in zip(pending_tables, row):
+            pending[v] = pending.get(v, 0) + 1
+
+        if i % FLUSH_CHECK_INTERVAL == 0:
+            for p, pending in zip(profiles, pending_tables):
+                if len(pending) >= MAX_PENDING_VALUES:
+                    p.flush()
 
-        data, fields = extract_data_from_relation_file(rf)
 
-        design_file_rows.append([rn, "new field name", "data type", "nullable?", "null values", "default",
-                                 "description", "show in table?", "additional fields..."])
+def sample_rows(rows: Iterable[List[str]], n_fields: int, sample_size: int) \
+        -> Tuple[List[List[str]], List[ColumnSketch]]:
+    """
+    Keeps a uniform random sample of (non-blank, unstripped) rows for type inference, while sketching every value of
+    every column which could still be a key.
+    """
 
-        new_design_file_rows = []
+    sample = ReservoirSample(sample_size)
+    sketches = [ColumnSketch() for _ in range(n_fields)]
+    live = list(enumerate(sketches))
 
-        if rn not in keys:
-            print("\n    Warning: No primary key found for relation '{}'. If you have a field you "
-                  "\n             think should be the primary key (row identifier), this is an indication"
-                  "\n             that there may be duplicate values. \n"
-                  "\n             Adding an automatic key instead....".format(rn))  # TODO
+    for d in rows:
+        if len(d) < n_fields:
+            d.extend([""] * (n_fields - len(d)))
 
+        if not all([sketch.add(d[i].strip()) for i, sketch in live]):
+            live = [(i, sketch) for i, sketch in live if sketch.live]
+
+        sample.add(d)
+
+    for sketch in sketches:
+        sketch.total = sample.seen
+
+    # Only sampled rows need to be stripped.
+    return [[x.strip() for x in d] for d in sample.items], sketches
+
+
+def iter_chunks(rows: Iterable[List[str]], chunk_rows: int) -> Iterator[List[List[str]]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def feed_rows_columnar(profiles: List[ColumnProfile], rows: Iterable[List[str]],
+                       chunk_rows: int = COLUMNAR_CHUNK_ROWS):
+    """
+    Columnar equivalent of feed_rows for unstripped rows, using NumPy. Rows are read in fixed-size chunks into one
+    array per column; each column is then stripped, has blank rows removed and has its distinct values counted with
+    whole-array operations, so only the distinct values of each chunk reach the interpreter.
+    """
+
+    n_fields = len(profiles)
+
+    for chunk in iter_chunks(rows, chunk_rows):
+        table = np.array([d if len(d) == n_fields else (d + [""] * n_fields)[:n_fields] for d in chunk], dtype=object)
+        columns = [np.char.strip(table[:, i].astype(str)) for i in range(n_fields)]
+
+        # Skip blank rows, they're likely CSV artifacts; like iter_non_blank_rows, this looks at the whole row, so rows
+        # with values only past the last field are not skipped.
+        non_blank = np.logical_or.reduce([c != "" for c in columns])
+        overflow = [i for i, d in enumerate(chunk) if len(d) > n_fields and any(c.strip() for c in d[n_fields:])]
+        if overflow:
+            non_blank[overflow] = True
+
+        for profile, column in zip(profiles, columns):
+            values, counts = np.unique(column[non_blank], return_counts=True)
+            profile.add_counts(values.tolist(), counts.tolist())
+
+
+def read_relation_file_header(rf) -> Tuple[str, ...]:
+    with closing(read_relation_file_rows(rf)) as data_reader:
+        return read_relation_header(data_reader)
+
+
+def profile_rows(rows: Iterable[List[str]], n_fields: int, sample_size: Optional[int] = None,
+                 columns: Optional[Tuple[int, int]] = None, columnar: bool = False,
+                 resume: Optional[List[ColumnProfile]] = None) -> List[ColumnProfile]:
+    """
+    Streams (unstripped) rows of string values into one ColumnProfile per field, or per field in the given (start,
+    stop) range of columns, without keeping any rows in memory. Blank rows are skipped. See profile_relation_file for
+    the other options.
+    """
+
+    start, stop = columns if columns is not None else (0, n_fields)
+    profiles = resume if resume is not None else [ColumnProfile() for _ in range(start, stop)]
+
+    if columnar and sample_size is None and columns is None:
+        feed_rows_columnar(profiles, rows)
+        return profiles
+
+    # Blank rows are detected across all columns, so that every column group sees the same rows.
+    rows = iter_non_blank_rows(rows)
+    if columns is not None:
+        rows = (d[start:stop] for d in rows)
+
+    if columnar and sample_size is None:
+        feed_rows_columnar(profiles, rows)
+        return profiles
+
+    if sample_size is None:
+        feed_rows(profiles, ([x.strip() for x in d] for d in rows))
+        return profiles
+
+    sample, sketches = sample_rows(rows, len(profiles), sample_size)
+    feed_rows(profiles, sample)
+
+    for profile, sketch in zip(profiles, sketches):
+        profile.flush()
+        profile.population = sketch.total
+        profile.key_check = sketch.describe()
+
+        # A duplicate in the sample is a duplicate in the column, but the sample can miss duplicates; defer to the
+        # sketch in that case. Only a sketch which rules duplicates out exactly makes the column a key: once its Bloom
+        # filter fills up, the distinct value estimate alone cannot tell a key from a column with a few duplicates.
+        if profile.unique_values is not None and profile.population > profile.total and not sketch.exactly_unique:
+            profile.probable_key = sketch.possibly_unique
+            profile.unique_values = None
+
+        if profile.unique_values is not None and profile.population > profile.total:
+            # The sample only holds some of the key's values; keep the sketch to look up the rest.
+            profile.key_sketch = sketch
+
+    return profiles
+
+
+def profile_relation_file(rf, sample_size: Optional[int] = None, columns: Optional[Tuple[int, int]] = None,
+                          columnar: bool = False, byte_range: Optional[Tuple[int, int]] = None,
+                          resume: Optional[List[ColumnProfile]] = None) \
+        -> Tuple[Tuple[str, ...], List[ColumnProfile]]:
+    """
+    Streams a relation file into one ColumnProfile per field without keeping any rows in memory. If a sample size is
+    given, types are only inferred from a random sample of that many rows, and key candidacy is decided from sketches.
+    If a (start, stop) range of columns is given, only those columns are profiled. The columnar backend (which needs
+    NumPy) gives the same profiles as the default row-by-row one. If a (start, end) byte range starting at a record
+    boundary is given, only the rows in it are read, and are added to the given profiles if any.
+    """
+
+    if byte_range is None or byte_range[0] == 0:
+        data_reader = read_relation_file_rows(rf, 0, byte_range[1] if byte_range is not None else None)
+        fields = read_relation_header(data_reader)
+    else:
+        fields = read_relation_file_header(rf)
+        data_reader = read_relation_file_rows(rf, *byte_range)
+
+    with closing(data_reader):
+        return fields, profile_rows(data_reader, len(fields), sample_size, columns, columnar, resume)
+
+
+def profile_relations(relations: Sequence[Tuple[str, str]], sample_size: Optional[int] = None, jobs: int = 1,
+                      columnar: bool = False, cache: Optional[AnalysisCache] = None) \
+        -> Dict[str, Tuple[Tuple[str, ...], List[ColumnProfile]]]:
+    """
+    Profiles every (relation name, file) pair, returning the fields and column profiles of each relation in order.
+    With more than one job, relation files are profiled concurrently in a process pool. Long files are split into
+    ranges of rows whose profiles are merged, or for sampled analysis (where samples of parts of a file cannot be
+    combined), wide files are split into groups of columns; the results are identical either way. If a cache is given
+    (which cannot be combined with sampling), only the rows appended to each file since it was cached are read, and
+    the cache is updated with the new profiles.
+    """
+
+    # Byte range still to profile and cached fields and profiles of the rest, for each relation
+    resume_points = {rn: cache.resume_point(rf) if cache is not None else (0, None, None) for rn, rf in relations}
+
+    to_profile = [(rn, rf) for rn, rf in relations if resume_points[rn][0] != resume_points[rn][1]]
+    results = {}
+
+    if jobs <= 1:
+        for rn, rf in to_profile:
+            start, end, cached = resume_points[rn]
+            results[rn] = profile_relation_file(rf, sample_size, None, columnar,
+                                                (start, end) if end is not None else None,
+                                                cached[1] if cached is not None else None)
+
+    else:
+        splits_per_relation = max(1, jobs // max(len(to_profile), 1))
+        tasks = []  # Relation name, file, column range, byte range and profiles to resume
+
+        for rn, rf in to_profile:
+            if sample_size is not None:
+                n_fields = len(read_relation_file_header(rf))
+                n_groups = max(1, min(splits_per_relation, n_fields // MIN_COLUMNS_PER_JOB))
+                bounds = [n_fields * g // n_groups for g in range(n_groups + 1)]
+                tasks.extend((rn, rf, (bounds[g], bounds[g + 1]), None, None) for g in range(n_groups))
+                continue
+
+            start, end, cached = resume_points[rn]
+
+            if is_workbook_path(rf) or detect_file_compression(rf) is not None:
+                # Compressed files and workbooks can only be read from the start.
+                ranges = [(start, end)] if end is not None else [None]
+            else:
+                with MappedCSVFile(rf) as mf:
+                    end = mf.size if end is None else end
+                    ranges = mf.split(max(1, min(splits_per_relation, (end - start) // MIN_BYTES_PER_JOB)), start,
+                                      end)
+
+            # Cached profiles continue with the first range; the profiles of the others are merged into them.
+            tasks.extend((rn, rf, None, byte_range, cached[1] if cached is not None and i == 0 else None)
+                         for i, byte_range in enumerate(ranges))
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [(rn, columns, executor.submit(profile_relation_file, rf, sample_size, columns, columnar,
+                                                     byte_range, resume))
+                       for rn, rf, columns, byte_range, resume in tasks]
+
+            # Parts of each file were submitted in order, so concatenating the profiles of column groups restores the
+            # original column order.
+            for rn, columns, future in futures:
+                fields, profiles = future.result()
+
+                if rn not in results:
+                    results[rn] = (fields, profiles)
+                elif columns is not None:
+                    results[rn][1].extend(profiles)
+                else:
+                    for profile, range_profile in zip(results[rn][1], profiles):
+                        profile.merge(range_profile)
+
+    for rn, rf in relations:
+        start, end, cached = resume_points[rn]
+
+        if rn not in results:
+            # Unchanged since it was cached
+            results[rn] = cached
+            continue
+
+        if cache is not None:
+            for profile in results[rn][1]:
+                profile.flush()
+            cache.store(rf, start, end, *results[rn])
+
+    return {rn: results[rn] for rn, _ in relations}
+
+
+class RelationAnalysis:
+    """
+    The result of analyzing a relation: its fields, as named in the data and as
+    database field names, with the profile and inferred type of each, and its key
+    as a (field name, key values) pair, or None if it has no key and will get an
+    automatic one. Keys of analyzed relations can be passed on to the analysis of
+    other relations, so that references to them are inferred as foreign keys.
+
+    Splits are (relation name, determinant field index, dependent field indices)
+    triples, proposed by propose_relation_splits: the dependents are moved to a
+    new relation keyed by the determinant, which becomes a foreign key to it.
+    """
+
+    def __init__(self, relation: str, fields: Tuple[str, ...], names: List[str], profiles: List[ColumnProfile],
+                 inferences: List[Dict], key: Optional[Tuple[str, Container]]):
+        self.relation = relation
+        self.fields = fields
+        self.names = names
+        self.profiles = profiles
+        self.inferences = inferences
+        self.key = key
+        self.splits = []  # type: List[Tuple[str, int, List[int]]]
+
+    def design_file_rows(self) -> List[List[str]]:
+        """
+        Returns the relation's section of a design file, including its header row and the blank row ending it,
+        followed by the sections of any relations split off from it.
+        """
+
+        rows = [_design_file_header(self.relation)]
+
+        if self.key is None:
             # Add automatic primary key to design file
-            new_design_file_rows = [RelationField(
+            rows.append(RelationField(
                 csv_names=(),  # CSV names (blank)
-                name="{}_id".format(rn),  # "new" (database) name
+                name="{}_id".format(self.relation),  # "new" (database) name
                 data_type=DT_AUTO_KEY,  # auto primary key type
                 nullable=False,  # not nullable - primary key
                 null_values=(),  # no null values
                 default="",  # no default value
-                description="Unique identifier automatically generated by the database",  # auto-generated description
+                # Auto-generated description
+                description="Unique identifier automatically generated by the database",
                 show_in_table=True,  # show primary key in table list view
                 additional_fields=(),  # no additional fields
-            ).as_design_file_row()]
+            ).as_design_file_row())
+
+        determinants = {x: rn for rn, x, _ in self.splits}
+        moved = {y for _, _, ys in self.splits for y in ys}
+
+        for i, (f, new_name, profile, inference) in enumerate(zip(self.fields, self.names, self.profiles,
+                                                                   self.inferences)):
+            if i in moved:
+                continue
+
+            if i in determinants:
+                # Refers to the relation split off, which holds the values of the moved fields.
+                rows.append(RelationField(
+                    csv_names=(f,),
+                    name=new_name,
+                    data_type=DT_FOREIGN_KEY,
+                    nullable=False,
+                    null_values=(),
+                    default="",
+                    description="!fill me in!",
+                    show_in_table=True,
+                    additional_fields=(determinants[i],),
+                ).as_design_file_row())
+                continue
+
+            rows.extend(create_design_file_rows_from_inference(
+                f, new_name, inference, describe_sample(profile, inference["is_key"])))
+
+        rows.append([])
+
+        for rn, x, ys in self.splits:
+            rows.append(_design_file_header(rn))
+            rows.append(RelationField(
+                csv_names=(self.fields[x],),
+                name=self.names[x],
+                data_type=DT_MANUAL_KEY,
+                nullable=False,
+                null_values=(),
+                default="",
+                description="!fill me in!",
+                show_in_table=True,
+                # The relation's rows repeat once per row of the original sheet; import each key once.
+                additional_fields=(KEY_REPEATS_MERGE,),
+            ).as_design_file_row())
+
+            for y in ys:
+                rows.extend(create_design_file_rows_from_inference(
+                    self.fields[y], self.names[y], self.inferences[y], describe_sample(self.profiles[y])))
+
+            rows.append([])
+
+        return rows
+
+
+def _design_file_header(relation: str) -> List[str]:
+    return [relation, "new field name", "data type", "nullable?", "null values", "default", "description",
+            "show in table?", "additional fields..."]
+
+
+def check_analysis_options(relation_names: Sequence[str], sample_size: Optional[int] = None, jobs: int = 1,
+                           columnar: bool = False, cache: bool = False, relation_files: Sequence[str] = ()):
+    """
+    Raises an AnalysisError if the given relations (and their files, if given) cannot be analyzed with the given
+    options.
+    """
+
+    if sample_size is not None and sample_size < 1:
+        raise AnalysisError("Error: The sample size must be at least 1.")
+
+    if jobs < 1:
+        raise AnalysisError("Error: The number of jobs must be at least 1.")
+
+    if columnar and np is None:
+        raise AnalysisError("Error: The columnar backend requires NumPy. Install it with 'pip install numpy'.")
+
+    if cache and sample_size is not None:
+        raise AnalysisError("Error: The analysis cache cannot be used with approximate analysis.")
+
+    if openpyxl is None and any(is_workbook_path(rf) for rf in relation_files):
+        raise AnalysisError("Error: Reading Excel workbooks requires openpyxl. Install it with "
+                            "'pip install openpyxl'.")
+
+    duplicates = sorted(set(r for r in relation_names if len([r2 for r2 in relation_names if r2 == r]) > 1))
+    if duplicates:
+        raise AnalysisError("Error: You cannot use the same relation name(s) for more than one table:\n{}".format(
+            "\n".join("\t{}".format(r) for r in duplicates)))
+
+
+def find_relation_key(relation: str, fields: Tuple[str, ...], profiles: List[ColumnProfile]) \
+        -> Optional[Tuple[str, Container]]:
+    """
+    First pass of the analysis of a relation: returns its key as a (field name, key values) pair, if any column can be
+    one. The first such column is chosen; the values kept by the other columns for key detection are freed.
+    """
+
+    key = None
+
+    for f, profile in zip(fields, profiles):
+        new_name = field_to_py_code(f)
+        if infer_column_type_from_profile(relation, new_name, profile)["is_key"]:
+            key = (new_name, profile.key_sketch if profile.key_sketch is not None else profile.unique_values)
+            break
+
+    for f, profile in zip(fields, profiles):
+        if key is None or field_to_py_code(f) != key[0]:
+            # Once the key is known, other unique columns can no longer be inferred as keys; free their values.
+            profile.unique_values = None
+            profile.key_sketch = None
+
+    return key
+
+
+def infer_relation_types(relation: str, fields: Tuple[str, ...], profiles: List[ColumnProfile],
+                         keys: Optional[Dict[str, Tuple[str, Container]]] = None,
+                         key_index: Optional[KeyIndex] = None) -> RelationAnalysis:
+    """
+    Second pass of the analysis of a relation: infers the type of every column, given the keys of all relations
+    (including this one's, found in the first pass) and optionally an index of them for finding foreign keys.
+    """
 
-        for i, f in enumerate(fields):
-            new_name = field_to_py_code(f)
+    keys = keys if keys is not None else {}
+    names = [field_to_py_code(f) for f in fields]
+    inferences = [infer_column_type_from_profile(relation, n, p, keys, key_index) for n, p in zip(names, profiles)]
+    return RelationAnalysis(relation, fields, names, profiles, inferences, keys.get(relation))
 
-            col = tuple(d[i] for d in data)
-            inference = infer_column_type(rn, new_name, col, keys)
 
-            design_file_row = create_design_file_rows_from_inference(f, new_name, inference)
-            new_design_file_rows.extend(design_file_row)
+def analyze_rows(relation: str, header: Sequence[str], rows: Iterable[Sequence], sample_size: Optional[int] = None,
+                 keys: Optional[Dict[str, Tuple[str, Container]]] = None) -> RelationAnalysis:
+    """
+    Analyzes a relation from any iterable of rows (for example a database cursor or a generator) without writing any
+    files or output; rows are consumed as they come and are not kept in memory. Values are converted to strings, with
+    None as a blank value. If keys of other relations are given (from their RelationAnalysis.key), columns referring
+    to them are inferred as foreign keys. If keys include this relation, its key is taken from there.
+    """
 
-            print("    Field '{}':\n        Type: '{}'\n        Nullable: {}{}{}".format(
-                f,
-                inference["detected_type"],
-                inference["nullable"],
-                "\n        Choices: {}".format(inference["choices"]) if len(inference["choices"]) > 0 else "",
-                "\n        With alternate" if inference["include_alternate"] else ""
-            ))
+    check_analysis_options((relation,), sample_size)
 
-        new_design_file_rows.append([])
-        design_file_rows.extend(new_design_file_rows)
-        print()
+    fields = strip_blank_fields(tuple(str(h) for h in header))
+    if len(fields) == 0:
+        raise AnalysisError("Error: No fields detected")
 
-    try:
-        with open(design_file, "w", newline="") as df:
-            design_writer = csv.writer(df, delimiter=",")
-            max_length = max(len(r) for r in design_file_rows)
+    profiles = profile_rows((["" if v is None else str(v) for v in row] for row in rows), len(fields), sample_size)
+
+    keys = dict(keys) if keys is not None else {}
+    if relation not in keys:
+        key = find_relation_key(relation, fields, profiles)
+        if key is not None:
+            keys[relation] = key
+
+    return infer_relation_types(relation, fields, profiles, keys, KeyIndex(keys))
+
+
+def analyze_files(relations: Sequence[Tuple[str, str]], sample_size: Optional[int] = None, jobs: int = 1,
+                  columnar: bool = False, cache: Optional[AnalysisCache] = None) -> Dict[str, RelationAnalysis]:
+    """
+    Analyzes every (relation name, file) pair the same way ptd-analyze does, without writing a design file or any
+    output, and returns the analysis of each relation in order. See profile_relations for the options; a given cache
+    is saved once it has been updated.
+    """
+
+    check_analysis_options([rn for rn, _ in relations], sample_size, jobs, columnar, cache is not None,
+                           [rf for _, rf in relations])
+
+    relation_profiles = profile_relations(relations, sample_size, jobs, columnar, cache)
+    if cache is not None:
+        # Saved before key detection prunes the profiles.
+        cache.save()
 
-            for r in design_file_rows:
-                r.extend([""] * (max_length - len(r)))  # Pad out row with blank columns if needed
-                design_writer.writerow(r)
+    keys = {}
+    for rn, _ in relations:
+        key = find_relation_key(rn, *relation_profiles[rn])
+        if key is not None:
+            keys[rn] = key
+
+    key_index = KeyIndex(keys)
+    return {rn: infer_relation_types(rn, *relation_profiles.pop(rn), keys, key_index) for rn, _ in relations}
+
+
+def find_relation_dependencies(rf, sample_rows: int = DEPENDENCY_SAMPLE_ROWS) -> Dict[int, List[int]]:
+    """
+    Reads a relation file and returns, for each field which repeats and fully determines other fields, the indices of
+    the fields it determines. Candidates are found in the first sample_rows rows, then checked against the rest.
+    """
+
+    with closing(read_relation_file_rows(rf)) as data_reader:
+        finder = DependencyFinder(len(read_relation_header(data_reader)), sample_rows)
+        for row in iter_relation_rows(data_reader):
+            finder.add(row)
+
+    return finder.dependencies()
+
+
+def _is_constant(profile: ColumnProfile) -> bool:
+    return profile.value_counts is not None and len(profile.value_counts) < 2
+
+
+def propose_relation_splits(analysis: RelationAnalysis, dependencies: Dict[int, List[int]],
+                            taken_names: Set[str]) -> List[Tuple[str, int, List[int]]]:
+    """
+    Proposes moving the fields determined by another field of a relation to a new relation keyed by that field, given
+    the dependencies found by find_relation_dependencies. Determinants with the most dependents are split off first;
+    keys, foreign keys, determinants with blank values and constant fields are left in place. Sets and returns the
+    splits of the analysis; the names of the new relations are added to taken_names.
+    """
+
+    inferences = analysis.inferences
+    profiles = analysis.profiles
+
+    def can_move(i: int) -> bool:
+        return not inferences[i]["is_key"] and not _is_constant(profiles[i])
+
+    used = set()  # type: Set[int]
+    splits = []
+
+    for x in sorted(dependencies, key=lambda c: (-len(dependencies[c]), c)):
+        if x in used or not can_move(x) or inferences[x]["detected_type"] == DT_FOREIGN_KEY or \
+                profiles[x].blank_values > 0:
+            continue
+
+        ys = [y for y in dependencies[x] if y not in used and can_move(y)]
+        if not ys:
+            continue
 
-            print("    Wrote design file to '{}'...\n".format(design_file))
+        name = RE_SPLIT_NAME_SUFFIX.sub("", analysis.names[x]) or analysis.names[x]
+        if name in taken_names:
+            name = analysis.names[x]
+        suffix = 2
+        while name in taken_names:
+            name = "{}_{}".format(analysis.names[x], suffix)
+            suffix += 1
 
-        print("Analyzed {} relations.".format(len(relations)))
+        taken_names.add(name)
+        used.update((x, *ys))
+        splits.append((name, x, ys))
 
-    except IOError:
-        print("\nError: Could not write to design file.\n")
+    analysis.splits = splits
+    return splits
+
+
+def _count_rows(profiles: List[ColumnProfile]) -> int:
+    if not profiles:
+        return 0
+    profiles[0].flush()
+    return profiles[0].population if profiles[0].population is not None else profiles[0].total
+
+
+def main():
+    print_license()
+
+    parser = argparse.ArgumentParser(
+        prog="ptd-analyze",
+        usage="ptd-analyze [--approximate] [--sample N] [--jobs N] [--columnar] [--cache FILE] [--normalize] "
+              "[--profile[=FILE]] design_out.csv relation_1_name file1.csv [relation_2_name file2.csv] ...")
+    parser.add_argument("--approximate", action="store_true",
+                        help="Infer types from a random sample of {} rows per relation, and decide keys using "
+                             "fixed-memory sketches.".format(DEFAULT_SAMPLE_SIZE))
+    parser.add_argument("--sample", type=int, metavar="N",
+                        help="Infer types from a random sample of N rows per relation (implies --approximate.)")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="Number of worker processes used to profile relation files (default: 1.)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Profile files in chunks of column arrays with NumPy, which is faster for long files.")
+    parser.add_argument("--cache", metavar="FILE",
+                        help="Keep column profiles in FILE, so that later runs only read rows appended since.")
+    parser.add_argument("--normalize", action="store_true",
+                        help="Find fields fully determined by another, repeating field (e.g. a site's coordinates "
+                             "repeated in every row about it), and move them to a separate relation with a foreign "
+                             "key to it.")
+    parser.add_argument("design_file", help="Name for the output design file.")
+    parser.add_argument("relations", nargs="+",
+                        help="Pairs of relation names and data files (CSV files, or Excel workbook sheets given as "
+                             "book.xlsx#Sheet.)")
+
+    # --profile[=FILE] is shared by all the ptd commands; report the time taken by each phase of the analysis.
+    argv, timer = timer_from_args("ptd-analyze", sys.argv[1:])
+    args = parser.parse_args(argv)
+
+    if len(args.relations) % 2 != 0:
+        parser.print_usage()
         exit(1)
 
+    sample_size = args.sample if args.sample is not None else (DEFAULT_SAMPLE_SIZE if args.approximate else None)
+
+    design_file = args.design_file  # Name for output
+    relation_names = args.relations[0::2]
+    # Split pairs of file name, relation name
+    relations = tuple(zip(relation_names, map(str.lower, args.relations[1::2])))
+
+    keys = {}
+
+    try:
+        check_analysis_options(relation_names, sample_size, args.jobs, args.columnar, args.cache is not None,
+                               [rf for _, rf in relations])
+
+        # Each relation file is only read once; its profiles are kept for pass 2.
+        if args.jobs > 1:
+            print("Profiling {} relations with {} jobs...\n".format(len(relations), args.jobs))
+        with timer.phase("read files") as phase:
+            cache = AnalysisCache.load(args.cache) if args.cache is not None else None
+            relation_profiles = profile_relations(relations, sample_size, args.jobs, args.columnar, cache)
+
+            if cache is not None:
+                # Saved before the profiles are pruned below.
+                cache.save()
+
+            if timer.enabled:
+                phase.items = sum(_count_rows(profiles) for _, profiles in relation_profiles.values())
+
+        relation_dependencies = {}
+        if args.normalize:
+            # Rows are not kept by profiling, so finding dependencies takes another read of each file.
+            with timer.phase("dependency pass") as phase:
+                relation_dependencies = {rn: find_relation_dependencies(rf) for rn, rf in relations}
+                if timer.enabled:
+                    phase.items = sum(_count_rows(profiles) for _, profiles in relation_profiles.values())
+
+    except AnalysisError as e:
+        exit_with_error(str(e))
+
+    # Pass 1: Find key candidates and possible foreign keys
+    with timer.phase("key pass"):
+        for rn, rf in relations:
+            print("Finding keys for relation '{}'...".format(rn))
+
+            fields, profiles = relation_profiles[rn]
+
+            if describe_sample(profiles[0]) is not None:
+                print("    Inferring types from a sample of {:,} of {:,} rows".format(
+                    profiles[0].total, profiles[0].population))
+
+            key = find_relation_key(rn, fields, profiles)
+            if key is not None:
+                keys[rn] = key
+                print("    Field '{}' identified as a key".format(key[0]))
+
+            print()
+
+    # Pass 2: Determine other column data types, including references to the keys found in pass 1
+    with timer.phase("type pass"):
+        key_index = KeyIndex(keys)
+        design_file_rows = []
+        taken_names = set(relation_names)
+        for rn, rf in relations:
+            print("Detecting types for fields in relation '{}'...".format(rn))
+
+            analysis = infer_relation_types(rn, *relation_profiles.pop(rn), keys, key_index)
+
+            if analysis.key is None:
+                print("\n    Warning: No primary key found for relation '{}'. If you have a field you "
+                      "\n             think should be the primary key (row identifier), this is an indication"
+                      "\n             that there may be duplicate values. \n"
+                      "\n             Adding an automatic key instead....".format(rn))  # TODO
+
+            for f, inference in zip(analysis.fields, analysis.inferences):
+                print("    Field '{}':\n        Type: '{}'\n        Nullable: {}{}{}{}".format(
+                    f,
+                    inference["detected_type"],
+                    inference["nullable"],
+                    "\n        Choices: {}".format(inference["choices"]) if len(inference["choices"]) > 0 else "",
+                    ("\n        References: {}".format(inference["foreign_key_target"])
+                     if inference["foreign_key_target"] is not None else ""),
+                    "\n        With alternate" if inference["include_alternate"] else ""
+                ))
+
+            if rn in relation_dependencies:
+                for split_name, x, ys in propose_relation_splits(analysis, relation_dependencies[rn], taken_names):
+                    print("    Fields {} are determined by field '{}'; moving them to new relation '{}'".format(
+                        ", ".join("'{}'".format(analysis.fields[y]) for y in ys), analysis.fields[x], split_name))
+
+            design_file_rows.extend(analysis.design_file_rows())
+            print()
+
+    with timer.phase("design write"):
+        try:
+            with open(design_file, "w", newline="") as df:
+                design_writer = csv.writer(df, delimiter=",")
+                max_length = max(len(r) for r in design_file_rows)
+
+                for r in design_file_rows:
+                    r.extend([""] * (max_length - len(r)))  # Pad out row with blank columns if needed
+                    design_writer.writerow(r)
+
+                print("    Wrote design file to '{}'...\n".format(design_file))
+
+            print("Analyzed {} relations.".format(len(relations)))
+
+        except IOError:
+            print("\nError: Could not write to design file.\n")
+            exit(1)
+
+    timer.report()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Persistent cache of column profiles, so that files which are only appended to are not re-read from the start.
+
+import hashlib
+import io
+import os
+import pickle
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .readers import MappedCSVFile, detect_file_compression, is_workbook_path, split_sheet_path
+
+
+__all__ = [
+    "CACHE_VERSION",
+    "BoundedFile",
+    "ends_at_record_boundary",
+    "AnalysisCache",
+]
+
+
+# Bump whenever the layout of cached entries or of ColumnProfile changes.
+CACHE_VERSION = 5
+
+# Number of bytes at the start of a file (covering the header) and before the resume offset which are hashed to
+# check that a file has only been appended to.
+FINGERPRINT_BYTES = 64 * 1024
+
+
+class BoundedFile(io.RawIOBase):
+    """
+    Binary file reader which only exposes the bytes in [start, end), even if the file grows while it is being read.
+    """
+
+    def __init__(self, path: str, start: int, end: int):
+        super().__init__()
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), self._remaining)
+        if n <= 0:
+            return 0
+
+        data = self._f.read(n)
+        b[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+def ends_at_record_boundary(path: str, start: int, end: int) -> bool:
+    """
+    Whether the bytes in [start, end), which must begin at a record boundary, also end at one: the last byte is a line
+    break which is not inside a quoted value (see MappedCSVFile.is_record_boundary.)
+    """
+
+    if end <= start:
+        return True
+
+    with MappedCSVFile(path) as mf:
+        return end <= mf.size and mf.is_record_boundary(start, end)
+
+
+def _hash_range(path: str, start: int, end: int) -> str:
+    with BoundedFile(path, max(start, 0), end) as f:
+        return hashlib.blake2b(f.read(end - max(start, 0))).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Column profiles of previously analyzed relation files, keyed by absolute path. Each entry records the file's size
+    and modification time, hashes of its first bytes (including the header) and of the bytes before the end of the
+    last complete record, and the offset of that end. If a file has only been appended to since, profiling resumes
+    from that offset with the stored profiles; otherwise the entry is ignored and the file is profiled again.
+    """
+
+    def __init__(self, path: str, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = path
+        self.entries = entries if entries is not None else {}  # type: Dict[str, Dict[str, Any]]
+
+    @classmethod
+    def load(cls, path: str) -> "AnalysisCache":
+        try:
+            with open(path, "rb") as cf:
+                version, entries = pickle.load(cf)
+        except (OSError, EOFError, ValueError, AttributeError, ImportError, pickle.UnpicklingError):
+            # Caches pickled by another PyTrackDat version may refer to classes or modules which no longer exist.
+            return cls(path)
+
+        return cls(path, entries if version == CACHE_VERSION else None)
+
+    def save(self):
+        # Write to a temporary file first, so an interrupted run cannot leave a truncated cache behind.
+        with open(self.path + ".tmp", "wb") as cf:
+            pickle.dump((CACHE_VERSION, self.entries), cf, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + ".tmp", self.path)
+
+    def resume_point(self, rf: str) -> Tuple[int, int, Optional[Tuple[Tuple[str, ...], List[Any]]]]:
+        """
+        Returns the (start, end) byte range of the file which still needs to be profiled, and the fields and profiles
+        of the part before it (or None, if the file must be profiled from the start.)
+        """
+
+        path = split_sheet_path(rf)[0]
+        stat = os.stat(path)
+        entry = self.entries.get(os.path.abspath(rf))
+
+        if entry is None:
+            return 0, stat.st_size, None
+
+        if (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime_ns):
+            # Unchanged since it was profiled
+            return stat.st_size, stat.st_size, (entry["fields"], entry["profiles"])
+
+        offset = entry["offset"]
+
+        if offset is None or stat.st_size < offset or \
+                entry["prefix_hash"] != _hash_range(path, 0, min(offset, FINGERPRINT_BYTES)) or \
+                entry["tail_hash"] != _hash_range(path, offset - FINGERPRINT_BYTES, offset):
+            return 0, stat.st_size, None
+
+        return offset, stat.st_size, (entry["fields"], entry["profiles"])
+
+    def store(self, rf: str, start: int, end: int, fields: Tuple[str, ...], profiles: List[Any]):
+        """
+        Records the profiles of the first `end` bytes of a file, of which [start, end) were just profiled. If the file
+        does not end at a record boundary there (for instance because a row was still being written), or is
+        compressed or a workbook sheet, the entry can only be reused as long as the file does not change.
+        """
+
+        path = split_sheet_path(rf)[0]
+        resumable = not is_workbook_path(rf) and detect_file_compression(path) is None and \
+            ends_at_record_boundary(path, start, end)
+
+        stat = os.stat(path)
+        self.entries[os.path.abspath(rf)] = {
+            # If the file grew while it was being profiled, it cannot be considered unchanged next time.
+            "size": end if stat.st_size == end else None,
+            "mtime": stat.st_mtime_ns,
+            "offset": end if resumable else None,
+            "prefix_hash": _hash_range(path, 0, min(end, FINGERPRINT_BYTES)),
+            "tail_hash": _hash_range(path, end - FINGERPRINT_BYTES, end),
+            "fields": fields,
+            "profiles": profiles,
+        }
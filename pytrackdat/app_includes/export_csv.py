@@ -27,11 +27,13 @@ class Echo:
         return value
 
 
-def csv_generator(writer, column_names, queryset):
+def csv_generator(writer, column_names, choice_columns, queryset):
     # TODO: replace null values with their encoded equivalents from the design file
     yield writer.writerow(column_names)
     for item in queryset:
-        yield writer.writerow([getattr(item, c) for c in column_names])
+        # Fields with choices are exported as their values, so that coded text fields are not exported as codes.
+        yield writer.writerow([getattr(item, "get_{}_display".format(c))() if c in choice_columns else getattr(item, c)
+                               for c in column_names])
 
 
 # noinspection PyProtectedMember
@@ -40,11 +42,12 @@ class ExportCSVMixin:
         # TODO: replace null values with their encoded equivalents from the design file
 
         column_names = [c.name for c in self.model._meta.fields]
+        choice_columns = {c.name for c in self.model._meta.fields if c.choices}
 
         pseudo_buffer = Echo()
         writer = csv.writer(pseudo_buffer)
 
-        response = StreamingHttpResponse(csv_generator(writer, column_names, queryset),
+        response = StreamingHttpResponse(csv_generator(writer, column_names, choice_columns, queryset),
                                          content_type="text/csv; charset=utf-8")
 
         response["Content-Disposition"] = "attachment; filename={}.csv".format(self.model.__name__.lower())
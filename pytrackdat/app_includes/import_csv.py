@@ -32,6 +32,7 @@ from decimal import *
 from io import TextIOWrapper
 
 from .common import *
+from .readers import is_workbook_path, iter_workbook_rows, open_decompressed
 
 from pytrackdat_snapshot_manager.models import Snapshot
 
@@ -44,7 +45,8 @@ POLYGON_REGEX = r"\(\s*({ls},\s*)*{ls}\s*\)".format(ls=LINE_STRING_REGEX)
 
 
 class ImportCSVForm(forms.Form):
-    csv_file = forms.FileField()
+    csv_file = forms.FileField(help_text="A CSV file (which may be compressed) or an Excel workbook (.xlsx)")
+    sheet = forms.CharField(required=False, help_text="Workbook sheet to import (default: the first one)")
 
 
 class ImportCSVMixin:
@@ -53,15 +55,22 @@ class ImportCSVMixin:
             form = ImportCSVForm(request.POST, request.FILES)
 
             if form.is_valid():
-                encoding = form.cleaned_data["csv_file"].charset \
-                    if form.cleaned_data["csv_file"].charset else "utf-8-sig"
-                csv_file = TextIOWrapper(request.FILES["csv_file"], encoding=encoding)
-
-                reader = csv.DictReader(csv_file)
+                if is_workbook_path(request.FILES["csv_file"].name):
+                    # Workbook sheets are streamed in read-only mode, without loading the whole workbook.
+                    rows = iter_workbook_rows(request.FILES["csv_file"], form.cleaned_data["sheet"] or None)
+                else:
+                    encoding = form.cleaned_data["csv_file"].charset \
+                        if form.cleaned_data["csv_file"].charset else "utf-8-sig"
+                    # Compressed (gzip, bz2, xz or zstd) files are decompressed as they are read.
+                    rows = csv.reader(TextIOWrapper(open_decompressed(request.FILES["csv_file"]), encoding=encoding))
+
+                field_names = next(rows, [])
+                # Missing trailing values are treated as blank.
+                reader = (dict(zip(field_names, row + [""] * (len(field_names) - len(row)))) for row in rows)
 
                 model_name = self.model.__name__
                 ptd_info = self.model.ptd_info()
-                headers = [h.strip() for h in reader.fieldnames if h != ""]
+                headers = [h.strip() for h in field_names if h != ""]
 
                 # TODO: This logic might break with auto keys...
 
@@ -80,6 +89,12 @@ class ImportCSVMixin:
 
                 model_objects = []
 
+                # Rows of a relation split off from a denormalized sheet (with ptd-analyze --normalize) repeat once
+                # per row of the sheet; if its key is set to merge them, identical repeats of a key are imported once.
+                key_name = next((f["name"] for f in ptd_info
+                                 if merges_repeated_keys(f["data_type"], f["additional_fields"])), None)
+                seen_keys = {}
+
                 for i, row in enumerate(reader, 1):
                     object_data = {}
 
@@ -143,10 +158,11 @@ class ImportCSVMixin:
 
                                 additional_fields = [f.strip() for f in f["additional_fields"] if f.strip() != ""]
 
-                                if len(additional_fields) in (1, 2):
+                                if len(additional_fields) in (1, 2, 3):
                                     max_length = int(additional_fields[0])
-                                    if len(additional_fields) == 2:
-                                        choices = [c.strip() for c in additional_fields[1].split(";")]
+                                    if len(additional_fields) >= 2:
+                                        # The same options, with the same codes, as the generated model
+                                        choices = list(parse_choices(additional_fields[1]))
 
                                 if 0 < max_length < len(str_v):
                                     raise ValueError("Line {}: Value for text field {} exceeded maximum length: "
@@ -162,6 +178,12 @@ class ImportCSVMixin:
                                             "choices {}: {}".format(
                                                 i, f["name"], model_name, tuple(choices), str_v))
 
+                                if is_coded_text_field(f["data_type"], additional_fields):
+                                    # Stored as the code of the matching option
+                                    object_data[f["name"]][h] = dict((v, c) for c, v in choice_codes(choices)).get(
+                                        str_v)
+                                    break
+
                                 object_data[f["name"]][h] = str_v
                                 break
 
@@ -194,6 +216,11 @@ class ImportCSVMixin:
                                     raise ValueError("Line {}: Target model for foreign key field {} in model {} has "
                                                      "no primary key.".format(i, f["name"], model_name))
 
+                                if str_v == "" and f["nullable"]:
+                                    # Blank values of nullable foreign keys refer to nothing
+                                    object_data[f["name"]][h] = None
+                                    break
+
                                 foreign_key_value = str_v
                                 if rel_id_data_type == "integer":
                                     foreign_key_value = int(foreign_key_value)
@@ -284,6 +311,14 @@ class ImportCSVMixin:
                                 ((k, v) for k, v in object_data[f["name"]].items()),
                                 key=lambda c: f["csv_names"].index(c[0]))))
 
+                    if key_name is not None and key_name in object_data:
+                        seen_data = seen_keys.setdefault(object_data[key_name], object_data)
+                        if seen_data is not object_data:
+                            if seen_data != object_data:
+                                raise ValueError("Line {}: Duplicate key with different values in model {}: "
+                                                 "{}".format(i, model_name, object_data[key_name]))
+                            continue
+
                     model_objects.append(self.model(**object_data))
 
                 self.model.objects.bulk_create(model_objects)
@@ -18,6 +18,8 @@
 #     David Lougheed (david.lougheed@gmail.com)
 
 import re
+
+from functools import lru_cache
 from typing import Optional, Sequence, Tuple
 
 
@@ -49,6 +51,9 @@ __all__ = [
     "GIS_DATA_TYPES",
     "DATA_TYPE_ADDITIONAL_DESIGN_SETTINGS",
     "DESIGN_SEPARATOR",
+    "TEXT_STORAGE_CODED",
+    "INTEGER_STORAGE_UNSIGNED",
+    "KEY_REPEATS_MERGE",
 
     "RE_INTEGER",
     "RE_INTEGER_HUMAN",
@@ -65,6 +70,18 @@ __all__ = [
     "RE_NON_IDENTIFIER_CHARACTERS",
     "RE_SEPARATOR_CHARACTERS",
     "RE_MULTIPLE_WHITESPACE_CHARACTERS",
+    "RE_VALUE_CLASS",
+
+    "VC_INTEGER",
+    "VC_INTEGER_HUMAN",
+    "VC_DECIMAL",
+    "VC_DECIMAL_HUMAN",
+    "VC_FLOAT",
+    "VC_DATE",
+    "VC_TIME",
+    "VC_OTHER",
+    "VC_INTEGER_CLASSES",
+    "VC_DECIMAL_CLASSES",
 
     "BOOLEAN_TRUE_VALUES",
     "BOOLEAN_FALSE_VALUES",
@@ -75,6 +92,7 @@ __all__ = [
 
     "PDT_RELATION_PREFIX",
 
+    "classify_value",
     "valid_data_type",
     "collapse_multiple_underscores",
     "sanitize_python_identifier",
@@ -83,6 +101,11 @@ __all__ = [
     "to_relation_name",
     "print_license",
     "exit_with_error",
+    "is_coded_text_field",
+    "is_unsigned_integer_field",
+    "merges_repeated_keys",
+    "parse_choices",
+    "choice_codes",
 
     "RelationField",
     "Relation",
@@ -141,12 +164,12 @@ GIS_DATA_TYPES = (
 
 DATA_TYPE_ADDITIONAL_DESIGN_SETTINGS = {
     DT_AUTO_KEY: [],
-    DT_MANUAL_KEY: [],
-    DT_INTEGER: [],
+    DT_MANUAL_KEY: ["repeats"],
+    DT_INTEGER: ["min_value", "max_value", "storage"],
     DT_FLOAT: [],
     DT_DECIMAL: ["max_length", "precision"],
     DT_BOOLEAN: [],
-    DT_TEXT: ["max_length", "options"],
+    DT_TEXT: ["max_length", "options", "storage"],
     DT_DATE: [],
     DT_TIME: [],
     DT_FOREIGN_KEY: ["target"],
@@ -161,6 +184,11 @@ DATA_TYPE_ADDITIONAL_DESIGN_SETTINGS = {
 
 DESIGN_SEPARATOR = ";"
 
+# Storage setting for text fields with options, which stores each value as the (1-based) position of its option.
+TEXT_STORAGE_CODED = "coded"
+INTEGER_STORAGE_UNSIGNED = "unsigned"
+KEY_REPEATS_MERGE = "merge"
+
 
 RE_INTEGER = re.compile(r"^([-+]?[1-9]\d*|0)$")
 RE_INTEGER_HUMAN = re.compile(r"^([-+]?([1-9]\d{0,2})[\s,](\d{3}[\s,])*\d{3})$")  # TODO: THIS IS LOCALE-SPECIFIC
@@ -204,9 +232,75 @@ DATE_FORMATS = (
 )
 
 
+# Lexical value classes, as determined by classify_value.
+VC_INTEGER = "integer"
+VC_INTEGER_HUMAN = "human integer"
+VC_DECIMAL = "decimal"
+VC_DECIMAL_HUMAN = "human decimal"
+VC_FLOAT = "float"  # Decimal in scientific notation
+VC_DATE = "date"
+VC_TIME = "time"
+VC_OTHER = "other"
+
+VC_INTEGER_CLASSES = (VC_INTEGER, VC_INTEGER_HUMAN)
+VC_DECIMAL_CLASSES = (VC_DECIMAL, VC_DECIMAL_HUMAN, VC_FLOAT)
+
+# All of the number, date and time patterns above combined into one alternation, in the order they take precedence.
+# Each alternative is a named group, so the name of the group that matched gives the value class in one pass.
+# The alternatives must stay in sync with the individual patterns.
+RE_VALUE_CLASS = re.compile(
+    r"^(?:"
+    r"(?P<integer>[-+]?[1-9]\d*|0)"
+    r"|(?P<integer_human>[-+]?[1-9]\d{0,2}[\s,](?:\d{3}[\s,])*\d{3})"
+    r"|(?P<decimal>[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)"
+    r"|(?P<decimal_human>[-+]?(?:\d{1,3}[\s,](?:\d{3}[\s,])*\d{3}(?:\.\d+)?|\d{1,3}(?:\.\d+)?|\.\d+)"
+    r"(?:[eE][-+]?\d+)?)"
+    r"|(?P<date_0>[1-2]\d{3}-\d{1,2}-\d{1,2})"
+    r"|(?P<date_1>[1-2]\d{3}/\d{1,2}/\d{1,2})"
+    r"|(?P<date_2>\d{1,2}-\d{1,2}-[1-2]\d{3})"
+    r"|(?P<date_3>\d{1,2}/\d{1,2}/[1-2]\d{3})"
+    r"|(?P<time_0>\d{2}:\d{2})"
+    r"|(?P<time_1>\d{2}:\d{2}:\d{2})"
+    r")$"
+)
+
+_VALUE_CLASS_GROUPS = {
+    "integer": (VC_INTEGER, None),
+    "integer_human": (VC_INTEGER_HUMAN, None),
+    "decimal": (VC_DECIMAL, None),
+    "decimal_human": (VC_DECIMAL_HUMAN, None),
+    **{"date_{}".format(i): (VC_DATE, i) for i in range(len(DATE_FORMATS))},
+    **{"time_{}".format(i): (VC_TIME, i) for i in range(len(TIME_FORMATS))},
+}
+
+# Every number, date and time starts with one of these; anything else can skip the regex entirely.
+_VALUE_CLASS_FIRST_CHARACTERS = frozenset("+-.0123456789")
+
+
 PDT_RELATION_PREFIX = "PyTrackDat"
 
 
+def classify_value(v: str) -> Tuple[str, Optional[int]]:
+    """
+    Determines the lexical class of a (stripped) value in a single pass. Returns
+    the class and, for dates and times, the index of the matching format in
+    DATE_FORMATS or TIME_FORMATS.
+    """
+
+    if v == "" or v[0] not in _VALUE_CLASS_FIRST_CHARACTERS:
+        return VC_OTHER, None
+
+    m = RE_VALUE_CLASS.match(v)
+    if m is None:
+        return VC_OTHER, None
+
+    value_class, value_format = _VALUE_CLASS_GROUPS[m.lastgroup]
+    if value_class in (VC_DECIMAL, VC_DECIMAL_HUMAN) and ("e" in v or "E" in v):
+        return VC_FLOAT, None
+
+    return value_class, value_format
+
+
 def valid_data_type(data_type: str, gis_mode: bool) -> bool:
     """
     Validates a data type. Assumes the data type has already been sanitized.
@@ -222,6 +316,7 @@ def sanitize_python_identifier(s: str) -> str:
     return re.sub(RE_NON_IDENTIFIER_CHARACTERS, "", re.sub(RE_SEPARATOR_CHARACTERS, "_", s.strip()))
 
 
+@lru_cache(maxsize=None)
 def field_to_py_code(field: str) -> str:
     field = sanitize_python_identifier(field.lower())
     field = field + "_field" if field in PYTHON_KEYWORDS else field
@@ -233,6 +328,8 @@ def standardize_data_type(dt: str) -> str:
     return re.sub(RE_MULTIPLE_WHITESPACE_CHARACTERS, " ", dt.lower().replace("_", " "))
 
 
+# Cached, which also means the plural warning is only printed once per name.
+@lru_cache(maxsize=None)
 def to_relation_name(name: str) -> str:
     name_sanitized = collapse_multiple_underscores(sanitize_python_identifier(name))
     python_relation_name = PDT_RELATION_PREFIX + "".join(n.capitalize() for n in name_sanitized.split("_"))
@@ -260,6 +357,46 @@ This program comes with ABSOLUTELY NO WARRANTY; see LICENSE for details.
 """.format(VERSION, COPYRIGHT_DATES))
 
 
+def is_coded_text_field(data_type: str, additional_fields: Sequence) -> bool:
+    """
+    Whether a field is a text field whose values are stored as integer codes for its options.
+    """
+    return (data_type == DT_TEXT and len(additional_fields) >= 3 and
+            str(additional_fields[2]).strip().lower() == TEXT_STORAGE_CODED)
+
+
+def is_unsigned_integer_field(data_type: str, additional_fields: Sequence) -> bool:
+    """
+    Whether an integer field is stored in an unsigned (positive) field type.
+    """
+    return (data_type == DT_INTEGER and len(additional_fields) >= 3 and
+            str(additional_fields[2]).strip().lower() == INTEGER_STORAGE_UNSIGNED)
+
+
+def merges_repeated_keys(data_type: str, additional_fields: Sequence) -> bool:
+    """
+    Whether rows which repeat a manual key with identical values are imported once, rather than rejected.
+    """
+    return (data_type == DT_MANUAL_KEY and len(additional_fields) >= 1 and
+            str(additional_fields[0]).strip().lower() == KEY_REPEATS_MERGE)
+
+
+def parse_choices(choices: str) -> Tuple[str, ...]:
+    """
+    Returns the options listed in a text field's choices setting, in order. Blank options (such as the one listed
+    first by ptd-analyze for nullable fields) are left out; blank values are stored as null instead.
+    """
+    return tuple(c.strip() for c in str(choices).split(DESIGN_SEPARATOR) if c.strip() != "")
+
+
+def choice_codes(choices: Sequence[str]) -> Tuple[Tuple[int, str], ...]:
+    """
+    Returns (code, value) pairs for the options of a coded text field. Codes follow the order the options are listed
+    in, so options must only ever be added to the end of the list once data is stored.
+    """
+    return tuple(enumerate(choices, 1))
+
+
 def exit_with_error(message: str):
     print()
     print(message)
@@ -267,7 +404,29 @@ def exit_with_error(message: str):
     exit(1)
 
 
-class RelationField:
+class _Record:
+    """
+    Base for compact, immutable records: attributes are stored in slots, and are
+    only ever set once, in __init__. Modified copies must be made instead.
+    """
+
+    __slots__ = ()
+
+    def _set(self, **values):
+        for k, v in values.items():
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("{} objects are immutable".format(type(self).__name__))
+
+    def __delattr__(self, key):
+        raise AttributeError("{} objects are immutable".format(type(self).__name__))
+
+
+class RelationField(_Record):
+    __slots__ = ("csv_names", "name", "data_type", "nullable", "null_values", "default", "description",
+                 "show_in_table", "additional_fields", "choices")
+
     def __init__(
         self,
         csv_names: Tuple,
@@ -281,16 +440,18 @@ class RelationField:
         additional_fields: Tuple,
         choices: Optional[Tuple] = None,
     ):
-        self.csv_names = csv_names
-        self.name = name
-        self.data_type = data_type
-        self.nullable = nullable
-        self.null_values = null_values
-        self.default = default
-        self.description = description
-        self.show_in_table = show_in_table
-        self.additional_fields = additional_fields
-        self.choices = choices
+        self._set(
+            csv_names=csv_names,
+            name=name,
+            data_type=data_type,
+            nullable=nullable,
+            null_values=null_values,
+            default=default,
+            description=description,
+            show_in_table=show_in_table,
+            additional_fields=additional_fields,
+            choices=choices,
+        )
 
     def as_design_file_row(self):
         return [
@@ -319,6 +480,12 @@ class RelationField:
             self.choices,  # Inherit choices (shouldn't be any normally)
         )
 
+    def with_choices(self, choices: Optional[Tuple]):
+        return RelationField(**{**dict(self), "choices": choices})
+
+    def __reduce__(self):
+        return RelationField, tuple(v for _, v in self)
+
     def __iter__(self):
         yield "csv_names", self.csv_names
         yield "name", self.name
@@ -332,21 +499,21 @@ class RelationField:
         yield "choices", self.choices
 
 
-class Relation:
+class Relation(_Record):
+    __slots__ = ("design_name", "fields", "id_type", "name", "name_lower")
+
     def __init__(self, design_name: str, fields: Sequence[RelationField], id_type: str):
-        self.design_name = design_name.strip()
-        self.fields = fields
-        self.id_type = id_type
-
-    @property
-    def name(self):
-        # Python class-style name for the relation
-        return to_relation_name(self.design_name)
-
-    @property
-    def name_lower(self):
-        # Python variable-style (snake case) name for the relation
-        return field_to_py_code(self.design_name)
+        design_name = design_name.strip()
+        self._set(
+            design_name=design_name,
+            fields=tuple(fields),
+            id_type=id_type,
+            name=to_relation_name(design_name),  # Python class-style name for the relation
+            name_lower=field_to_py_code(design_name),  # Python variable-style (snake case) name for the relation
+        )
+
+    def __reduce__(self):
+        return Relation, (self.design_name, self.fields, self.id_type)
 
     def __iter__(self):
         yield "name", self.name
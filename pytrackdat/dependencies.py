@@ -0,0 +1,176 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Discovery of functional dependencies between columns, used to suggest splitting denormalized relations.
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+__all__ = [
+    "DEPENDENCY_SAMPLE_ROWS",
+    "MAX_DETERMINANT_VALUES",
+    "partition_columns",
+    "sample_dependencies",
+    "DependencyFinder",
+]
+
+
+# Rows used to find candidate dependencies; the candidates are then checked against every row.
+DEPENDENCY_SAMPLE_ROWS = 10000
+
+# Candidate determinants with more distinct values than this are dropped rather than tracked.
+MAX_DETERMINANT_VALUES = 100000
+
+
+def partition_columns(rows: Sequence[Sequence[str]], n_fields: int) -> Tuple[List[List[int]], List[int]]:
+    """
+    Partitions the rows by the value of each column: returns, for each column, the equivalence class (numbered in
+    order of appearance) of every row, and the number of classes.
+    """
+
+    columns = []
+    n_classes = []
+
+    for i in range(n_fields):
+        classes = {}  # type: Dict[str, int]
+        columns.append([classes.setdefault(r[i], len(classes)) for r in rows])
+        n_classes.append(len(classes))
+
+    return columns, n_classes
+
+
+def sample_dependencies(rows: Sequence[Sequence[str]], n_fields: int, repeating: bool = True) \
+        -> Dict[int, List[int]]:
+    """
+    Finds every dependency X -> Y between single columns which holds in the rows, i.e. where rows with the same value
+    of column X always have the same value of column Y. Returns the dependent columns of each determinant which is not
+    constant and, if repeating is true, which repeats (has at most one distinct value per two rows.)
+
+    X -> Y holds if refining the partition of the rows by X with the partition by Y splits none of its classes, i.e.
+    if the partition by (X, Y) has as many classes as the partition by X.
+    """
+
+    columns, n_classes = partition_columns(rows, n_fields)
+    dependencies = {}
+
+    for x in range(n_fields):
+        if n_classes[x] < 2 or (repeating and n_classes[x] * 2 > len(rows)):
+            continue
+
+        dependents = [y for y in range(n_fields)
+                      # A column cannot be determined by one with fewer classes.
+                      if y != x and n_classes[y] <= n_classes[x] and
+                      len(set(zip(columns[x], columns[y]))) == n_classes[x]]
+
+        if dependents:
+            dependencies[x] = dependents
+
+    return dependencies
+
+
+class _Candidate:
+    """
+    A candidate determinant column, with the values of its remaining candidate dependents for each of its values.
+    """
+
+    __slots__ = ("column", "dependents", "values")
+
+    def __init__(self, column: int, dependents: List[int]):
+        self.column = column
+        self.dependents = dependents
+        self.values = {}  # type: Dict[str, Tuple[str, ...]]
+
+    def check(self, row: Sequence[str]) -> bool:
+        """
+        Checks a row against the values seen so far, dropping the dependents it contradicts. Returns whether the
+        candidate still has any dependents.
+        """
+
+        ys = tuple(row[y] for y in self.dependents)
+        seen = self.values.setdefault(row[self.column], ys)
+
+        if seen != ys:
+            keep = [i for i, (a, b) in enumerate(zip(seen, ys)) if a == b]
+            self.dependents = [self.dependents[i] for i in keep]
+            self.values = {x: tuple(v[i] for i in keep) for x, v in self.values.items()}
+
+        return len(self.dependents) > 0 and len(self.values) <= MAX_DETERMINANT_VALUES
+
+
+class DependencyFinder:
+    """
+    Finds dependencies between the columns of a stream of rows. Candidates are
+    found exactly in the first rows (since a dependency which holds in all rows
+    holds in any of them, none are missed), then the remaining rows are checked
+    against the candidates, one hash table lookup per candidate determinant, so
+    that only dependencies which hold in every row are reported. Whether a
+    determinant repeats is only decided over every row, since one which barely
+    repeats in the first rows may well repeat over all of them; candidates with
+    more than MAX_DETERMINANT_VALUES values are dropped, though. Columns with a
+    distinct value in every one of the first rows (keys, free text) are not
+    candidates: they trivially determine every other column there, so tracking
+    them would store up to MAX_DETERMINANT_VALUES values for each of them, and a
+    column which repeats over all rows will almost surely repeat in the first
+    ones unless they are very few.
+    """
+
+    def __init__(self, n_fields: int, sample_rows: int = DEPENDENCY_SAMPLE_ROWS):
+        self.n_fields = n_fields
+        self.sample_rows = sample_rows
+        self.rows = 0
+
+        self._sample = []  # type: List[Tuple[str, ...]]
+        self._candidates = None  # type: Optional[List[_Candidate]]
+
+    def add(self, row: Sequence[str]):
+        row = tuple(row[:self.n_fields]) + ("",) * (self.n_fields - len(row))
+        self.rows += 1
+
+        if self._candidates is None:
+            self._sample.append(row)
+            if len(self._sample) >= self.sample_rows:
+                self._start_checking()
+            return
+
+        self._check(row)
+
+    def _start_checking(self):
+        _, n_classes = partition_columns(self._sample, self.n_fields)
+        self._candidates = [_Candidate(x, ys)
+                            for x, ys in sample_dependencies(self._sample, self.n_fields, repeating=False).items()
+                            if n_classes[x] < len(self._sample)]
+        for row in self._sample:
+            self._check(row)
+        self._sample = []
+
+    def _check(self, row: Tuple[str, ...]):
+        live = [c.check(row) for c in self._candidates]
+        if not all(live):
+            self._candidates = [c for c, keep in zip(self._candidates, live) if keep]
+
+    def dependencies(self) -> Dict[int, List[int]]:
+        """
+        Returns the dependent columns of each column which determines others in every row added, and which repeats
+        (has at most one distinct value per two rows.)
+        """
+
+        if self._candidates is None:
+            return sample_dependencies(self._sample, self.n_fields)
+
+        return {c.column: list(c.dependents) for c in self._candidates if len(c.values) * 2 <= self.rows}
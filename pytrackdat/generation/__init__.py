@@ -17,9 +17,9 @@
 # Contact information:
 #     David Lougheed (david.lougheed@gmail.com)
 
+import argparse
 import csv
 import getpass
-import gzip
 import importlib
 import io
 import os
@@ -32,24 +32,37 @@ import sys
 from datetime import datetime
 from decimal import Decimal
 from pathlib import Path
-from typing import IO, List, Optional, Union
+from typing import IO, Dict, List, Optional, Union
 
 from ..common import *
+from ..profiling import PhaseTimer, run_script, timer_from_args
+from .config import BuildConfig, is_common_password, password_problem, read_build_config, site_url_problem
 from .constants import *
 
+from . import config
 from . import constants
+from . import environments
 from . import errors
 from . import formatters
+from . import many
+from . import schema
+from . import update
 from . import utils
 
 
 __all__ = [
+    "config",
     "constants",
+    "environments",
     "errors",
     "formatters",
+    "many",
+    "schema",
+    "update",
     "utils",
     "get_default_from_csv_with_type",
     "design_to_relations",
+    "load_design",
     "create_admin",
     "create_models",
     "create_api",
@@ -242,7 +255,61 @@ def design_to_relations(df: IO, gis_mode: bool) -> List[Relation]:
                                     choices=", ".join(choices)
                                 ))
 
-                        current_field_obj.choices = choices if choices is not None and len(choices) > 1 else None
+                        current_field_obj = current_field_obj.with_choices(
+                            choices if choices is not None and len(choices) > 1 else None)
+
+                        if len(current_field_obj.additional_fields) >= 3:
+                            if not is_coded_text_field(data_type, current_field_obj.additional_fields):
+                                raise errors.GenerationError(
+                                    "Error: Unknown storage setting for field '{field}' in relation '{relation}': "
+                                    "'{storage}'. \n"
+                                    "       The only available setting is '{coded}'.".format(
+                                        field=current_field[1],
+                                        relation=design_relation_name,
+                                        storage=current_field_obj.additional_fields[2],
+                                        coded=TEXT_STORAGE_CODED
+                                    ))
+
+                            if current_field_obj.choices is None:
+                                raise errors.GenerationError(
+                                    "Error: Field '{field}' in relation '{relation}' can only be stored as codes if \n"
+                                    "       it has at least two options.".format(
+                                        field=current_field[1],
+                                        relation=design_relation_name
+                                    ))
+
+                    if data_type == DT_MANUAL_KEY and len(current_field_obj.additional_fields) >= 1 and \
+                            not merges_repeated_keys(data_type, current_field_obj.additional_fields):
+                        raise errors.GenerationError(
+                            "Error: Unknown repeats setting for key '{field}' in relation '{relation}': "
+                            "'{repeats}'. \n"
+                            "       The only available setting is '{merge}'.".format(
+                                field=current_field[1],
+                                relation=design_relation_name,
+                                repeats=current_field_obj.additional_fields[0],
+                                merge=KEY_REPEATS_MERGE
+                            ))
+
+                    if data_type == DT_INTEGER and len(current_field_obj.additional_fields) >= 3:
+                        if not is_unsigned_integer_field(data_type, current_field_obj.additional_fields):
+                            raise errors.GenerationError(
+                                "Error: Unknown storage setting for field '{field}' in relation '{relation}': "
+                                "'{storage}'. \n"
+                                "       The only available setting is '{unsigned}'.".format(
+                                    field=current_field[1],
+                                    relation=design_relation_name,
+                                    storage=current_field_obj.additional_fields[2],
+                                    unsigned=INTEGER_STORAGE_UNSIGNED
+                                ))
+
+                        value_range = formatters.integer_field_range(current_field_obj)
+                        if value_range is None or value_range[0] < 0:
+                            raise errors.GenerationError(
+                                "Error: Field '{field}' in relation '{relation}' can only be unsigned if it has a \n"
+                                "       min_value and max_value (and default) of 0 or more.".format(
+                                    field=current_field[1],
+                                    relation=design_relation_name
+                                ))
 
                     relation_fields.append(current_field_obj)
 
@@ -274,6 +341,32 @@ def design_to_relations(df: IO, gis_mode: bool) -> List[Relation]:
     return relations
 
 
+def load_design(design_file: str, gis_mode: bool, schema_path: Optional[str] = None) -> List[Relation]:
+    """
+    Reads the relations of a design file. If a compiled schema file is given, they are loaded from it instead as long
+    as the design file (and GIS mode) have not changed since it was compiled; otherwise, the design file is parsed and
+    validated, and the schema is compiled again. Raises GenerationError if the design file is invalid.
+    """
+
+    with open(design_file, "rb") as df:
+        contents = df.read()
+
+    design_hash = schema.hash_design(contents)
+
+    if schema_path is not None:
+        compiled = schema.read_schema(schema_path)
+        if compiled is not None and compiled.matches(design_hash, gis_mode):
+            return list(compiled.relations)
+
+    # Decoded the same way as a design file opened in text mode.
+    relations = design_to_relations(io.TextIOWrapper(io.BytesIO(contents)), gis_mode)
+
+    if schema_path is not None and len(relations) > 0:
+        schema.write_schema(schema_path, schema.CompiledSchema(design_hash, gis_mode, relations))
+
+    return relations
+
+
 def create_admin(relations: List[Relation], site_name: str, gis_mode: bool) -> io.StringIO:
     """
     Creates the contents of the admin.py file for the Django data application.
@@ -355,6 +448,9 @@ API_FILTERABLE_FIELD_TYPES = {
     DT_FOREIGN_KEY: ["exact", "in"],
 }
 
+# Coded text fields are filtered by their integer codes.
+API_CODED_FIELD_LOOKUPS = ["exact", "in"]
+
 
 def create_api(relations: List[Relation], site_name: str, gis_mode: bool) -> io.StringIO:
     """
@@ -376,7 +472,8 @@ def create_api(relations: List[Relation], site_name: str, gis_mode: bool) -> io.
         api_file.write(MODEL_VIEWSET_TEMPLATE.format(
             relation_name=relation.name,
             filterset_fields=pprint.pformat(
-                {f.name: API_FILTERABLE_FIELD_TYPES[f.data_type]
+                {f.name: (API_CODED_FIELD_LOOKUPS if is_coded_text_field(f.data_type, f.additional_fields)
+                          else API_FILTERABLE_FIELD_TYPES[f.data_type])
                  for f in relation.fields if f.data_type in API_FILTERABLE_FIELD_TYPES},
                 indent=12, width=120, compact=True),
             categorical_fields="('{}',)".format(
@@ -385,6 +482,11 @@ def create_api(relations: List[Relation], site_name: str, gis_mode: bool) -> io.
                 {f.name: f.choices + (("",) if f.nullable else ())
                  for f in relation.fields if f.choices is not None},
                 indent=12, width=120, compact=True),
+            categorical_codes=pprint.pformat(
+                {f.name: dict(choice_codes(f.choices))
+                 for f in relation.fields
+                 if f.choices is not None and is_coded_text_field(f.data_type, f.additional_fields)},
+                indent=12, width=120, compact=True),
         ))
 
         api_file.write(MODEL_ROUTER_REGISTRATION_TEMPLATE.format(
@@ -401,8 +503,12 @@ def create_api(relations: List[Relation], site_name: str, gis_mode: bool) -> io.
 TEMP_DIRECTORY = os.path.join(os.getcwd(), "tmp")
 
 
+USAGE = ("ptd-generate [--schema FILE] [--update] [--offline] [--config FILE | --non-interactive] [--work-dir DIR] "
+         "[--profile[=FILE]] design.csv output_site_name")
+
+
 def print_usage():
-    print("Usage: ptd-generate design.csv output_site_name")
+    print("Usage: {}".format(USAGE))
 
 
 def sanitize_and_check_site_name(site_name_raw: str) -> str:
@@ -427,47 +533,199 @@ def sanitize_and_check_site_name(site_name_raw: str) -> str:
     return site_name
 
 
-def is_common_password(password: str, package_dir: str) -> bool:
-    # Try to use password list created by Royce Williams and adapted for the Django project:
-    # https://gist.github.com/roycewilliams/281ce539915a947a23db17137d91aeb7
-
-    common_passwords = {"password", "123456", "12345678"}  # Fallbacks if file not present
-    try:
-        with gzip.open(os.path.join(package_dir, "common-passwords.txt.gz")) as f:
-            common_passwords = {p.strip() for p in f.read().decode().splitlines()
-                                if len(p.strip()) >= 8}  # Don't bother including too-short passwords
-    except OSError:
-        pass
-
-    return password.lower().strip() in common_passwords
-
-
 def copy_buf_to_path(buf, path):
     with open(path, "w") as fh:
         shutil.copyfileobj(buf, fh)
 
 
-def clean_up(package_dir: str, django_site_name: str):
+def clean_up(package_dir: str, django_site_name: str, temp_directory: str = TEMP_DIRECTORY):
     subprocess.run((os.path.join(package_dir, "os_scripts", "clean_up.bat" if os.name == "nt" else "clean_up.bash"),
-                    package_dir, django_site_name, TEMP_DIRECTORY))
+                    package_dir, django_site_name, temp_directory))
 
 
 def get_script_file_name(name: str):
     return "{}.{}".format(name, "bat" if os.name == "nt" else "bash")
 
 
+def archive_site(django_site_name: str, temp_directory: str = TEMP_DIRECTORY) -> str:
+    """
+    Archives a site built in the given directory into the current one, returning the path of the archive.
+    """
+    return shutil.make_archive(django_site_name, "zip", root_dir=temp_directory, base_dir=django_site_name)
+
+
+def use_shared_environment(package_dir: str, gis_mode: bool, timer: PhaseTimer):
+    """
+    Installs (if needed) the shared environment for the site's requirements from the wheelhouse, and points the OS
+    scripts at it instead of having them create environments of their own from the network.
+    """
+
+    cache_dir = environments.cache_directory()
+
+    if not os.path.isdir(environments.wheelhouse_path(cache_dir)):
+        exit_with_error("Error: No wheelhouse was found in '{}'. \n"
+                        "       Run ptd-wheelhouse{} first.".format(environments.wheelhouse_path(cache_dir),
+                                                                   " --gis" if gis_mode else ""))
+
+    with timer.phase("shared environment"):
+        try:
+            env_path = environments.ensure_environment(package_dir, cache_dir, gis_mode)
+        except subprocess.CalledProcessError:
+            exit_with_error("Error: The shared environment could not be installed from the wheelhouse in '{}'. \n"
+                            "       Run ptd-wheelhouse{} again to bring it up to date with the requirements.".format(
+                                environments.wheelhouse_path(cache_dir), " --gis" if gis_mode else ""))
+
+    os.environ[environments.SHARED_ENV_ENV_VAR] = env_path
+    print("Using the shared environment '{}'.\n".format(env_path))
+
+
+def prompt_admin_account(package_dir: str, django_site_name: str, temp_directory: str):
+    """
+    Asks for the site's administrator account: its username, email and password.
+    """
+
+    print("\n================ ADMINISTRATIVE SETUP ================")
+
+    admin_username = ""
+    admin_email = ""
+    admin_password = "1"
+    admin_password_2 = "2"
+
+    try:
+        admin_username = input("Admin Account Username: ")
+        while admin_username.strip() == "":
+            print("Please enter a username.")
+            admin_username = input("Admin Account Username: ")
+        admin_email = input("Admin Account Email (Optional): ")
+
+        while admin_password != admin_password_2:
+            admin_password = getpass.getpass("Admin Account Password: ")
+
+            problem = password_problem(admin_password, package_dir)
+            if problem is not None:
+                print("Error: {}".format(problem))
+                admin_password = "1"
+                admin_password_2 = "2"
+                continue
+
+            admin_password_2 = getpass.getpass("Admin Account Password Again: ")
+
+            if admin_password != admin_password_2:
+                print("Error: Passwords do not match. Please try again.")
+
+    except KeyboardInterrupt:
+        print("\n\nCleaning up and exiting...")
+        clean_up(package_dir, django_site_name, temp_directory)
+        print("Done.\n")
+        exit(0)
+
+    print("======================================================\n")
+
+    return admin_username, admin_email, admin_password
+
+
+def update_site(package_dir: str, django_site_name: str, temp_directory: str, relations: List[Relation],
+                gis_mode: bool, buffers: Dict[str, io.StringIO], timer: PhaseTimer):
+    """
+    Updates a previously generated site to new relations: only the generated files whose contents changed (and any
+    of PyTrackDat's files copied into the site which changed since) are rewritten, and if the models changed, their
+    migrations are made and applied to the site's existing database, in its existing environment. The site keeps the
+    build options it was generated with.
+    """
+
+    site_state = update.read_site_state(temp_directory, django_site_name)
+
+    if site_state is None:
+        exit_with_error("Error: No previously generated site '{}' was found in '{}' to update. \n"
+                        "       Generate it without --update first.".format(django_site_name, temp_directory))
+
+    if site_state.gis_mode != gis_mode:
+        exit_with_error("Error: Site '{}' was generated with GIS mode {}. To change GIS mode, generate it \n"
+                        "       again without --update.".format(django_site_name, "on" if site_state.gis_mode
+                                                                 else "off"))
+
+    print("Updating site '{}'...".format(django_site_name))
+    for change in update.diff_relations(site_state.relations, relations) or ["No changes to relations"]:
+        print("    {}".format(change))
+
+    # With --noinput, Django cannot ask for a value for the existing rows and the migration fails; stop before any of
+    # the site's files are changed instead.
+    fields_needing_defaults = update.fields_needing_defaults(site_state.relations, relations)
+    if fields_needing_defaults:
+        exit_with_error("Error: The rows already in the site's database would have no value for these new fields: \n"
+                        "{}\n"
+                        "       Give them a default value or make them nullable in the design file.".format(
+                            "\n".join("           {}".format(f) for f in fields_needing_defaults)))
+
+    core_app_path = os.path.join(temp_directory, django_site_name, "core")
+
+    with timer.phase("file update"):
+        changed_files = [f for f, buf in buffers.items()
+                         if update.write_if_changed(buf, os.path.join(core_app_path, f))]
+
+        # Keep the site's copies of PyTrackDat's own files current as well.
+        changed_files.extend(update.refresh_tree(os.path.join(package_dir, "app_includes"), core_app_path))
+        changed_files.extend(f for f in ("common.py", "readers.py")
+                             if update.copy_if_changed(os.path.join(package_dir, f), os.path.join(core_app_path, f)))
+
+    for f in changed_files:
+        print("    Rewrote 'core/{}'".format(f.replace(os.sep, "/")))
+
+    print()
+
+    if "models.py" in changed_files:
+        try:
+            run_script((
+                os.path.join(package_dir, "os_scripts", get_script_file_name("run_site_update")),
+                package_dir,  # $1
+                django_site_name,  # $2
+                temp_directory,  # $3
+                str(site_state.is_production_build),  # $4
+                str(gis_mode),  # $5
+            ), timer, "site update script")
+
+        except subprocess.CalledProcessError:
+            exit_with_error("Error: An error occurred while running the site update script (see the migration output "
+                            "above).\nTerminating...")
+
+    update.write_site_state(temp_directory, django_site_name, update.SiteState(
+        relations, gis_mode, site_state.is_production_build, site_state.site_url))
+
+    with timer.phase("archive"):
+        archive_site(django_site_name, temp_directory)
+
+
 # TODO: TIMEZONES
 # TODO: Multiple date formats
 # TODO: More ways for custom validation
 # TODO: More customization options
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     print_license()
 
-    if len(sys.argv) != 3:
-        print_usage()
-        exit(1)
+    parser = argparse.ArgumentParser(prog="ptd-generate", usage=USAGE)
+    parser.add_argument("--schema", metavar="FILE",
+                        help="Keep the validated design in the compiled schema FILE, and load it from there instead "
+                             "of the design file as long as the design file is unchanged.")
+    parser.add_argument("--update", action="store_true",
+                        help="Update the previously generated site of the same name instead of building it again, "
+                             "keeping its environment, data and build options.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Set the site up without network access, from the wheelhouse built by ptd-wheelhouse, "
+                             "in an environment shared with other sites with the same requirements.")
+    parser.add_argument("--config", metavar="FILE",
+                        help="Run unattended, taking the answers to the build questions from the configuration FILE "
+                             "and the environment instead of asking them.")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="Run unattended, taking the answers to the build questions from the environment only.")
+    parser.add_argument("--work-dir", metavar="DIR", default=TEMP_DIRECTORY,
+                        help="Directory in which the site is built (default: ./tmp.)")
+    parser.add_argument("design_file", help="Design file to generate the site from.")
+    parser.add_argument("site_name", help="Name of the site to generate.")
+
+    argv, timer = timer_from_args("ptd-generate", sys.argv[1:] if argv is None else argv)
+    args = parser.parse_args(argv)
 
     # TODO: EXPERIMENTAL: GIS MODE
     gis_mode = os.environ.get("PTD_GIS", "false").lower() == "true"
@@ -477,25 +735,32 @@ def main():
         if spatialite_library_path == "":
             exit_with_error("Error: Please set SPATIALITE_LIBRARY_PATH.")
 
-    args = sys.argv[1:]
-
     # TODO: Make path more robust
     package_dir = Path(os.path.dirname(__file__)).parent
 
-    design_file = args[0]  # File name for design file input
+    design_file = args.design_file  # File name for design file input
 
     django_site_name = ""
     try:
-        django_site_name = sanitize_and_check_site_name(args[1])
+        django_site_name = sanitize_and_check_site_name(args.site_name)
     except ValueError as e:
         exit_with_error(str(e))
 
-    if not os.path.exists(TEMP_DIRECTORY):
-        os.makedirs(TEMP_DIRECTORY)
+    temp_directory = os.path.abspath(args.work_dir)
+    if not os.path.exists(temp_directory):
+        os.makedirs(temp_directory)
 
     if os.name not in ("nt", "posix"):
         exit_with_error("Unsupported platform.")
 
+    # Read before anything else is done, so that an unattended build with a bad configuration fails right away.
+    build_config = None  # type: Optional[BuildConfig]
+    if (args.config is not None or args.non_interactive) and not args.update:
+        try:
+            build_config = read_build_config(args.config, package_dir)
+        except errors.GenerationError as e:
+            exit_with_error(str(e))
+
     site_url = "localhost"
     is_production_build = False
 
@@ -505,59 +770,80 @@ def main():
 
     relations = []
 
-    try:
-        with open(os.path.join(os.getcwd(), design_file), "r") as df:
-            try:
-                relations = design_to_relations(df, gis_mode)
-            except errors.GenerationError as e:
-                exit_with_error(str(e))
+    with timer.phase("design parse"):
+        try:
+            relations = load_design(os.path.join(os.getcwd(), design_file), gis_mode, args.schema)
+
+        except errors.GenerationError as e:
+            exit_with_error(str(e))
 
-    except FileNotFoundError:
-        exit_with_error("Error: Design file not found: '{}'.".format(design_file))
+        except FileNotFoundError:
+            exit_with_error("Error: Design file not found: '{}'.".format(design_file))
 
-    except IOError:
-        exit_with_error("Error: Design file could not be read: '{}'.".format(design_file))
+        except IOError:
+            exit_with_error("Error: Design file could not be read: '{}'.".format(design_file))
 
     if len(relations) == 0:
         exit_with_error("Error: No relations detected.")
 
-    a_buf = create_admin(relations, django_site_name, gis_mode)
-    m_buf = create_models(relations, gis_mode)
-    api_buf = create_api(relations, django_site_name, gis_mode)
+    with timer.phase("code generation", unit="fields") as phase:
+        a_buf = create_admin(relations, django_site_name, gis_mode)
+        m_buf = create_models(relations, gis_mode)
+        api_buf = create_api(relations, django_site_name, gis_mode)
+        phase.items = sum(len(r.fields) for r in relations)
 
     print("Done.\n")
 
-    try:
-        prod_build = input("Is this a production build? (y/n): ")
+    if args.offline:
+        use_shared_environment(package_dir, gis_mode, timer)
+
+    if args.update:
+        with a_buf, m_buf, api_buf:
+            update_site(package_dir, django_site_name, temp_directory, relations, gis_mode,
+                        {"admin.py": a_buf, "models.py": m_buf, "api.py": api_buf}, timer)
+
+        timer.report()
+        return
 
-        if prod_build.lower() in BOOLEAN_TRUE_VALUES:
-            site_url = input(PRODUCTION_SITE_URL_PROMPT)
-            while "http:" in site_url or "https:" in site_url or "/www." in site_url:
+    if build_config is not None:
+        is_production_build = build_config.is_production_build
+        site_url = build_config.site_url
+        print("Building a {} site{} for admin account '{}'.".format(
+            "production" if is_production_build else "development",
+            " for '{}'".format(site_url) if is_production_build else "", build_config.admin_username))
+
+    else:
+        try:
+            prod_build = input("Is this a production build? (y/n): ")
+
+            if prod_build.lower() in BOOLEAN_TRUE_VALUES:
                 site_url = input(PRODUCTION_SITE_URL_PROMPT)
+                while site_url_problem(site_url):
+                    site_url = input(PRODUCTION_SITE_URL_PROMPT)
 
-        elif prod_build.lower() not in BOOLEAN_FALSE_VALUES:
-            print("Invalid answer '{}', assuming 'n'...".format(prod_build))
+            elif prod_build.lower() not in BOOLEAN_FALSE_VALUES:
+                print("Invalid answer '{}', assuming 'n'...".format(prod_build))
 
-        is_production_build = prod_build.lower() in BOOLEAN_TRUE_VALUES
+            is_production_build = prod_build.lower() in BOOLEAN_TRUE_VALUES
 
-    except KeyboardInterrupt:
-        print("\nExiting...\n")
-        exit(0)
+        except KeyboardInterrupt:
+            print("\nExiting...\n")
+            exit(0)
 
     print()
 
-    core_app_path = os.path.join(TEMP_DIRECTORY, django_site_name, "core")
-    django_site_path = os.path.join(TEMP_DIRECTORY, django_site_name, django_site_name)
+    core_app_path = os.path.join(temp_directory, django_site_name, "core")
+    django_site_path = os.path.join(temp_directory, django_site_name, django_site_name)
 
     with a_buf, m_buf, api_buf:
         # Clean up any old remnants
-        clean_up(package_dir, django_site_name)
+        clean_up(package_dir, django_site_name, temp_directory)
 
         # Run site creation script
-        subprocess.run((
+        run_script((
             os.path.join(package_dir, "os_scripts", get_script_file_name("create_django_site")),
-            package_dir, django_site_name, TEMP_DIRECTORY, "Dockerfile{}.template".format(".gis" if gis_mode else "")
-        ), check=True)
+            package_dir, django_site_name, temp_directory, "Dockerfile{}.template".format(".gis" if gis_mode else "")
+        ), timer, "site creation script")
 
         # Write admin file contents to disk
         copy_buf_to_path(a_buf, os.path.join(core_app_path, "admin.py"))
@@ -598,70 +884,43 @@ def main():
         uf.write(old_contents.replace(URL_OLD, URL_NEW))
         uf.truncate()
 
-    print("\n================ ADMINISTRATIVE SETUP ================")
+    if build_config is not None:
+        admin_username = build_config.admin_username
+        admin_email = build_config.admin_email
+        admin_password = build_config.admin_password
 
-    admin_username = ""
-    admin_email = ""
-    admin_password = "1"
-    admin_password_2 = "2"
-
-    try:
-        admin_username = input("Admin Account Username: ")
-        while admin_username.strip() == "":
-            print("Please enter a username.")
-            admin_username = input("Admin Account Username: ")
-        admin_email = input("Admin Account Email (Optional): ")
-
-        while admin_password != admin_password_2:
-            admin_password = getpass.getpass("Admin Account Password: ")
-
-            # TODO: Properly check password validity
-            if len(admin_password.strip()) < 8:
-                print("Error: Please enter a more secure password (8 or more characters).")
-                admin_password = "1"
-                admin_password_2 = "2"
-                continue
-
-            if is_common_password(admin_password, package_dir=package_dir):
-                print("Error: Please enter in a less commonly-used password (8 or more characters).")
-                admin_password = "1"
-                admin_password_2 = "2"
-                continue
-
-            admin_password_2 = getpass.getpass("Admin Account Password Again: ")
-
-            if admin_password != admin_password_2:
-                print("Error: Passwords do not match. Please try again.")
-
-    except KeyboardInterrupt:
-        print("\n\nCleaning up and exiting...")
-        clean_up(package_dir, django_site_name)
-        print("Done.\n")
-        exit(0)
-
-    print("======================================================\n")
+    else:
+        admin_username, admin_email, admin_password = prompt_admin_account(package_dir, django_site_name,
+                                                                           temp_directory)
 
     try:
         # TODO: Make path more robust
-        subprocess.run((
+        run_script((
             os.path.join(package_dir, "os_scripts", get_script_file_name("run_site_setup")),
             package_dir,  # $1
             django_site_name,  # $2
-            TEMP_DIRECTORY,  # $3
+            temp_directory,  # $3
             admin_username,  # $4
             admin_email,  # $5
             admin_password,  # $6
             site_url,  # $7
             str(is_production_build),  # $8
             str(gis_mode),  # $9
-        ), check=True)
+        ), timer, "site setup script")
 
     except subprocess.CalledProcessError:
         # Need to catch subprocess errors to prevent password from being shown onscreen.
-        clean_up(package_dir, django_site_name)
+        clean_up(package_dir, django_site_name, temp_directory)
         exit_with_error("Error: An error occurred while running the site setup script.\nTerminating...")
 
-    shutil.make_archive(django_site_name, "zip", root_dir=os.path.join(os.getcwd(), "tmp"), base_dir=django_site_name)
+    # Recorded for later updates
+    update.write_site_state(temp_directory, django_site_name, update.SiteState(
+        relations, gis_mode, is_production_build, site_url))
+
+    with timer.phase("archive"):
+        archive_site(django_site_name, temp_directory)
+
+    timer.report()
 
 
 if __name__ == "__main__":
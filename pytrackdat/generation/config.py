@@ -0,0 +1,177 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Build configuration: the answers to ptd-generate's questions (whether the build is for production, the site's URL
+# and the administrator account), read from a configuration file and the environment so that builds can run
+# unattended. The administrator's password is only ever read from a separate secrets file.
+
+import configparser
+import gzip
+import os
+import stat
+
+from typing import Dict, Optional
+
+from ..common import *
+from .errors import GenerationError
+
+
+__all__ = [
+    "CONFIG_ENV_VARS",
+    "BuildConfig",
+    "is_common_password",
+    "site_url_problem",
+    "password_problem",
+    "read_password_file",
+    "read_build_config",
+]
+
+
+# Environment variables which override the corresponding settings of a configuration file.
+CONFIG_ENV_VARS = {
+    ("site", "production"): "PTD_PRODUCTION",
+    ("site", "url"): "PTD_SITE_URL",
+    ("admin", "username"): "PTD_ADMIN_USERNAME",
+    ("admin", "email"): "PTD_ADMIN_EMAIL",
+    ("admin", "password_file"): "PTD_ADMIN_PASSWORD_FILE",
+}
+
+
+class BuildConfig:
+    def __init__(self, is_production_build: bool, site_url: str, admin_username: str, admin_email: str,
+                 admin_password: str):
+        self.is_production_build = is_production_build
+        self.site_url = site_url
+        self.admin_username = admin_username
+        self.admin_email = admin_email
+        self.admin_password = admin_password
+
+    def __repr__(self):  # Leaves the password out, in case a configuration ends up in a log
+        return "BuildConfig(is_production_build={!r}, site_url={!r}, admin_username={!r}, admin_email={!r})".format(
+            self.is_production_build, self.site_url, self.admin_username, self.admin_email)
+
+
+def is_common_password(password: str, package_dir: str) -> bool:
+    # Try to use password list created by Royce Williams and adapted for the Django project:
+    # https://gist.github.com/roycewilliams/281ce539915a947a23db17137d91aeb7
+
+    common_passwords = {"password", "123456", "12345678"}  # Fallbacks if file not present
+    try:
+        with gzip.open(os.path.join(package_dir, "common-passwords.txt.gz")) as f:
+            common_passwords = {p.strip() for p in f.read().decode().splitlines()
+                                if len(p.strip()) >= 8}  # Don't bother including too-short passwords
+    except OSError:
+        pass
+
+    return password.lower().strip() in common_passwords
+
+
+def site_url_problem(site_url: str) -> Optional[str]:
+    if "http:" in site_url or "https:" in site_url or "/www." in site_url or site_url.startswith("www."):
+        return "Please enter the production site URL without 'www.' or 'http://'."
+    if site_url.strip() == "":
+        return "Please enter the production site URL."
+    return None
+
+
+def password_problem(password: str, package_dir: str) -> Optional[str]:
+    # TODO: Properly check password validity
+    if len(password.strip()) < 8:
+        return "Please enter a more secure password (8 or more characters)."
+    if is_common_password(password, package_dir=package_dir):
+        return "Please enter in a less commonly-used password (8 or more characters)."
+    return None
+
+
+def read_password_file(path: str) -> str:
+    """
+    Reads a password from the first line of a secrets file, warning if other users can read the file.
+    """
+
+    try:
+        with open(path, "r") as pf:
+            password = pf.readline().rstrip("\r\n")
+    except OSError:
+        raise GenerationError("Error: Admin password file could not be read: '{}'.".format(path))
+
+    if os.name == "posix" and os.stat(path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        print("Warning: Admin password file '{}' can be read by other users; \n"
+              "         consider restricting it with chmod 600.\n".format(path))
+
+    return password
+
+
+def _boolean(value: str, name: str) -> bool:
+    if value.strip().lower() in BOOLEAN_TRUE_VALUES:
+        return True
+    if value.strip().lower() in BOOLEAN_FALSE_VALUES:
+        return False
+    raise GenerationError("Error: Invalid value '{}' for setting '{}' (expected yes or no).".format(value, name))
+
+
+def read_build_config(path: Optional[str], package_dir: str, environ: Optional[Dict[str, str]] = None) -> BuildConfig:
+    """
+    Reads a build configuration from an INI-style file (if given), with any settings set in the environment taking
+    precedence, and validates it as the interactive prompts would. A relative password file path is relative to the
+    configuration file. Raises GenerationError if the configuration is incomplete or invalid.
+    """
+
+    environ = os.environ if environ is None else environ
+    parser = configparser.ConfigParser(interpolation=None)
+
+    if path is not None:
+        try:
+            with open(path, "r") as cf:
+                parser.read_file(cf)
+        except OSError:
+            raise GenerationError("Error: Build configuration file could not be read: '{}'.".format(path))
+        except configparser.Error as e:
+            raise GenerationError("Error: Invalid build configuration file '{}':\n       {}".format(path, e))
+
+    config_dir = os.path.dirname(os.path.abspath(path)) if path is not None else os.getcwd()
+
+    def setting(section: str, key: str, default: str = "") -> str:
+        env_var = CONFIG_ENV_VARS[(section, key)]
+        if environ.get(env_var, "").strip():
+            return environ[env_var].strip()
+        return parser.get(section, key, fallback=default).strip()
+
+    is_production_build = _boolean(setting("site", "production", "no"), "site.production")
+    site_url = setting("site", "url") if is_production_build else "localhost"
+
+    if is_production_build and site_url_problem(site_url):
+        raise GenerationError("Error: Invalid site URL '{}' in the build configuration. \n"
+                              "       {}".format(site_url, site_url_problem(site_url)))
+
+    admin_username = setting("admin", "username")
+    if admin_username == "":
+        raise GenerationError("Error: No admin account username (admin.username or {}) in the build "
+                              "configuration.".format(CONFIG_ENV_VARS[("admin", "username")]))
+
+    password_file = setting("admin", "password_file")
+    if password_file == "":
+        raise GenerationError("Error: No admin password file (admin.password_file or {}) in the build "
+                              "configuration.".format(CONFIG_ENV_VARS[("admin", "password_file")]))
+
+    admin_password = read_password_file(os.path.join(config_dir, os.path.expanduser(password_file)))
+    if password_problem(admin_password, package_dir):
+        raise GenerationError("Error: Invalid admin password in '{}'. \n"
+                              "       {}".format(password_file, password_problem(admin_password, package_dir)))
+
+    return BuildConfig(is_production_build, site_url, admin_username, setting("admin", "email"), admin_password)
@@ -52,6 +52,8 @@ __all__ = [
     "DISABLE_MAX_FIELDS",
 
     "BASIC_NUMBER_TYPES",
+    "INTEGER_FIELD_TYPES",
+    "INTEGER_RANGE_HEADROOM",
 ]
 
 
@@ -136,6 +138,7 @@ class {name}(models.Model):
 
 API_FILE_HEADER = """# Generated using PyTrackDat v{version}
 
+from django.db.models import Count
 from rest_framework import serializers
 from rest_framework import viewsets
 from rest_framework.decorators import action
@@ -148,6 +151,20 @@ from pytrackdat_snapshot_manager.models import Snapshot
 api_router = DefaultRouter()
 
 
+class CodedChoiceField(serializers.ChoiceField):
+    # Represents coded text fields by their values instead of their integer codes; codes are still accepted as input.
+    # Other choice fields are represented and accepted as-is.
+
+    def to_representation(self, value):
+        return self.choices.get(value, value)
+
+    def to_internal_value(self, data):
+        for code, label in self.choices.items():
+            if data == label:
+                return code
+        return super().to_internal_value(data)
+
+
 # TODO: Move to snapshot app?
 class SnapshotSerializer(serializers.ModelSerializer):
     class Meta:
@@ -180,6 +197,8 @@ api_router.register(r'meta', MetaViewSet, basename='meta')
 
 MODEL_SERIALIZER_TEMPLATE = """
 class {relation_name}Serializer(serializers.ModelSerializer):
+    serializer_choice_field = CodedChoiceField
+
     class Meta:
         model = {relation_name}
         fields = {fields}
@@ -194,10 +213,14 @@ class {relation_name}ViewSet(viewsets.ModelViewSet):
     def categorical_counts(self, _request):
         categorical_fields = {categorical_fields}
         categorical_choices = {categorical_choices}
+        categorical_codes = {categorical_codes}
         counts = {{f: {{c: 0 for c in categorical_choices[f]}} for f in categorical_fields}}
-        for row in {relation_name}.objects.values():
-            for f in categorical_fields:
-                counts[f][row[f]] += 1
+        for f in categorical_fields:
+            codes = categorical_codes.get(f, {{}})
+            # Counted by the database, with one group per distinct value (or code)
+            for row in {relation_name}.objects.order_by().values(f).annotate(n=Count('pk')):
+                c = "" if row[f] is None else codes.get(row[f], row[f])
+                counts[f][c] = counts[f].get(c, 0) + row['n']
         return Response(counts)
 """
 
@@ -293,3 +316,18 @@ BASIC_NUMBER_TYPES = {
     DT_INTEGER: "IntegerField",
     DT_FLOAT: "FloatField",
 }
+
+# Integer field types with the range of values they can hold, from the most to the least compact. The positive types
+# take the same space as their signed counterparts, but enforce the lower bound; they are only used for fields whose
+# storage setting is 'unsigned'.
+INTEGER_FIELD_TYPES = (
+    ("PositiveSmallIntegerField", 0, 2 ** 15 - 1),
+    ("SmallIntegerField", -2 ** 15, 2 ** 15 - 1),
+    ("PositiveIntegerField", 0, 2 ** 31 - 1),
+    ("IntegerField", -2 ** 31, 2 ** 31 - 1),
+    ("BigIntegerField", -2 ** 63, 2 ** 63 - 1),
+)
+
+# Factor by which the range of an integer field is widened (away from zero) before choosing the field's type, to leave
+# room for values beyond those seen when the data was analyzed.
+INTEGER_RANGE_HEADROOM = 2
@@ -0,0 +1,218 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Offline site setup: a local cache of wheels for the site's requirements (the "wheelhouse"), built once with
+# ptd-wheelhouse, from which environments shared by all sites with the same requirements are installed without
+# network access.
+
+import argparse
+import hashlib
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+from ..common import *
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+__all__ = [
+    "CACHE_DIRECTORY_ENV_VAR",
+    "SHARED_ENV_ENV_VAR",
+    "cache_directory",
+    "wheelhouse_path",
+    "requirement_files",
+    "environment_key",
+    "offline_requirements",
+    "build_wheelhouse",
+    "ensure_environment",
+    "main",
+]
+
+
+# Overrides where wheels and shared environments are kept.
+CACHE_DIRECTORY_ENV_VAR = "PTD_CACHE_DIR"
+
+# Set for the OS scripts to the shared environment they should use instead of creating their own.
+SHARED_ENV_ENV_VAR = "PTD_SHARED_ENV"
+
+# Written into a shared environment once everything is installed in it.
+COMPLETE_MARKER = ".ptd-complete"
+
+
+def cache_directory() -> str:
+    if os.environ.get(CACHE_DIRECTORY_ENV_VAR, "").strip():
+        return os.environ[CACHE_DIRECTORY_ENV_VAR].strip()
+
+    user_cache = os.environ.get("XDG_CACHE_HOME", "").strip() or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(user_cache, "pytrackdat")
+
+
+def wheelhouse_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, "wheelhouse")
+
+
+def requirement_files(package_dir: str, gis_mode: bool) -> List[str]:
+    """
+    Returns the requirement files for setting up a site: those of the setup environment and of the site itself.
+    """
+
+    return [os.path.join(package_dir, "util_files", f)
+            for f in ("requirements_setup.txt", "requirements.txt", *(("requirements_gis.txt",) if gis_mode else ()))]
+
+
+def environment_key(files: List[str]) -> str:
+    """
+    Identifies the environment in which the given requirement files are installed, by the Python version and platform
+    it is made for and by the contents of the files.
+    """
+
+    h = hashlib.blake2b(digest_size=12)
+    h.update("{} {} {}".format(platform.python_version(), sys.platform, platform.machine()).encode("utf-8"))
+    for f in files:
+        with open(f, "rb") as rf:
+            h.update(b"\0" + rf.read())
+    return h.hexdigest()
+
+
+def _environment_python(env_path: str) -> str:
+    if os.name == "nt":
+        return os.path.join(env_path, "Scripts", "python.exe")
+    return os.path.join(env_path, "bin", "python")
+
+
+def _requirement_args(files: List[str]) -> List[str]:
+    return [a for f in files for a in ("-r", f)]
+
+
+def offline_requirements(files: List[str]) -> List[str]:
+    """
+    Returns the requirements in the given files, with requirements on URLs (such as git repositories, which pip would
+    fetch even without an index) replaced by the name of the project, whose wheel is in the wheelhouse.
+    """
+
+    requirements = []
+
+    for f in files:
+        with open(f, "r") as rf:
+            for line in rf:
+                line = line.split(" #")[0].strip()
+                if line == "" or line.startswith(("#", "-")):
+                    continue
+
+                if "://" in line:
+                    egg = re.search(r"[#&]egg=([\w.-]+)", line)
+                    line = egg.group(1) if egg else re.sub(r"\.git$", "", line.split("#")[0].split("@")[0]
+                                                           .rstrip("/").rsplit("/", 1)[-1])
+
+                requirements.append(line)
+
+    return requirements
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on a file for the duration of the block, so that concurrent builds do not create the same
+    shared environment at once. On Windows, no lock is taken.
+    """
+
+    with open(path, "a") as lf:
+        if fcntl is not None:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def build_wheelhouse(package_dir: str, cache_dir: str, gis_mode: bool):
+    """
+    Downloads (and if needed, builds) wheels for every requirement of site setup into the wheelhouse. Needs network
+    access; raises CalledProcessError if pip fails.
+    """
+
+    wheelhouse = wheelhouse_path(cache_dir)
+    os.makedirs(wheelhouse, exist_ok=True)
+
+    subprocess.run((sys.executable, "-m", "pip", "wheel", "--wheel-dir", wheelhouse,
+                    *_requirement_args(requirement_files(package_dir, gis_mode))), check=True)
+
+
+def ensure_environment(package_dir: str, cache_dir: str, gis_mode: bool) -> str:
+    """
+    Returns the path of the shared environment with every requirement of site setup installed, installing it from the
+    wheelhouse without network access if it does not exist yet. Raises CalledProcessError if it cannot be installed.
+    """
+
+    files = requirement_files(package_dir, gis_mode)
+    env_path = os.path.join(cache_dir, "environments", environment_key(files))
+    os.makedirs(os.path.dirname(env_path), exist_ok=True)
+
+    with _locked(env_path + ".lock"):
+        if os.path.isfile(os.path.join(env_path, COMPLETE_MARKER)):
+            return env_path
+
+        # Environments cannot be moved once created, so an incomplete one is removed and created again in place.
+        shutil.rmtree(env_path, ignore_errors=True)
+        # The standard library's venv installs pip without network access, for the Python the environment is keyed by.
+        subprocess.run((sys.executable, "-m", "venv", env_path), check=True)
+        subprocess.run((_environment_python(env_path), "-m", "pip", "install", "--no-index", "--find-links",
+                        wheelhouse_path(cache_dir), *offline_requirements(files)), check=True)
+
+        open(os.path.join(env_path, COMPLETE_MARKER), "w").close()
+
+    return env_path
+
+
+def main():
+    print_license()
+
+    parser = argparse.ArgumentParser(
+        prog="ptd-wheelhouse",
+        description="Builds the local cache of wheels from which ptd-generate --offline sets up sites without network "
+                    "access.")
+    parser.add_argument("--gis", action="store_true", help="Include the requirements of GIS mode.")
+    parser.add_argument("--cache-dir", metavar="DIR",
+                        help="Where to keep wheels and shared environments (default: {}, or the {} environment "
+                             "variable.)".format(cache_directory(), CACHE_DIRECTORY_ENV_VAR))
+    args = parser.parse_args()
+
+    package_dir = Path(os.path.dirname(__file__)).parent
+    cache_dir = args.cache_dir if args.cache_dir is not None else cache_directory()
+
+    try:
+        build_wheelhouse(package_dir, cache_dir, args.gis)
+    except subprocess.CalledProcessError:
+        exit_with_error("Error: Could not build the wheelhouse in '{}'.".format(wheelhouse_path(cache_dir)))
+
+    print("\nBuilt the wheelhouse in '{}'.".format(wheelhouse_path(cache_dir)))
+    if args.cache_dir is not None:
+        print("Set {}={} for ptd-generate --offline to use it.".format(CACHE_DIRECTORY_ENV_VAR, cache_dir))
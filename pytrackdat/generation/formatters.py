@@ -17,8 +17,10 @@
 # Contact information:
 #     David Lougheed (david.lougheed@gmail.com)
 
+from typing import Optional, Tuple
+
 from ..common import *
-from .constants import BASIC_NUMBER_TYPES
+from .constants import BASIC_NUMBER_TYPES, INTEGER_FIELD_TYPES, INTEGER_RANGE_HEADROOM
 from .utils import get_choices_from_text_field
 
 
@@ -27,6 +29,9 @@ __all__ = [
    "auto_key_formatter",
    "manual_key_formatter",
    "foreign_key_formatter",
+   "integer_field_range",
+   "integer_storage_range",
+   "integer_field_type",
    "basic_number_formatter",
    "decimal_formatter",
    "boolean_formatter",
@@ -58,12 +63,65 @@ def foreign_key_formatter(f: RelationField) -> str:
         ))
 
 
+def integer_field_range(f: RelationField) -> Optional[Tuple[int, int]]:
+    """
+    Returns the range of values of an integer field given in the design file, extended to include the default value,
+    or None if no range is given.
+    """
+
+    try:
+        low, high = sorted((int(f.additional_fields[0]), int(f.additional_fields[1])))
+    except (IndexError, ValueError):
+        return None
+
+    if f.default is not None:
+        low, high = min(low, f.default), max(high, f.default)
+
+    return low, high
+
+
+def integer_storage_range(value_range: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Widens a range of integer values away from zero by INTEGER_RANGE_HEADROOM, since ranges usually come from the values
+    seen when the data was analyzed and later values may fall a little beyond them.
+    """
+
+    low, high = value_range
+    return (low * INTEGER_RANGE_HEADROOM if low < 0 else low), (high * INTEGER_RANGE_HEADROOM if high > 0 else high)
+
+
+def integer_field_type(value_range: Optional[Tuple[int, int]], unsigned: bool = False) -> str:
+    """
+    Chooses the most compact integer field type which can hold a range of values, once widened by
+    integer_storage_range, or a plain integer field if no range is known. Signed types are used unless the field is
+    unsigned, in which case positive types are preferred. Integers too large for any integer field type are stored in a
+    decimal field instead.
+    """
+
+    if value_range is None:
+        return "PositiveIntegerField" if unsigned else BASIC_NUMBER_TYPES[DT_INTEGER]
+
+    low, high = integer_storage_range(value_range)
+
+    for positive in ((True, False) if unsigned else (False,)):
+        for field_type, type_low, type_high in INTEGER_FIELD_TYPES:
+            if field_type.startswith("Positive") == positive and type_low <= low and high <= type_high:
+                return field_type
+
+    return "DecimalField"
+
+
 def basic_number_formatter(f: RelationField) -> str:
-    t = BASIC_NUMBER_TYPES[f.data_type]
-    return "models.{type}(help_text='{help_text}', blank={nullable}, null={nullable}{default})".format(
+    value_range = integer_field_range(f) if f.data_type == DT_INTEGER else None
+    t = (integer_field_type(value_range, is_unsigned_integer_field(f.data_type, f.additional_fields))
+         if f.data_type == DT_INTEGER else BASIC_NUMBER_TYPES[f.data_type])
+    return "models.{type}(help_text='{help_text}', blank={nullable}, null={nullable}{digits}{default})".format(
         type=t,
         help_text=clean_field_help_text(f.description),
         nullable=str(f.nullable),
+        digits=(", max_digits={}, decimal_places=0".format(
+            max(len(str(abs(v))) for v in integer_storage_range(value_range)))
+                if t == "DecimalField" else ""),
         default="" if f.default is None else ", default={}".format(f.default)
     )
 
@@ -98,13 +156,16 @@ def text_formatter(f: RelationField) -> str:
         except ValueError:
             pass
 
-    if len(f.additional_fields) == 2:
+    if len(f.additional_fields) >= 2:
         # TODO: Choice human names
         # TODO: Use choices property?
         choice_names = get_choices_from_text_field(f)
         if choice_names is not None:
             choices = tuple(zip(choice_names, choice_names))
 
+            if is_coded_text_field(f.data_type, f.additional_fields):
+                return coded_text_formatter(f, choice_names)
+
     return "models.{field_type}(help_text='{help_text}', blank={blank_value}{default}{choices}{length})".format(
         field_type="TextField" if max_length is None else "CharField",
         help_text=clean_field_help_text(f.description),
@@ -117,6 +178,20 @@ def text_formatter(f: RelationField) -> str:
     )
 
 
+def coded_text_formatter(f: RelationField, choice_names: Tuple[str, ...]) -> str:
+    """
+    Formats a text field with options which is stored as the integer code of each option.
+    """
+
+    codes = choice_codes(choice_names)
+    return "models.PositiveSmallIntegerField(help_text='{help_text}', blank={nullable}, null={nullable}{default}, " \
+           "choices={choices})".format(
+            help_text=clean_field_help_text(f.description),
+            nullable=str(f.nullable),
+            default="" if f.default is None else ", default={}".format(dict((v, c) for c, v in codes)[f.default]),
+            choices=str(codes))
+
+
 def date_formatter(f: RelationField) -> str:
     # TODO: standardize date formatting... I think this might already be standardized?
     return "models.DateField(help_text='{help_text}', blank={nullable}, null={nullable}{default})".format(
@@ -0,0 +1,267 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Building several sites at once (ptd-generate-many): each site is built unattended by ptd-generate in a worker
+# process of its own, in a work directory of its own, and the archives of the sites built are collected at the end.
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from ..common import *
+from ..profiling import PhaseTimer
+from .errors import GenerationError
+
+
+__all__ = [
+    "BUILDS_DIRECTORY_NAME",
+    "SiteBuild",
+    "read_manifest",
+    "build_site",
+    "main",
+]
+
+
+# Name of the directory, in ptd-generate's work directory, in which each site gets its own work directory. Site names
+# cannot contain dashes, so this cannot conflict with a site built there by ptd-generate.
+BUILDS_DIRECTORY_NAME = "ptd-builds"
+
+
+class SiteBuild:
+    """
+    A site to build: the design file it is generated from, its name and the build configuration file to use (if
+    none, the build is configured by the environment alone.)
+    """
+
+    def __init__(self, design_file: str, site_name: str, config_file: Optional[str] = None):
+        self.design_file = design_file
+        self.site_name = site_name
+        self.config_file = config_file
+
+    def __repr__(self):
+        return "SiteBuild({!r}, {!r}, {!r})".format(self.design_file, self.site_name, self.config_file)
+
+
+def read_manifest(path: str) -> List[SiteBuild]:
+    """
+    Reads the sites to build from a CSV manifest, with one site per row: the design file, the site name and
+    optionally a build configuration file. Relative paths are relative to the manifest.
+    """
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    builds = []
+
+    with open(path, "r", newline="") as mf:
+        for i, row in enumerate(csv.reader(mf), 1):
+            row = [c.strip() for c in row]
+            if not any(row) or row[0].startswith("#"):
+                continue
+
+            if len(row) < 2 or row[0] == "" or row[1] == "" or len(row) > 3:
+                raise GenerationError("Error: Invalid row {} in manifest '{}' (expected a design file, a site name "
+                                      "and optionally a build configuration file).".format(i, path))
+
+            builds.append(SiteBuild(os.path.join(base_dir, row[0]), row[1],
+                                    os.path.join(base_dir, row[2]) if len(row) == 3 and row[2] else None))
+
+    return builds
+
+
+def build_site(argv: Sequence[str], build_dir: str, log_path: str) -> Tuple[int, float]:
+    """
+    Runs ptd-generate with the given arguments in the current (worker) process, from the build's directory (where the
+    site's archive is written), with everything it and the OS scripts output written to the log file. Returns the exit
+    status of the build and the time it took.
+    """
+
+    from . import main as generate  # The package imports this module.
+
+    start = time.perf_counter()
+    status = 0
+
+    cwd = os.getcwd()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+
+    # Line-buffered, so that what is printed stays in order with what the OS scripts write to the same file.
+    with open(log_path, "w", buffering=1) as log, redirect_stdout(log), redirect_stderr(log):
+        # Redirected at the level of file descriptors too, so that the output of the OS scripts goes to the log.
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+
+        try:
+            os.chdir(build_dir)
+            generate(list(argv))
+
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+
+        except Exception:
+            traceback.print_exc()
+            status = 1
+
+        finally:
+            os.dup2(saved_fds[0], 1)
+            os.dup2(saved_fds[1], 2)
+            os.close(saved_fds[0])
+            os.close(saved_fds[1])
+            os.chdir(cwd)
+
+    return status, time.perf_counter() - start
+
+
+def main():
+    print_license()
+
+    # Imported here rather than at the top, since the package imports this module.
+    from . import TEMP_DIRECTORY, sanitize_and_check_site_name, use_shared_environment
+
+    parser = argparse.ArgumentParser(
+        prog="ptd-generate-many",
+        description="Builds several sites at once with ptd-generate, unattended, in a pool of worker processes.")
+    parser.add_argument("--manifest", metavar="FILE",
+                        help="CSV file listing the sites to build, one per row: design file, site name and optionally "
+                             "a build configuration file.")
+    parser.add_argument("--config", metavar="FILE",
+                        help="Build configuration file for the sites without one of their own (otherwise, they are "
+                             "configured by the environment.)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, metavar="N",
+                        help="Number of sites built at once (default: the number of CPUs, {}.)".format(
+                            os.cpu_count() or 1))
+    parser.add_argument("--offline", action="store_true",
+                        help="Set the sites up without network access, from the wheelhouse built by ptd-wheelhouse.")
+    parser.add_argument("--update", action="store_true",
+                        help="Update the sites previously built by ptd-generate-many in the same work directory.")
+    parser.add_argument("--work-dir", metavar="DIR", default=os.path.join(TEMP_DIRECTORY, BUILDS_DIRECTORY_NAME),
+                        help="Directory in which each site gets its own work directory (default: ./tmp/{}.)".format(
+                            BUILDS_DIRECTORY_NAME))
+    parser.add_argument("--output-dir", metavar="DIR", default=".",
+                        help="Directory into which the sites' archives are collected (default: the current one.)")
+    parser.add_argument("sites", nargs="*", metavar="DESIGN_FILE SITE_NAME",
+                        help="Design files and the names of the sites to build from them, in pairs.")
+    args = parser.parse_args()
+
+    if len(args.sites) % 2 != 0:
+        exit_with_error("Error: Design files and site names must be given in pairs.")
+
+    builds = [SiteBuild(os.path.abspath(d), s) for d, s in zip(args.sites[::2], args.sites[1::2])]
+
+    if args.manifest is not None:
+        try:
+            builds.extend(read_manifest(args.manifest))
+        except GenerationError as e:
+            exit_with_error(str(e))
+        except OSError:
+            exit_with_error("Error: Manifest could not be read: '{}'.".format(args.manifest))
+
+    if len(builds) == 0:
+        exit_with_error("Error: No sites to build.")
+
+    if args.jobs < 1:
+        exit_with_error("Error: --jobs must be at least 1.")
+
+    # Check everything which can be checked before starting any build.
+    site_names = set()
+    for build in builds:
+        try:
+            build.site_name = sanitize_and_check_site_name(build.site_name)
+        except GenerationError as e:
+            exit_with_error(str(e))
+
+        if build.site_name in site_names:
+            exit_with_error("Error: Site '{}' is listed more than once.".format(build.site_name))
+        site_names.add(build.site_name)
+
+        for f in (build.design_file, build.config_file or args.config):
+            if f is not None and not os.path.isfile(f):
+                exit_with_error("Error: File not found: '{}' (for site '{}').".format(f, build.site_name))
+
+    work_dir = os.path.abspath(args.work_dir)
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if args.offline:
+        # Installed once here, rather than by the first of the builds while the others wait for it.
+        package_dir = Path(os.path.dirname(__file__)).parent
+        gis_mode = os.environ.get("PTD_GIS", "false").lower() == "true"
+        use_shared_environment(package_dir, gis_mode, PhaseTimer("ptd-generate-many"))
+
+    jobs = min(args.jobs, len(builds))
+    print("Building {} sites with {} jobs in '{}'...\n".format(len(builds), jobs, work_dir))
+
+    start = time.perf_counter()
+    results = {}  # Site name: exit status, time taken
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+
+        for build in builds:
+            # Laid out like the directory ptd-generate is run from on its own: the site is built in ./tmp, and its
+            # archive and the build's log are written next to it.
+            build_dir = os.path.join(work_dir, build.site_name)
+            os.makedirs(build_dir, exist_ok=True)
+
+            config_file = build.config_file or args.config
+            argv = [
+                *(("--config", os.path.abspath(config_file)) if config_file is not None else ("--non-interactive",)),
+                *(("--offline",) if args.offline else ()),
+                *(("--update",) if args.update else ()),
+                "--work-dir", os.path.join(build_dir, "tmp"),
+                build.design_file,
+                build.site_name,
+            ]
+
+            futures[executor.submit(build_site, argv, build_dir, os.path.join(build_dir, "build.log"))] = build
+
+        for future in as_completed(futures):
+            build = futures[future]
+            results[build.site_name] = future.result()
+            print("    {} '{}' ({:.1f}s)".format("Built" if results[build.site_name][0] == 0 else "FAILED",
+                                                  build.site_name, results[build.site_name][1]))
+
+    print("\nCollecting archives in '{}'...".format(output_dir))
+
+    failed = []
+    for build in builds:
+        build_dir = os.path.join(work_dir, build.site_name)
+        archive = os.path.join(build_dir, "{}.zip".format(build.site_name))
+
+        if results[build.site_name][0] != 0 or not os.path.isfile(archive):
+            failed.append(build)
+            continue
+
+        shutil.move(archive, os.path.join(output_dir, os.path.basename(archive)))
+
+    print("Built {} of {} sites in {:.1f}s.".format(len(builds) - len(failed), len(builds),
+                                                    time.perf_counter() - start))
+
+    if failed:
+        exit_with_error("Error: {} of {} sites could not be built; see their logs:\n{}".format(
+            len(failed), len(builds), "\n".join("       {}".format(os.path.join(work_dir, b.site_name, "build.log"))
+                                   for b in failed)))
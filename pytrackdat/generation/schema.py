@@ -0,0 +1,158 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Compiled schemas: the validated relations of a design file, stored with a hash of the design file so that they can
+# be loaded instead of parsing the design file again while it is unchanged (and PyTrackDat has not been upgraded.)
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+
+from typing import Any, Dict, List, Optional
+
+from ..common import *
+from .errors import GenerationError
+
+
+__all__ = [
+    "SCHEMA_VERSION",
+    "CompiledSchema",
+    "hash_design",
+    "read_schema",
+    "write_schema",
+    "print_schema",
+    "main",
+]
+
+
+# Bump whenever the layout of compiled schemas, or of Relation or RelationField, changes.
+SCHEMA_VERSION = 2
+
+
+def hash_design(contents: bytes) -> str:
+    return hashlib.blake2b(contents).hexdigest()
+
+
+class CompiledSchema:
+    """
+    The relations parsed from a design file, with the hash of the design file's contents, the mode it was parsed in and
+    the version of PyTrackDat which parsed it (since how design files are parsed may change from one version to the
+    next, even when the layout of compiled schemas does not.)
+    """
+
+    def __init__(self, design_hash: str, gis_mode: bool, relations: List[Relation], version: str = VERSION):
+        self.design_hash = design_hash
+        self.gis_mode = gis_mode
+        self.relations = tuple(relations)
+        self.version = version
+
+    def matches(self, design_hash: str, gis_mode: bool) -> bool:
+        return self.design_hash == design_hash and self.gis_mode == gis_mode and self.version == VERSION
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": SCHEMA_VERSION,
+            "pytrackdat_version": self.version,
+            "design_hash": self.design_hash,
+            "gis_mode": self.gis_mode,
+            "relations": [{"design_name": r.design_name, **dict(r)} for r in self.relations],
+        }
+
+
+def read_schema(path: str) -> Optional[CompiledSchema]:
+    """
+    Loads a compiled schema, or returns None if it is missing, unreadable or of another version.
+    """
+
+    try:
+        with open(path, "rb") as sf:
+            version, schema = pickle.load(sf)
+    except (OSError, EOFError, ValueError, AttributeError, pickle.UnpicklingError):
+        return None
+
+    return schema if version == SCHEMA_VERSION else None
+
+
+def write_schema(path: str, schema: CompiledSchema):
+    # Write to a temporary file first, so an interrupted run cannot leave a truncated schema behind.
+    with open(path + ".tmp", "wb") as sf:
+        pickle.dump((SCHEMA_VERSION, schema), sf, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def _describe_field(f: RelationField) -> str:
+    return ", ".join((
+        f.data_type,
+        *(("nullable",) if f.nullable else ()),
+        *(("default: {!r}".format(f.default),) if f.default is not None else ()),
+        *(("choices: {}".format(" / ".join(f.choices)),) if f.choices is not None else ()),
+        *(("settings: {}".format(", ".join(f.additional_fields)),) if f.additional_fields else ()),
+    ))
+
+
+def print_schema(path: str, schema: CompiledSchema):
+    print("Schema '{}' (format version {}):".format(path, SCHEMA_VERSION))
+    print("    Compiled by: PyTrackDat v{}".format(schema.version))
+    print("    Design file hash: {}".format(schema.design_hash))
+    print("    GIS mode: {}".format(schema.gis_mode))
+    print("    Relations: {}".format(len(schema.relations)))
+
+    for r in schema.relations:
+        print("\n    {} ('{}', {} key):".format(r.name, r.design_name, r.id_type or "no"))
+        width = max(len(f.name) for f in r.fields) if r.fields else 0
+        for f in r.fields:
+            print("        {:<{}}  {}".format(f.name, width, _describe_field(f)))
+
+    print()
+
+
+def main():
+    from . import load_design  # The package imports this module.
+
+    parser = argparse.ArgumentParser(
+        prog="ptd-schema",
+        description="Inspects compiled schemas, written by ptd-generate --schema, or compiles one from a design file.")
+    parser.add_argument("--json", action="store_true", help="Print the schema as JSON.")
+    parser.add_argument("--compile", metavar="DESIGN_FILE",
+                        help="Compile the schema from DESIGN_FILE first, unless it is already up to date.")
+    parser.add_argument("schema_file", help="Compiled schema file.")
+    args = parser.parse_args()
+
+    if args.compile is not None:
+        # Compiled in the same mode as ptd-generate would, so that it can use the schema.
+        gis_mode = os.environ.get("PTD_GIS", "false").lower() == "true"
+        try:
+            load_design(args.compile, gis_mode, args.schema_file)
+        except GenerationError as e:
+            exit_with_error(str(e))
+        except IOError:
+            exit_with_error("Error: Design file could not be read: '{}'.".format(args.compile))
+
+    schema = read_schema(args.schema_file)
+    if schema is None:
+        exit_with_error("Error: '{}' is not a compiled schema of this version of PyTrackDat.".format(args.schema_file))
+
+    if args.json:
+        print(json.dumps(schema.to_json(), indent=2, default=str))
+        return
+
+    print_license()
+    print_schema(args.schema_file, schema)
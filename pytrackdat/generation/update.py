@@ -0,0 +1,203 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Incremental regeneration of a previously generated site (ptd-generate --update): only the files whose contents
+# change are rewritten, and the site's environment and database are kept.
+
+import io
+import os
+import pickle
+
+from typing import List, Optional, Sequence
+
+from ..common import *
+
+
+__all__ = [
+    "SITE_STATE_VERSION",
+    "SiteState",
+    "site_state_path",
+    "read_site_state",
+    "write_site_state",
+    "diff_relations",
+    "fields_needing_defaults",
+    "write_if_changed",
+    "copy_if_changed",
+    "refresh_tree",
+]
+
+
+# Bump whenever the layout of site states, or of Relation or RelationField, changes.
+SITE_STATE_VERSION = 1
+
+
+class SiteState:
+    """
+    What a site was last generated from: its relations and the build options, which an update keeps.
+    """
+
+    def __init__(self, relations: Sequence[Relation], gis_mode: bool, is_production_build: bool, site_url: str):
+        self.relations = tuple(relations)
+        self.gis_mode = gis_mode
+        self.is_production_build = is_production_build
+        self.site_url = site_url
+
+
+def site_state_path(temp_directory: str, site_name: str) -> str:
+    # Kept next to the site's directory rather than in it, so that it is not archived with the site.
+    return os.path.join(temp_directory, "{}.ptd-state".format(site_name))
+
+
+def read_site_state(temp_directory: str, site_name: str) -> Optional[SiteState]:
+    """
+    Returns the state of a previously generated site, or None if there is none which can be updated.
+    """
+
+    if not os.path.isdir(os.path.join(temp_directory, site_name)):
+        return None
+
+    try:
+        with open(site_state_path(temp_directory, site_name), "rb") as sf:
+            version, state = pickle.load(sf)
+    except (OSError, EOFError, ValueError, AttributeError, pickle.UnpicklingError):
+        return None
+
+    return state if version == SITE_STATE_VERSION else None
+
+
+def write_site_state(temp_directory: str, site_name: str, state: SiteState):
+    path = site_state_path(temp_directory, site_name)
+    with open(path + ".tmp", "wb") as sf:
+        pickle.dump((SITE_STATE_VERSION, state), sf, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def diff_relations(old: Sequence[Relation], new: Sequence[Relation]) -> List[str]:
+    """
+    Describes the relations and fields added, removed or changed between two versions of a design.
+    """
+
+    old_relations = {r.name: r for r in old}
+    new_relations = {r.name: r for r in new}
+    changes = []
+
+    for name in old_relations:
+        if name not in new_relations:
+            changes.append("Removed relation '{}'".format(name))
+
+    for name, relation in new_relations.items():
+        if name not in old_relations:
+            changes.append("Added relation '{}'".format(name))
+            continue
+
+        old_fields = {f.name: dict(f) for f in old_relations[name].fields}
+        new_fields = {f.name: dict(f) for f in relation.fields}
+
+        changes.extend("Removed field '{}.{}'".format(name, f) for f in old_fields if f not in new_fields)
+        changes.extend("Added field '{}.{}'".format(name, f) for f in new_fields if f not in old_fields)
+        changes.extend("Changed field '{}.{}'".format(name, f) for f in new_fields
+                       if f in old_fields and new_fields[f] != old_fields[f])
+
+        if list(old_fields) != list(new_fields) and set(old_fields) == set(new_fields):
+            changes.append("Reordered fields of '{}'".format(name))
+
+    return changes
+
+
+def fields_needing_defaults(old: Sequence[Relation], new: Sequence[Relation]) -> List[str]:
+    """
+    Returns the names ('relation.field') of the fields added to existing relations which the rows already in the
+    database would have no value for: fields which are neither nullable nor have a default. Django can only migrate
+    the database by asking for a one-off value for these. Text fields without options can be left blank, so are not
+    included.
+    """
+
+    old_relations = {r.name: r for r in old}
+    fields = []
+
+    for relation in new:
+        if relation.name not in old_relations:
+            continue
+
+        old_fields = {f.name for f in old_relations[relation.name].fields}
+        fields.extend("{}.{}".format(relation.name, f.name) for f in relation.fields
+                      if f.name not in old_fields and f.data_type not in KEY_TYPES and not f.nullable and
+                      f.default is None and not (f.data_type == DT_TEXT and f.choices is None))
+
+    return fields
+
+
+def write_if_changed(buf: io.StringIO, path: str) -> bool:
+    """
+    Writes a buffer's contents to a file, unless the file already has them. Returns whether the file was written.
+    """
+
+    contents = buf.getvalue()
+
+    try:
+        with open(path, "r") as fh:
+            if fh.read() == contents:
+                return False
+    except OSError:
+        pass
+
+    with open(path, "w") as fh:
+        fh.write(contents)
+
+    return True
+
+
+def copy_if_changed(source: str, destination: str) -> bool:
+    """
+    Copies a file, unless the destination already has the same contents. Returns whether the file was copied.
+    """
+
+    with open(source, "rb") as fh:
+        contents = fh.read()
+
+    try:
+        with open(destination, "rb") as fh:
+            if fh.read() == contents:
+                return False
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with open(destination, "wb") as fh:
+        fh.write(contents)
+
+    return True
+
+
+def refresh_tree(source: str, destination: str) -> List[str]:
+    """
+    Copies the files of a directory tree which are missing or different in the destination, as the site creation
+    scripts do, and returns the paths (relative to the destination) of the files copied.
+    """
+
+    copied = []
+
+    for directory, sub_directories, files in os.walk(source):
+        sub_directories[:] = [d for d in sub_directories if d != "__pycache__"]
+        for f in files:
+            relative_path = os.path.relpath(os.path.join(directory, f), source)
+            if copy_if_changed(os.path.join(source, relative_path), os.path.join(destination, relative_path)):
+                copied.append(relative_path)
+
+    return copied
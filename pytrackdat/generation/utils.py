@@ -18,7 +18,7 @@
 #     David Lougheed (david.lougheed@gmail.com)
 
 from typing import Optional, Tuple
-from ..common import DESIGN_SEPARATOR, RelationField
+from ..common import RelationField, parse_choices
 
 
 __all__ = [
@@ -27,9 +27,8 @@ __all__ = [
 
 
 def get_choices_from_text_field(f: RelationField) -> Optional[Tuple[str, ...]]:
-    if len(f.additional_fields) == 2:
+    if len(f.additional_fields) >= 2:
         # TODO: Choice human names
-        choice_names = tuple(str(c).strip() for c in f.additional_fields[1].split(DESIGN_SEPARATOR)
-                             if str(c).strip() != "")
+        choice_names = parse_choices(f.additional_fields[1])
         return choice_names if len(choice_names) > 0 else None
     return None
@@ -8,3 +8,4 @@ cd "$3"
 # Remove existing site data if it exists
 rm -rf ./tmp_env 2> /dev/null
 rm -rf "./$2" 2> /dev/null
+rm -f "./$2.ptd-state"
@@ -6,3 +6,4 @@ cd "%3"
 rem Remove existing site data if it exists
 rmdir /Q /S tmp_env > nul 2> nul
 rmdir /Q /S "%2" > nul 2> nul
+del /Q "%2.ptd-state" > nul 2> nul
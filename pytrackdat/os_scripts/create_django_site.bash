@@ -2,18 +2,33 @@
 
 set -eu
 
+# Mark the start of each phase for ptd-generate --profile
+ptd_phase() {
+  if [[ -n "${PTD_PHASE_MARKERS:-}" ]]; then
+    echo "##ptd-phase $1"
+  fi
+}
+
 # Enter the temporary site construction directory
 cd "$3"
 
-# Create and activate the virtual environment used for setup
-virtualenv -p python3 ./tmp_env
-PS1="" source ./tmp_env/bin/activate
+if [[ -n "${PTD_SHARED_ENV:-}" ]]; then
+  # Set up from the shared environment (ptd-generate --offline), which has everything installed already
+  PS1="" source "$PTD_SHARED_ENV/bin/activate"
+else
+  # Create and activate the virtual environment used for setup
+  ptd_phase "setup environment"
+  virtualenv -p python3 ./tmp_env
+  PS1="" source ./tmp_env/bin/activate
 
-# Install the dependencies required for setup
-pip install -r "$1/util_files/requirements_setup.txt"
+  # Install the dependencies required for setup
+  ptd_phase "pip install"
+  pip install -r "$1/util_files/requirements_setup.txt"
+fi
 
 # Start the Django site
-python ./tmp_env/bin/django-admin startproject "$2"
+ptd_phase "django project"
+python "$(command -v django-admin)" startproject "$2"
 
 # Copy pre-built files to the site folder
 cp "$1/util_files/requirements.txt" "$2/"
@@ -46,6 +61,7 @@ chmod +x ./manage.py
 # Copy pre-built application scripts to the application
 cp -r "$1"/app_includes/* ./core/
 cp "$1/common.py" ./core/
+cp "$1/readers.py" ./core/
 
 # Deactivate the temporary setup virtual environment
 deactivate
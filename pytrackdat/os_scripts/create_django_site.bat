@@ -3,7 +3,14 @@
 rem Enter the temporary site construction directory
 cd "%3"
 
+rem Set up from the shared environment (ptd-generate --offline), which has everything installed already
+if not defined PTD_SHARED_ENV goto setup_environment
+call "%PTD_SHARED_ENV%\Scripts\activate.bat"
+goto start_project
+
+:setup_environment
 rem Create and activate the virtual environment used for setup
+if defined PTD_PHASE_MARKERS echo ##ptd-phase setup environment
 virtualenv -p python3 tmp_env > nul 2> nul
 if errorlevel 1 (
     virtualenv -p python tmp_env
@@ -11,10 +18,13 @@ if errorlevel 1 (
 call tmp_env\Scripts\activate.bat
 
 rem Install the dependencies required for setup
+if defined PTD_PHASE_MARKERS echo ##ptd-phase pip install
 pip install -r "%1\util_files\requirements_setup.txt"
 
+:start_project
 rem Start the Django site
-.\tmp_env\Scripts\django-admin startproject "%2"
+if defined PTD_PHASE_MARKERS echo ##ptd-phase django project
+django-admin startproject "%2"
 
 rem Copy pre-built files to the site folder
 copy /B "%1\util_files\requirements.txt" "%2\"
@@ -45,6 +55,7 @@ python manage.py startapp snapshot_manager
 rem Copy pre-built application scripts to the application
 xcopy "%1\app_includes" core /s /e
 copy /B "%1\common.py" core
+copy /B "%1\readers.py" core
 
 rem Deactivate the temporary setup virtual environment
 deactivate
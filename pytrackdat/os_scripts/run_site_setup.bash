@@ -2,25 +2,42 @@
 
 set -eu
 
+# Mark the start of each phase for ptd-generate --profile
+ptd_phase() {
+  if [[ -n "${PTD_PHASE_MARKERS:-}" ]]; then
+    echo "##ptd-phase $1"
+  fi
+}
+
 cd "$3/$2"
+ptd_phase "site environment"
 rm -rf ./site_env 2> /dev/null
-virtualenv -p python3 ./site_env
-PS1="" source ./site_env/bin/activate
-pip install -r ./requirements.txt
-if [[ "$9" == "True" ]]; then
-  # Install GIS-specific requirements if in GIS mode
-  pip install -r ./requirements_gis.txt
+if [[ -n "${PTD_SHARED_ENV:-}" ]]; then
+  # Link the shared environment (ptd-generate --offline), which has the requirements installed already
+  ln -s "$PTD_SHARED_ENV" ./site_env
+  PS1="" source ./site_env/bin/activate
+else
+  virtualenv -p python3 ./site_env
+  PS1="" source ./site_env/bin/activate
+  ptd_phase "pip install"
+  pip install -r ./requirements.txt
+  if [[ "$9" == "True" ]]; then
+    # Install GIS-specific requirements if in GIS mode
+    pip install -r ./requirements_gis.txt
+  fi
 fi
+ptd_phase "migrations"
 ./manage.py makemigrations
 ./manage.py migrate
 ./manage.py createinitialrevisions
+ptd_phase "admin account"
 if [[ -n "$4" ]]; then
 echo "from django.contrib.auth.models import User; User.objects.create_superuser('$4', '$5', '$6')" \
   | ./manage.py shell > /dev/null
 fi
 deactivate
 
-# Remove virtual environment if this is a production build
+# Remove virtual environment (or the link to the shared one) if this is a production build
 if [[ "$8" == "True" ]]; then
   rm -rf ./site_env 2> /dev/null
 fi
@@ -1,24 +1,42 @@
 @echo off
 
 cd "%3\%2"
+if defined PTD_PHASE_MARKERS echo ##ptd-phase site environment
 rmdir /Q /S site_env > nul 2> nul
+if not defined PTD_SHARED_ENV goto create_environment
+
+rem Link the shared environment (ptd-generate --offline), which has the requirements installed already
+mklink /J site_env "%PTD_SHARED_ENV%" > nul
+call site_env\Scripts\activate.bat
+goto migrate
+
+:create_environment
 virtualenv -p python3 site_env > nul 2> nul
 if errorlevel 1 (
     virtualenv -p python site_env
 )
 call site_env\Scripts\activate.bat
+if defined PTD_PHASE_MARKERS echo ##ptd-phase pip install
 pip install -r requirements.txt
 if "%~9" == "True" (
     pip install -r requirements_gis.txt
 )
+
+:migrate
+if defined PTD_PHASE_MARKERS echo ##ptd-phase migrations
 python manage.py makemigrations
 python manage.py migrate
+if defined PTD_PHASE_MARKERS echo ##ptd-phase admin account
 if "%~4" == "" (
     powershell -Command "echo ""from django.contrib.auth.models import User; User.objects.create_superuser('%4', '%5', '%6')"" | Out-File Dockerfile"
 )
 deactivate
 
-rem Remove virtual environment if this is a production build
-if "%~8" == "True" (
+rem Remove virtual environment (or the link to the shared one, which must not be removed recursively) if this is a
+rem production build
+if not "%~8" == "True" goto :eof
+if defined PTD_SHARED_ENV (
+    rmdir site_env > nul 2> nul
+) else (
     rmdir /Q /S site_env > nul 2> nul
 )
@@ -0,0 +1,44 @@
+#!/usr/bin/env bash
+
+set -eu
+
+# Mark the start of each phase for ptd-generate --profile
+ptd_phase() {
+  if [[ -n "${PTD_PHASE_MARKERS:-}" ]]; then
+    echo "##ptd-phase $1"
+  fi
+}
+
+cd "$3/$2"
+if [[ ! -d ./site_env && -n "${PTD_SHARED_ENV:-}" ]]; then
+  # Link the shared environment (ptd-generate --offline) in place of the one which is missing
+  ptd_phase "site environment"
+  rm -f ./site_env
+  ln -s "$PTD_SHARED_ENV" ./site_env
+  PS1="" source ./site_env/bin/activate
+elif [[ ! -d ./site_env ]]; then
+  # Production builds do not keep their environment; re-create it
+  ptd_phase "site environment"
+  rm -f ./site_env
+  virtualenv -p python3 ./site_env
+  PS1="" source ./site_env/bin/activate
+  ptd_phase "pip install"
+  pip install -r ./requirements.txt
+  if [[ "$5" == "True" ]]; then
+    # Install GIS-specific requirements if in GIS mode
+    pip install -r ./requirements_gis.txt
+  fi
+else
+  PS1="" source ./site_env/bin/activate
+fi
+ptd_phase "migrations"
+# Without prompts, so that unattended updates fail instead of waiting for an answer
+./manage.py makemigrations --noinput
+./manage.py migrate --noinput
+./manage.py createinitialrevisions
+deactivate
+
+# Remove virtual environment (or the link to the shared one) if this is a production build
+if [[ "$4" == "True" ]]; then
+  rm -rf ./site_env 2> /dev/null
+fi
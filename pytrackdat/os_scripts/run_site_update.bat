@@ -0,0 +1,52 @@
+@echo off
+
+cd "%3\%2"
+if exist site_env\Scripts\activate.bat goto activate
+if not defined PTD_SHARED_ENV goto create_environment
+
+rem Link the shared environment (ptd-generate --offline) in place of the one which is missing
+if defined PTD_PHASE_MARKERS echo ##ptd-phase site environment
+rmdir site_env > nul 2> nul
+mklink /J site_env "%PTD_SHARED_ENV%" > nul
+goto activate
+
+:create_environment
+rem Production builds do not keep their environment; re-create it
+if defined PTD_PHASE_MARKERS echo ##ptd-phase site environment
+virtualenv -p python3 site_env > nul 2> nul
+if errorlevel 1 (
+    virtualenv -p python site_env
+)
+call site_env\Scripts\activate.bat
+if defined PTD_PHASE_MARKERS echo ##ptd-phase pip install
+pip install -r requirements.txt
+if "%~5" == "True" (
+    pip install -r requirements_gis.txt
+)
+goto migrate
+
+:activate
+call site_env\Scripts\activate.bat
+
+:migrate
+if defined PTD_PHASE_MARKERS echo ##ptd-phase migrations
+rem Without prompts, so that unattended updates fail instead of waiting for an answer
+python manage.py makemigrations --noinput
+if errorlevel 1 goto failed
+python manage.py migrate --noinput
+if errorlevel 1 goto failed
+deactivate
+
+rem Remove virtual environment (or the link to the shared one, which must not be removed recursively) if this is a
+rem production build
+if not "%~4" == "True" goto :eof
+if defined PTD_SHARED_ENV (
+    rmdir site_env > nul 2> nul
+) else (
+    rmdir /Q /S site_env > nul 2> nul
+)
+goto :eof
+
+:failed
+deactivate
+exit /b 1
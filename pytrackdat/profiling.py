@@ -0,0 +1,197 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Phase timing for the command-line tools, enabled with --profile[=FILE] or the PTD_PROFILE environment variable.
+
+import cProfile
+import os
+import subprocess
+import sys
+import time
+
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+__all__ = [
+    "PROFILE_ENV_VAR",
+    "PHASE_MARKER_ENV_VAR",
+    "PHASE_MARKER",
+    "Phase",
+    "PhaseTimer",
+    "timer_from_args",
+    "run_script",
+]
+
+
+PROFILE_ENV_VAR = "PTD_PROFILE"
+
+# Set for the OS scripts when profiling, so that they print a marker line at the start of each phase.
+PHASE_MARKER_ENV_VAR = "PTD_PHASE_MARKERS"
+PHASE_MARKER = "##ptd-phase "
+
+
+class Phase:
+    def __init__(self, name: str, seconds: float = 0.0, items: Optional[int] = None, unit: str = "rows"):
+        self.name = name
+        self.seconds = seconds
+        self.items = items  # Number of items (e.g. rows) processed, for reporting throughput
+        self.unit = unit
+
+
+class PhaseTimer:
+    """
+    Records the wall time (and optionally, throughput) of the named phases of a
+    command. When disabled, phases cost next to nothing, so commands can always
+    be instrumented. If a dump path is given, the command is also run under
+    cProfile and its statistics are written there (for use with pstats.)
+    """
+
+    def __init__(self, command: str, enabled: bool = False, dump_path: Optional[str] = None):
+        self.command = command
+        self.enabled = enabled or dump_path is not None
+        self.dump_path = dump_path
+        self.phases = []  # type: List[Phase]
+
+        self._start = time.perf_counter()
+        self._profiler = None  # type: Optional[cProfile.Profile]
+
+        if dump_path is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @contextmanager
+    def phase(self, name: str, unit: str = "rows") -> Iterator[Phase]:
+        p = Phase(name, unit=unit)
+        if self.enabled:
+            # Added when started, so that phases are reported before those nested in them.
+            self.phases.append(p)
+
+        start = time.perf_counter()
+        try:
+            yield p
+        finally:
+            p.seconds = time.perf_counter() - start
+
+    def record(self, name: str, seconds: float):
+        if self.enabled:
+            self.phases.append(Phase(name, seconds))
+
+    def report(self):
+        """
+        Prints the time taken by each phase and the peak memory use, and writes the cProfile dump if requested.
+        """
+
+        if not self.enabled:
+            return
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.dump_path)
+
+        total = time.perf_counter() - self._start
+
+        print("\n================ PROFILE: {} ================".format(self.command))
+        for p in self.phases:
+            print("    {:<36} {:>9.3f}s {:>6.1%}{}".format(
+                p.name, p.seconds, p.seconds / total if total > 0 else 0,
+                "  {:>12,.0f} {}/s".format(p.items / p.seconds, p.unit) if p.items and p.seconds > 0 else ""))
+        print("    {:<36} {:>9.3f}s".format("total", total))
+
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux, but in bytes on macOS.
+            scale = 1 if sys.platform == "darwin" else 1024
+            print("    Peak RSS: {:.1f} MB (largest subprocess: {:.1f} MB)".format(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1024 / 1024))
+
+        if self.dump_path is not None:
+            print("    Wrote cProfile statistics to '{}'".format(self.dump_path))
+
+        print()
+
+
+def timer_from_args(command: str, args: Sequence[str]) -> Tuple[List[str], PhaseTimer]:
+    """
+    Removes --profile or --profile=FILE from command-line arguments and returns the remaining arguments, along with a
+    timer which is enabled by the option or by PTD_PROFILE (set to 1/true/yes, or to a FILE). FILE is where cProfile
+    statistics are written.
+    """
+
+    enabled = False
+    dump_path = None
+    remaining = []
+
+    env_value = os.environ.get(PROFILE_ENV_VAR, "").strip()
+    if env_value.lower() in ("1", "true", "yes"):
+        enabled = True
+    elif env_value.lower() not in ("", "0", "false", "no"):
+        dump_path = env_value
+
+    for arg in args:
+        if arg == "--profile":
+            enabled = True
+        elif arg.startswith("--profile="):
+            dump_path = arg[len("--profile="):]
+        else:
+            remaining.append(arg)
+
+    return remaining, PhaseTimer(command, enabled, dump_path)
+
+
+def run_script(args: Sequence[str], timer: PhaseTimer, name: str):
+    """
+    Runs an OS script (raising CalledProcessError if it fails), timing it as one phase. When profiling, the phases
+    the script marks are timed separately, and its output is passed through otherwise unchanged.
+    """
+
+    if not timer.enabled:
+        subprocess.run(args, check=True)
+        return
+
+    env = dict(os.environ)
+    env[PHASE_MARKER_ENV_VAR] = "1"
+
+    with timer.phase(name):
+        current_phase, phase_start = None, time.perf_counter()
+
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, env=env, universal_newlines=True, bufsize=1)
+        for line in process.stdout:
+            if line.startswith(PHASE_MARKER):
+                now = time.perf_counter()
+                if current_phase is not None:
+                    timer.record("{}: {}".format(name, current_phase), now - phase_start)
+                current_phase, phase_start = line[len(PHASE_MARKER):].strip(), now
+                continue
+
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+        return_code = process.wait()
+
+        if current_phase is not None:
+            timer.record("{}: {}".format(name, current_phase), time.perf_counter() - phase_start)
+
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, args)
@@ -0,0 +1,445 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Memory-mapped CSV reading, with record boundaries found without parsing well-quoted files, transparent decompression
+# of compressed CSV files, and streaming of Excel workbook sheets. Also copied into generated sites, so only the
+# standard library may be used, apart from optional packages.
+
+import array
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import mmap
+import os
+import re
+
+from datetime import datetime
+from typing import Any, BinaryIO, Iterator, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+__all__ = [
+    "COMPRESSION_FORMATS",
+    "detect_compression",
+    "detect_file_compression",
+    "open_decompressed",
+    "open_text",
+    "WORKBOOK_EXTENSIONS",
+    "split_sheet_path",
+    "is_workbook_path",
+    "workbook_value_to_str",
+    "iter_workbook_rows",
+    "MappedCSVFile",
+]
+
+
+# Compression format: leading "magic" bytes
+COMPRESSION_FORMATS = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+
+
+# Excel workbooks; a sheet is selected by adding "#Sheet Name" to the file name.
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm")
+SHEET_SEPARATOR = "#"
+
+
+# Files are read, and checked for well-formed quoting, in blocks of about this many bytes.
+BLOCK_BYTES = 1024 * 1024
+
+# A well-formed CSV record, in which every quote character is part of a quoted value: values are either quoted (with
+# doubled quotes inside, and possibly line breaks) or contain no quotes at all.
+_CSV_VALUE = rb'(?:"[^"]*(?:""[^"]*)*"|[^",\r\n]*)'
+_CSV_RECORD = _CSV_VALUE + rb'(?:,' + _CSV_VALUE + rb')*'
+RE_WELL_QUOTED_RECORDS = re.compile(rb'(?:' + _CSV_RECORD + rb'(?:\r\n|\r|\n))*')
+RE_WELL_QUOTED_RECORD = re.compile(_CSV_RECORD + rb'(?:\r\n|\r|\n|\Z)')
+
+# One line of a file, including its line break (if any.)
+RE_LINE = re.compile(rb'[^\r\n]*(?:\r\n|\r|\n)')
+
+UTF_8_BOM = b"\xef\xbb\xbf"
+
+
+def detect_compression(f: BinaryIO) -> Optional[str]:
+    """
+    Returns the compression format of a seekable binary file from its first bytes, or None if it is not compressed.
+    The file is left at its start.
+    """
+
+    f.seek(0)
+    magic = f.read(max(len(m) for m in COMPRESSION_FORMATS.values()))
+    f.seek(0)
+
+    return next((c for c, m in COMPRESSION_FORMATS.items() if magic.startswith(m)), None)
+
+
+def detect_file_compression(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        return detect_compression(f)
+
+
+def open_decompressed(f: BinaryIO) -> BinaryIO:
+    """
+    Wraps a seekable binary file so that reading it streams its decompressed contents, if it is compressed.
+    """
+
+    compression = detect_compression(f)
+
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="rb")
+
+    if compression == "bz2":
+        return bz2.BZ2File(f, mode="rb")
+
+    if compression == "xz":
+        return lzma.LZMAFile(f, mode="rb")
+
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Reading Zstandard-compressed files requires the zstandard package")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True))
+
+    return f
+
+
+def open_text(path: str, encoding: str = "utf-8-sig") -> io.TextIOWrapper:
+    """
+    Opens a (possibly compressed) file for reading in text mode.
+    """
+    return io.TextIOWrapper(open_decompressed(open(path, "rb")), encoding=encoding)
+
+
+def split_sheet_path(path: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits a path like "book.xlsx#Sheet 1" into the workbook's path and the sheet name, which is None if no sheet is
+    given. Other paths are returned as they are, with no sheet.
+    """
+
+    base, separator, sheet = path.rpartition(SHEET_SEPARATOR)
+    if separator and base.lower().endswith(WORKBOOK_EXTENSIONS):
+        return base, sheet or None
+    return path, None
+
+
+def is_workbook_path(path: str) -> bool:
+    return split_sheet_path(path)[0].lower().endswith(WORKBOOK_EXTENSIONS)
+
+
+def workbook_value_to_str(v: Any) -> str:
+    """
+    Formats a workbook cell value the way it would be written to a CSV file.
+    """
+
+    if v is None:
+        return ""
+
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+
+    if isinstance(v, datetime):
+        return v.date().isoformat() if v.time() == datetime.min.time() else v.isoformat(" ")
+
+    if hasattr(v, "isoformat"):  # Dates and times
+        return v.isoformat()
+
+    return str(v)
+
+
+def iter_workbook_rows(f: Union[str, BinaryIO], sheet: Optional[str] = None) -> Iterator[List[str]]:
+    """
+    Streams the rows of a workbook sheet (the first one, if no sheet name is given) as lists of strings. The workbook is
+    opened in read-only mode, so only the row being read is kept in memory. f is either a path, which may include a
+    sheet name (see split_sheet_path), or a seekable binary file.
+    """
+
+    if openpyxl is None:
+        raise ValueError("Reading Excel workbooks requires the openpyxl package")
+
+    if isinstance(f, str):
+        f, path_sheet = split_sheet_path(f)
+        sheet = sheet if sheet is not None else path_sheet
+
+    wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+
+    try:
+        if sheet is None:
+            ws = wb.worksheets[0]
+        else:
+            # File names are lowercased by ptd-analyze, so sheet names are matched regardless of case if need be.
+            name = sheet if sheet in wb.sheetnames else next(
+                (n for n in wb.sheetnames if n.lower() == sheet.lower()), None)
+            if name is None:
+                raise ValueError("Workbook has no sheet named '{}' (sheets: {})".format(
+                    sheet, ", ".join(wb.sheetnames)))
+            ws = wb[name]
+
+        for row in ws.iter_rows(values_only=True):
+            yield [workbook_value_to_str(v) for v in row]
+
+    finally:
+        wb.close()
+
+
+class _MappedRange(io.BufferedIOBase):
+    """
+    Binary reader over the bytes in [start, end) of a memory map, returning slices of the map as they are read.
+    """
+
+    def __init__(self, mm: mmap.mmap, start: int, end: int):
+        super().__init__()
+        self._mm = mm
+        self._pos = start
+        self._end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, n: Optional[int] = -1) -> bytes:
+        n = self._end - self._pos if n is None or n < 0 else max(min(n, self._end - self._pos), 0)
+        data = self._mm[self._pos:self._pos + n]
+        self._pos += n
+        return data
+
+    read1 = read
+
+
+class MappedCSVFile:
+    """
+    CSV file mapped into memory, which can be read one byte range at a time,
+    split into byte ranges on record boundaries (for instance, one per worker
+    process), or indexed for random access to rows. Rows are read the same way
+    as by csv.reader over the file opened in text mode.
+
+    Line breaks inside quoted values are not record boundaries. Where every
+    quote character is part of a quoted value (which is checked first), doubled
+    quotes inside quoted values come in pairs, so a line break ends a record
+    exactly when an even number of quote characters precede it, and boundaries
+    can be found by counting quotes rather than parsing every value. A stray
+    quote in an unquoted value (like 5" long), which csv.reader reads as it is,
+    breaks this count; files with one are split and indexed by parsing them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self.size = os.fstat(self._f.fileno()).st_size
+
+        # Empty files cannot be mapped.
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else None
+        self._row_offsets = None  # type: Optional[array.array]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._f.close()
+
+    def __enter__(self) -> "MappedCSVFile":
+        return self
+
+    def __exit__(self, *_args):
+        self.close()
+
+    def _quotes(self, start: int, end: int) -> int:
+        return sum(self._mm[p:min(p + BLOCK_BYTES, end)].count(b'"') for p in range(start, end, BLOCK_BYTES))
+
+    def is_well_quoted(self, start: int = 0, end: Optional[int] = None) -> bool:
+        """
+        Whether the bytes in [start, end), which must begin at a record boundary, are a sequence of records in which
+        every quote character is part of a quoted value, so that record boundaries can be found by counting quotes.
+        """
+
+        end = self.size if end is None else end
+
+        if start == 0 and self._mm is not None and self._mm[:len(UTF_8_BOM)] == UTF_8_BOM:
+            start = len(UTF_8_BOM)
+
+        while start < end:
+            # Whole records in the next block; a record which is cut off by the end of the block is checked on its own.
+            pos = RE_WELL_QUOTED_RECORDS.match(self._mm, start, min(start + BLOCK_BYTES, end)).end()
+            if pos == start:
+                m = RE_WELL_QUOTED_RECORD.match(self._mm, start, end)
+                if m is None or m.end() == start:
+                    return False
+                pos = m.end()
+            start = pos
+
+        return True
+
+    def _boundary_after(self, boundary: int, pos: int) -> int:
+        """
+        Returns the first record boundary at or after pos, given an earlier record boundary. The bytes between them
+        must be well-quoted (see is_well_quoted.)
+        """
+
+        if pos <= boundary:
+            return boundary
+
+        quotes = self._quotes(boundary, pos)
+        if quotes % 2 == 0 and self._mm[pos - 1:pos] == b"\n":
+            return pos
+
+        while pos < self.size:
+            nl = self._mm.find(b"\n", pos)
+            if nl == -1:
+                break
+
+            quotes += self._mm[pos:nl].count(b'"')
+            pos = nl + 1
+            if quotes % 2 == 0:
+                return pos
+
+        return self.size
+
+    def _record_offsets(self, start: int = 0) -> Iterator[int]:
+        """
+        Yields the offset of every record from start, which must be a record boundary, followed by the offset of the
+        end of the last one. Records are found by parsing lines with csv.reader, which only reads as many lines as the
+        record it returns spans.
+        """
+
+        end = [start]
+
+        def lines() -> Iterator[str]:
+            for m in RE_LINE.finditer(self._mm, start, self.size):
+                end[0] = m.end()
+                yield m.group().decode("utf-8-sig" if m.start() == 0 else "utf-8")
+
+            if end[0] < self.size:  # Last line, without a line break
+                line_start, end[0] = end[0], self.size
+                yield self._mm[line_start:].decode("utf-8-sig" if line_start == 0 else "utf-8")
+
+        if self._mm is None:
+            yield 0
+            return
+
+        offset = start
+        # Line breaks are translated as they are when the file is opened in text mode.
+        for _ in csv.reader((line.replace("\r\n", "\n").replace("\r", "\n") for line in lines()), delimiter=","):
+            yield offset
+            offset = end[0]
+
+        yield offset
+
+    def is_record_boundary(self, start: int, pos: int) -> bool:
+        """
+        Whether pos is a record boundary (the end of a record ending with a line break), given an earlier record
+        boundary start.
+        """
+
+        if pos <= start:
+            return pos == start
+        if self._mm[pos - 1:pos] not in (b"\n", b"\r"):
+            return False
+        if self.is_well_quoted(start, pos):
+            return True
+
+        for offset in self._record_offsets(start):
+            if offset >= pos:
+                return offset == pos
+
+        return False
+
+    @property
+    def header_end(self) -> int:
+        """
+        Offset of the first record after the header.
+        """
+        offsets = self._record_offsets()
+        next(offsets)
+        return next(offsets, self.size)
+
+    def split(self, n: int, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        Splits [start, end), which must begin at a record boundary, into up to n non-empty byte ranges of about equal
+        size, each starting and ending on record boundaries. Ranges which are not well-quoted (see is_well_quoted) are
+        not split.
+        """
+
+        end = self.size if end is None else end
+
+        if n > 1 and not self.is_well_quoted(start, end):
+            return [(start, end)]
+
+        bounds = [start]
+
+        for i in range(1, n):
+            boundary = min(self._boundary_after(bounds[-1], start + (end - start) * i // n), end)
+            if boundary > bounds[-1]:
+                bounds.append(boundary)
+
+        if end > bounds[-1] or len(bounds) == 1:
+            bounds.append(end)
+
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def iter_rows(self, start: int = 0, end: Optional[int] = None) -> Iterator[List[str]]:
+        """
+        Parses the rows in [start, end), which must begin and end on record boundaries, as one stream. If start is 0,
+        the header row is included.
+        """
+
+        end = self.size if end is None else end
+        if start >= end:
+            return
+
+        # A byte order mark can only appear at the start of the file.
+        with io.TextIOWrapper(_MappedRange(self._mm, start, end), encoding="utf-8-sig" if start == 0 else "utf-8") \
+                as text:
+            yield from csv.reader(text, delimiter=",")
+
+    def row_offsets(self) -> array.array:
+        """
+        Returns the offset of every record in the file (including the header), indexing the file on first use.
+        """
+
+        if self._row_offsets is None:
+            self._row_offsets = array.array("Q", self._record_offsets())
+            self._row_offsets.pop()  # End of the last record
+
+        return self._row_offsets
+
+    def __len__(self) -> int:
+        return len(self.row_offsets())
+
+    def __getitem__(self, i: int) -> List[str]:
+        """
+        Returns the i-th row of the file (row 0 being the header.)
+        """
+
+        offsets = self.row_offsets()
+        i = range(len(offsets))[i]
+        end = offsets[i + 1] if i + 1 < len(offsets) else self.size
+        return next(self.iter_rows(offsets[i], end), [])
@@ -0,0 +1,161 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+# Fixed-memory summaries used by the approximate analysis mode.
+
+import hashlib
+import math
+import random
+
+from typing import Any, List
+
+
+__all__ = [
+    "stable_hash",
+    "HyperLogLog",
+    "BloomFilter",
+    "ReservoirSample",
+]
+
+
+def stable_hash(v: str) -> int:
+    """
+    64-bit hash of a string which, unlike hash(), is the same in every process.
+    """
+    return int.from_bytes(hashlib.blake2b(v.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added to it, using 2^precision one-byte registers.
+    """
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, h: int):
+        index = h & (len(self.registers) - 1)
+        rest = h >> self.precision
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precisions")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros > 0:
+            # Small range correction (linear counting)
+            return m * math.log(m / zeros)
+
+        return raw
+
+
+class BloomFilter:
+    """
+    Set membership filter with no false negatives. add() reports whether the value
+    may already have been present; the number of such hits that were false positives
+    is estimated as values are added, from how full the filter was at the time.
+    """
+
+    def __init__(self, size_bits: int = 1 << 22, num_hashes: int = 5):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((size_bits + 7) // 8)
+        self.bits_set = 0
+
+        self.hits = 0
+        self.expected_false_positives = 0.0
+
+    def _positions(self, h: int):
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        return ((h1 + i * h2) % self.size_bits for i in range(self.num_hashes))
+
+    def __contains__(self, h: int) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(h))
+
+    def add(self, h: int) -> bool:
+        self.expected_false_positives += (self.bits_set / self.size_bits) ** self.num_hashes
+
+        present = True
+        for p in self._positions(h):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                self.bits_set += 1
+                present = False
+
+        if present:
+            self.hits += 1
+
+        return present
+
+    def consistent_with_unique(self) -> bool:
+        """
+        Whether the hits seen so far can be explained by false positives alone.
+        """
+        e = self.expected_false_positives
+        return self.hits == 0 or self.hits <= e + 3 * math.sqrt(e)
+
+
+class ReservoirSample:
+    """
+    Uniform random sample of up to `size` items from a stream of unknown length.
+    Uses Algorithm L, which draws the position of the next item to keep instead of
+    a random number per item. The generator is seeded, so the same input always
+    yields the same sample.
+    """
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.seen = 0
+        self.items = []  # type: List[Any]
+
+        self._random = random.Random(seed)
+        self._w = 1.0
+        self._next = size
+
+    def _skip(self):
+        self._w *= math.exp(math.log(self._random.random() or 1e-300) / self.size)
+        self._next += int(math.log(self._random.random() or 1e-300) / math.log(1 - self._w)) + 1
+
+    def add(self, item):
+        self.seen += 1
+
+        if self.seen <= self.size:
+            self.items.append(item)
+            if self.seen == self.size:
+                self._skip()
+
+        elif self.seen == self._next:
+            self.items[self._random.randrange(self.size)] = item
+            self._skip()
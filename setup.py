@@ -34,7 +34,10 @@ setup(
     entry_points={
         "console_scripts": ["ptd-analyze=pytrackdat.analysis:main",
                             "ptd-generate=pytrackdat.generation:main",
-                            "ptd-test=pytrackdat.test_site:main"]
+                            "ptd-generate-many=pytrackdat.generation.many:main",
+                            "ptd-schema=pytrackdat.generation.schema:main",
+                            "ptd-test=pytrackdat.test_site:main",
+                            "ptd-wheelhouse=pytrackdat.generation.environments:main"]
     },
 
     test_suite="tests"
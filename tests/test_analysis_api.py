@@ -0,0 +1,116 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from contextlib import redirect_stdout
+from unittest import mock
+
+import pytrackdat.analysis as pa
+
+
+RELATIONS = (("site", "./example/data/sites.csv"), ("specimen", "./example/data/specimens.csv"))
+
+
+def read_rows(rf):
+    with open(rf, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.reader(f)
+
+
+class TestAnalysisAPI(unittest.TestCase):
+    def test_rows_match_files(self):
+        file_analyses = pa.analyze_files(RELATIONS)
+        self.assertListEqual(list(file_analyses), ["site", "specimen"])
+
+        keys = {}
+        for rn, rf in RELATIONS:
+            rows = read_rows(rf)
+            analysis = pa.analyze_rows(rn, next(rows), rows, keys=keys)
+            if analysis.key is not None:
+                keys[rn] = analysis.key
+
+            self.assertEqual(analysis.fields, file_analyses[rn].fields)
+            self.assertListEqual(analysis.inferences, file_analyses[rn].inferences)
+            self.assertListEqual(analysis.design_file_rows(), file_analyses[rn].design_file_rows())
+
+        self.assertEqual(file_analyses["site"].key[0], "site_name")
+        self.assertEqual(file_analyses["specimen"].inferences[3]["foreign_key_target"], "site")
+
+    def test_second_pass_reuses_profiles(self):
+        # Reference: pass 2 run on profiles from a fresh read of each file, as if the file were read again.
+        relation_profiles = pa.profile_relations(RELATIONS)
+        keys = {}
+        for rn, _ in RELATIONS:
+            key = pa.find_relation_key(rn, *relation_profiles[rn])
+            if key is not None:
+                keys[rn] = key
+
+        key_index = pa.KeyIndex(keys)
+        expected_rows = []
+        for rn, rf in RELATIONS:
+            expected_rows.extend(pa.infer_relation_types(rn, *pa.profile_relation_file(rf), keys,
+                                                         key_index).design_file_rows())
+
+        directory = tempfile.mkdtemp()
+        try:
+            design_file = os.path.join(directory, "design.csv")
+            argv = ["ptd-analyze", design_file, *(v for relation in RELATIONS for v in relation)]
+
+            with mock.patch("sys.argv", argv), \
+                    mock.patch.object(pa, "read_relation_file_rows", wraps=pa.read_relation_file_rows) as reads, \
+                    redirect_stdout(io.StringIO()):
+                pa.main()
+
+            # Each file is read once, by the first pass.
+            self.assertListEqual(sorted(c[0][0] for c in reads.call_args_list), sorted(rf for _, rf in RELATIONS))
+
+            with open(design_file, "r", newline="") as df:
+                design_rows = list(csv.reader(df))
+
+            max_length = max(len(r) for r in expected_rows)
+            self.assertListEqual(design_rows, [[str(v) for v in r] + [""] * (max_length - len(r))
+                                               for r in expected_rows])
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_non_string_values(self):
+        analysis = pa.analyze_rows("measurement", ("ID", "Count", "Note"),
+                                   ((i, i % 3 if i % 5 else None, "note {}".format(i)) for i in range(1, 101)))
+
+        self.assertEqual(analysis.key[0], "id")
+        self.assertListEqual(analysis.names, ["id", "count", "note"])
+        self.assertEqual(analysis.inferences[1]["detected_type"], "integer")
+        self.assertTrue(analysis.inferences[1]["nullable"])
+        self.assertEqual(analysis.profiles[0].total, 100)
+
+    def test_errors(self):
+        with self.assertRaises(pa.AnalysisError):
+            pa.analyze_rows("empty", (), iter(()))
+
+        with self.assertRaises(pa.AnalysisError):
+            pa.analyze_files((("site", RELATIONS[0][1]), ("site", RELATIONS[1][1])))
+
+        with self.assertRaises(pa.AnalysisError):
+            pa.analyze_rows("site", ("a",), iter(()), sample_size=0)
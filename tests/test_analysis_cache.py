@@ -0,0 +1,91 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytrackdat.analysis as pa
+
+from pytrackdat.analysis_cache import AnalysisCache
+
+
+with open("./example/data/specimens.csv", "r", encoding="utf-8-sig") as sf:
+    SPECIMEN_LINES = sf.readlines()
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.directory, "specimens.csv")
+        self.cache_file = os.path.join(self.directory, "cache.pkl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, lines, mode="w"):
+        with open(self.data_file, mode) as df:
+            df.writelines(lines)
+
+    def profile(self, jobs=1):
+        cache = AnalysisCache.load(self.cache_file)
+        profiles = pa.profile_relations((("specimen", self.data_file),), jobs=jobs, cache=cache)
+        cache.save()
+        fields, profiles = profiles["specimen"]
+        return [pa.infer_column_type_from_profile("specimen", f, p) for f, p in zip(fields, profiles)]
+
+    def test_appended_rows_resume_from_cache(self):
+        self.write(SPECIMEN_LINES[:50])
+        self.profile()
+
+        self.write(SPECIMEN_LINES[50:], "a")
+        self.assertEqual(AnalysisCache.load(self.cache_file).resume_point(self.data_file)[0],
+                         len("".join(SPECIMEN_LINES[:50]).encode("utf-8")))
+        shutil.copy(self.cache_file, self.cache_file + ".bak")
+
+        fields, profiles = pa.profile_relation_file(self.data_file)
+        expected = [pa.infer_column_type_from_profile("specimen", f, p) for f, p in zip(fields, profiles)]
+
+        self.assertListEqual(self.profile(), expected)
+        shutil.copy(self.cache_file + ".bak", self.cache_file)
+        self.assertListEqual(self.profile(jobs=3), expected)
+
+    def test_stale_cache_ignored(self):
+        self.write(SPECIMEN_LINES[:50])
+
+        # Caches referring to a class or a module which no longer exists are profiled again.
+        for stale in (b"cpytrackdat.analysis\nNoSuchProfile\n.", b"cpytrackdat.no_such_module\nColumnProfile\n."):
+            with open(self.cache_file, "wb") as cf:
+                cf.write(stale)
+
+            self.assertDictEqual(AnalysisCache.load(self.cache_file).entries, {})
+            self.assertEqual(len(self.profile()), len(SPECIMEN_LINES[0].split(",")))
+
+    def test_cache_invalidation(self):
+        # A partially written last row cannot be resumed from
+        self.write(SPECIMEN_LINES[:50] + [SPECIMEN_LINES[50].rstrip("\n")])
+        self.profile()
+        self.write(["\n"] + SPECIMEN_LINES[51:], "a")
+        self.assertEqual(AnalysisCache.load(self.cache_file).resume_point(self.data_file)[0], 0)
+
+        # Neither can a file which was changed rather than appended to
+        self.profile()
+        self.write(SPECIMEN_LINES[:1] + SPECIMEN_LINES[2:])
+        self.assertEqual(AnalysisCache.load(self.cache_file).resume_point(self.data_file)[0], 0)
@@ -19,6 +19,8 @@
 
 import unittest
 
+from unittest import mock
+
 import pytrackdat.analysis as pa
 
 
@@ -43,7 +45,11 @@ class TestAnalysisInference(unittest.TestCase):
             "max_length": -1,
             "is_key": True,
             "include_alternate": False,
-            "max_seen_decimals": -1
+            "foreign_key_target": None,
+
+            "max_seen_decimals": -1,
+            "min_value": 1,
+            "max_value": 20,
         })
 
     def test_unique_int_inference_with_existing_key(self):
@@ -56,7 +62,11 @@ class TestAnalysisInference(unittest.TestCase):
             "max_length": -1,
             "is_key": False,
             "include_alternate": False,
-            "max_seen_decimals": -1
+            "foreign_key_target": None,
+
+            "max_seen_decimals": -1,
+            "min_value": 1,
+            "max_value": 20,
         })
 
     def test_nullable_int(self):
@@ -69,7 +79,11 @@ class TestAnalysisInference(unittest.TestCase):
             "max_length": -1,
             "is_key": False,
             "include_alternate": False,
-            "max_seen_decimals": -1
+            "foreign_key_target": None,
+
+            "max_seen_decimals": -1,
+            "min_value": 1,
+            "max_value": 20,
         })
 
     def test_repeated_int(self):
@@ -82,7 +96,11 @@ class TestAnalysisInference(unittest.TestCase):
             "max_length": -1,
             "is_key": False,
             "include_alternate": False,
-            "max_seen_decimals": -1
+            "foreign_key_target": None,
+
+            "max_seen_decimals": -1,
+            "min_value": 999,
+            "max_value": 999,
         })
 
     def test_consistent_decimal(self):
@@ -92,10 +110,14 @@ class TestAnalysisInference(unittest.TestCase):
             "nullable": False,
             "null_values": (),
             "choices": (),
-            "max_length": 11,  # 4 digits + decimal point + 2 digits after decimal + (constant 4) TODO: good formula?
+            "max_length": 6,  # 2 digits before decimal point + 2 digits of headroom + 2 digits after
             "is_key": False,
             "include_alternate": False,
-            "max_seen_decimals": 2
+            "foreign_key_target": None,
+
+            "max_seen_decimals": 2,
+            "min_value": None,
+            "max_value": None,
         })
 
     def test_mix_of_ints_and_decimals(self):
@@ -105,8 +127,173 @@ class TestAnalysisInference(unittest.TestCase):
             "nullable": False,
             "null_values": (),
             "choices": (),
-            "max_length": 12,  # 4 digits + decimal point + 3 digits after decimal + (constant 4) TODO: good formula?
+            "max_length": 6,  # 1 digit before decimal point + 2 digits of headroom + 3 digits after
             "is_key": False,
             "include_alternate": False,
-            "max_seen_decimals": 3
+            "foreign_key_target": None,
+
+            "max_seen_decimals": 3,
+            "min_value": 1,
+            "max_value": 2,
         })
+
+    def test_decimal_precision_is_capped(self):
+        for values in (["0.123456789012345", "1.5"], ["1e-300", "1.5"]):
+            inference = pa.infer_column_type("rel", "test", values, EXISTING_KEY)
+            self.assertEqual(inference["detected_type"], "decimal")
+            self.assertEqual(inference["max_seen_decimals"], pa.MAX_DECIMAL_PLACES)
+            self.assertEqual(inference["max_length"], 1 + pa.DECIMAL_HEADROOM_DIGITS + pa.MAX_DECIMAL_PLACES)
+
+        # Values with more digits before the decimal point than a decimal field allows get a float field
+        self.assertEqual(pa.infer_column_type("rel", "test", ["1e300", "1.5"], EXISTING_KEY)["detected_type"], "float")
+
+    def test_streamed_profile_matches_column_inference(self):
+        fields, profiles = pa.profile_relation_file("./example/data/specimens.csv")
+        data, data_fields = pa.extract_data_from_relation_file("./example/data/specimens.csv")
+
+        self.assertEqual(fields, data_fields)
+        for i, (f, profile) in enumerate(zip(fields, profiles)):
+            self.assertDictEqual(
+                pa.infer_column_type_from_profile("rel", f, profile, EXISTING_KEY),
+                pa.infer_column_type("rel", f, tuple(d[i] for d in data), EXISTING_KEY))
+
+    def test_settled_profile_matches_unsettled_profile(self):
+        values = ["word {}".format(i) for i in range(20)] + ["123456", "-2.125", "1,000,000", "3.5e4", "0.0001", "7"]
+        values = values * 3
+
+        def profile_values():
+            profile = pa.ColumnProfile()
+            for v in values:
+                profile.add(v)
+                profile.flush()  # One value at a time, so that the type settles before the numbers are seen
+            return profile
+
+        settled = profile_values()
+        with mock.patch.object(pa.ColumnProfile, "_type_is_settled", return_value=False):
+            unsettled = profile_values()
+
+        self.assertTrue(settled.type_settled)
+        self.assertFalse(unsettled.type_settled)
+        self.assertEqual((settled.max_seen_decimals, settled.max_integer_digits),
+                         (unsettled.max_seen_decimals, unsettled.max_integer_digits))
+        for key in (None, EXISTING_KEY):
+            self.assertDictEqual(pa.infer_column_type_from_profile("rel", "field", settled, key),
+                                 pa.infer_column_type_from_profile("rel", "field", unsettled, key))
+
+    def test_profile_forgets_non_key_values(self):
+        profile = pa.ColumnProfile()
+        for v in REPEATED_INT_LIST * 10:
+            profile.add(v)
+        profile.flush()
+
+        self.assertEqual(profile.total, 200)
+        self.assertIsNone(profile.unique_values)
+        self.assertDictEqual(profile.value_counts, {"999": 200})
+
+    def test_settled_profile_still_counts_integers(self):
+        profile = pa.ColumnProfile()
+        for i in range(40):
+            profile.add("word {}".format(i % 20))
+        profile.flush()
+
+        self.assertTrue(profile.type_settled)
+        self.assertEqual(pa.infer_column_type_from_profile("rel", "field", profile)["detected_type"], "text")
+
+        # Only the share of integers can still change the outcome
+        for i in range(1, 101):
+            profile.add(str(i))
+        profile.add("2020-01-01")
+        inference = pa.infer_column_type_from_profile("rel", "field", profile)
+        self.assertEqual(profile.total, 141)
+        self.assertEqual(inference["detected_type"], "integer")
+        self.assertTrue(inference["include_alternate"])
+        values = ["word {}".format(i % 20) for i in range(40)] + [str(i) for i in range(1, 101)] + ["2020-01-01"]
+        self.assertEqual(inference, pa.infer_column_type("rel", "field", values))
+
+    def test_parallel_profiles_match_sequential(self):
+        relations = (("specimen", "./example/data/specimens.csv"), ("site", "./example/data/sites.csv"))
+
+        for sample_size in (None, 20):
+            sequential = pa.profile_relations(relations, sample_size)
+            # Split files into as many row ranges or column groups as possible
+            with mock.patch.object(pa, "MIN_BYTES_PER_JOB", 1), mock.patch.object(pa, "MIN_COLUMNS_PER_JOB", 1):
+                parallel = pa.profile_relations(relations, sample_size, jobs=6)
+
+            self.assertListEqual(list(sequential), list(parallel))
+            for rn, (fields, profiles) in sequential.items():
+                self.assertEqual(fields, parallel[rn][0])
+                self.assertEqual(len(profiles), len(parallel[rn][1]))
+                for f, p1, p2 in zip(fields, profiles, parallel[rn][1]):
+                    self.assertDictEqual(pa.infer_column_type_from_profile(rn, f, p1),
+                                         pa.infer_column_type_from_profile(rn, f, p2))
+
+    @unittest.skipIf(pa.np is None, "NumPy is not installed")
+    def test_columnar_profiles_match_row_profiles(self):
+        fields, profiles = pa.profile_relation_file("./example/data/specimens.csv")
+        columnar_fields, columnar_profiles = pa.profile_relation_file("./example/data/specimens.csv", columnar=True)
+
+        self.assertEqual(fields, columnar_fields)
+        for f, p1, p2 in zip(fields, profiles, columnar_profiles):
+            self.assertDictEqual(pa.infer_column_type_from_profile("rel", f, p1),
+                                 pa.infer_column_type_from_profile("rel", f, p2))
+
+        # Rows are skipped as blank by looking at all of their values, including any past the header's fields
+        rows = [["1", " a"], ["", "", "extra"], [" ", ""], ["2"], ["3", "b", ""]]
+        profiles = pa.profile_rows((list(d) for d in rows), 2)
+        columnar_profiles = pa.profile_rows((list(d) for d in rows), 2, columnar=True)
+        for f, p1, p2 in zip(("number", "letter"), profiles, columnar_profiles):
+            self.assertDictEqual(pa.infer_column_type_from_profile("rel", f, p1),
+                                 pa.infer_column_type_from_profile("rel", f, p2))
+            self.assertEqual(p1.total, 4)
+            self.assertEqual(p2.total, 4)
+
+    def test_foreign_key_inference(self):
+        keys = {
+            "site": ("site_name", {"Site {}".format(i) for i in range(10)}),
+            "tag": ("tag_id", set(UNIQUE_INT_LIST)),
+        }
+        key_index = pa.KeyIndex(keys)
+
+        inference = pa.infer_column_type("specimen", "site", ["Site 1", "Site 2", "Site 2", ""], keys, key_index)
+        self.assertEqual(inference["detected_type"], "foreign key")
+        self.assertEqual(inference["foreign_key_target"], "site")
+        self.assertTrue(inference["nullable"])
+
+        inference = pa.infer_column_type("specimen", "site", ["Site 1", "Site 20"], keys, key_index)
+        self.assertEqual(inference["detected_type"], "text")
+        self.assertIsNone(inference["foreign_key_target"])
+
+        # Integer columns only reference integer keys if the names match
+        self.assertEqual(pa.infer_column_type("specimen", "count", REPEATED_INT_LIST[:1] + ["3"], keys,
+                                              key_index)["detected_type"], "integer")
+        self.assertEqual(pa.infer_column_type("specimen", "tag", ["1", "3"], keys,
+                                              key_index)["foreign_key_target"], "tag")
+        self.assertEqual(pa.infer_column_type("specimen", "tag_id", ["1", "3"], keys,
+                                              key_index)["foreign_key_target"], "tag")
+        self.assertIsNone(pa.infer_column_type("specimen", "vintage", ["1", "3"], keys,
+                                               key_index)["foreign_key_target"])
+        self.assertIsNone(pa.infer_column_type("specimen", "tags_count", ["1", "3"], keys,
+                                               key_index)["foreign_key_target"])
+
+        # Neither do other columns with values which happen to be in a key, e.g. booleans, short codes or dates
+        other_keys = {
+            "answer": ("answer", {"yes", "no", "maybe"}),
+            "grade": ("grade", {"A", "B", "F", "M"}),
+            "survey": ("survey_date", {"2020-01-01", "2020-02-01"}),
+        }
+        other_key_index = pa.KeyIndex(other_keys)
+        for name, values in (("released", ["yes", "no"]), ("sex", ["F", "M"]), ("date", ["2020-01-01"])):
+            self.assertIsNone(pa.infer_column_type("specimen", name, values, other_keys,
+                                                   other_key_index)["foreign_key_target"])
+        self.assertEqual(pa.infer_column_type("specimen", "grade", ["F", "M"], other_keys,
+                                              other_key_index)["foreign_key_target"], "grade")
+
+        # Values too long for a key cannot refer to one
+        profile = pa.ColumnProfile()
+        for v in ("Site 1", "x" * (pa.MAX_KEY_VALUE_LENGTH + 1)):
+            profile.add(v)
+        profile.flush()
+        self.assertIsNone(profile.reference_values)
+
+        # A relation's key does not reference itself
+        self.assertListEqual(key_index.find_references("site", ["Site 1"]), [])
@@ -18,6 +18,7 @@
 #     David Lougheed (david.lougheed@gmail.com)
 
 import io
+import pickle
 import unittest
 
 from contextlib import redirect_stdout
@@ -63,6 +64,33 @@ class TestCommonMethods(unittest.TestCase):
         for b, a in cases:
             self.assertEqual(to_relation_name(b), a)
 
+    def test_relation_records(self):
+        field = RelationField(csv_names=("Site",), name="site", data_type=DT_TEXT, nullable=False, null_values=(),
+                              default="", description="", show_in_table=True, additional_fields=("a; b",))
+
+        with self.assertRaises(AttributeError):
+            field.choices = ("a", "b")
+
+        field_with_choices = field.with_choices(("a", "b"))
+        self.assertIsNone(field.choices)
+        self.assertEqual(field_with_choices.choices, ("a", "b"))
+        self.assertDictEqual(dict(pickle.loads(pickle.dumps(field_with_choices))), dict(field_with_choices))
+
+        lf = io.StringIO()
+        with redirect_stdout(lf):
+            relation = Relation(" Study Localities ", [field], "integer")
+            names = (relation.name, relation.name, relation.name_lower)
+
+        # The plural warning is only printed when the relation is created
+        self.assertEqual(lf.getvalue().count("Warning"), 1)
+        self.assertEqual(names, (PDT_RELATION_PREFIX + "StudyLocality",) * 2 + ("study_localities",))
+        self.assertEqual(relation.fields, (field,))
+
+        with self.assertRaises(AttributeError):
+            relation.design_name = "Site"
+
+        self.assertDictEqual(dict(pickle.loads(pickle.dumps(relation))), dict(relation))
+
     def test_license_printing(self):
         lf = io.StringIO()
         with redirect_stdout(lf):
@@ -0,0 +1,107 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import unittest
+
+import pytrackdat.analysis as pa
+
+from pytrackdat.dependencies import DependencyFinder, sample_dependencies
+
+
+SITES = {
+    "Mont Royal": ("45.5048", "-73.5874", "Summit trail"),
+    "Gault": ("45.5433", "-73.1522", "Lake shore"),
+    "Morgan": ("45.4293", "-73.9496", "Lake shore"),
+}
+
+HEADER = ("Specimen ID", "Site Name", "Latitude", "Longitude", "Site Comments", "Mass", "Project")
+
+
+def denormalized_rows(n: int):
+    names = sorted(SITES)
+    for i in range(n):
+        site = names[(i * 7) % len(names)]
+        yield ["S{}".format(i), site, *SITES[site], "{}.{}".format(i % 5 + 1, i % 10), "P1"]
+
+
+class TestDependencies(unittest.TestCase):
+    def test_sample_dependencies(self):
+        rows = list(denormalized_rows(30))
+        self.assertDictEqual(sample_dependencies(rows, len(HEADER)), {
+            1: [2, 3, 4, 6],  # The site determines its own fields; anything determines a constant
+            2: [1, 3, 4, 6],
+            3: [1, 2, 4, 6],
+            4: [6],
+            5: [6],
+        })
+
+    def test_rows_after_sample_checked(self):
+        rows = list(denormalized_rows(30))
+        # Beyond the sample, a site's comments change: they no longer depend on the site.
+        rows.append(["S30", "Gault", "45.5433", "-73.1522", "Beaver dam", "2.5", "P1"])
+
+        finder = DependencyFinder(len(HEADER), sample_rows=12)
+        for row in rows:
+            finder.add(row)
+
+        # The mass only repeats twice in the first 12 rows, but repeats over all of them.
+        self.assertDictEqual(finder.dependencies(), {1: [2, 3, 6], 2: [1, 3, 6], 3: [1, 2, 6], 4: [6], 5: [6]})
+
+        # A determinant which never repeats is still not reported.
+        finder = DependencyFinder(len(HEADER), sample_rows=12)
+        for row in rows[:15]:
+            finder.add(row)
+        self.assertNotIn(5, finder.dependencies())
+
+    def test_unique_columns_not_tracked(self):
+        # Columns with a distinct value in every sampled row, like the specimen ID and the mass in the first 10
+        # rows, determine everything there; they are not tracked as candidates over the remaining rows.
+        finder = DependencyFinder(len(HEADER), sample_rows=10)
+        for row in denormalized_rows(30):
+            finder.add(row)
+
+        self.assertListEqual(sorted(c.column for c in finder._candidates), [1, 2, 3, 4])
+        self.assertNotIn(5, finder.dependencies())
+
+    def test_propose_relation_splits(self):
+        analysis = pa.analyze_rows("specimen", HEADER, denormalized_rows(60))
+        dependencies = sample_dependencies(list(denormalized_rows(60)), len(HEADER))
+
+        taken_names = {"specimen"}
+        splits = pa.propose_relation_splits(analysis, dependencies, taken_names)
+        self.assertListEqual(splits, [("site", 1, [2, 3, 4])])
+        self.assertSetEqual(taken_names, {"specimen", "site"})
+
+        rows = analysis.design_file_rows()
+        self.assertListEqual([r[:3] for r in rows if r], [
+            ["specimen", "new field name", "data type"],
+            ["Specimen ID", "specimen_id", "manual key"],
+            ["Site Name", "site_name", "foreign key"],
+            ["Mass", "mass", "decimal"],
+            ["Project", "project", "text"],
+            ["site", "new field name", "data type"],
+            ["Site Name", "site_name", "manual key"],
+            ["Latitude", "latitude", "decimal"],
+            ["Longitude", "longitude", "decimal"],
+            ["Site Comments", "site_comments", "text"],
+        ])
+        self.assertEqual(rows[2][8], "site")
+        # Rows of the new relation repeat once per specimen, so its key merges identical repeats on import.
+        self.assertEqual(rows[7][8], pa.KEY_REPEATS_MERGE)
+        self.assertEqual(rows[1][8:], [])
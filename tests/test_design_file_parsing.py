@@ -17,9 +17,13 @@
 # Contact information:
 #     David Lougheed (david.lougheed@gmail.com)
 
+import os
+import shutil
+import tempfile
 import unittest
 
-from pytrackdat.generation import design_to_relations
+from pytrackdat.common import VERSION, choice_codes, is_coded_text_field, merges_repeated_keys, parse_choices
+from pytrackdat.generation import create_models, design_to_relations, formatters, load_design, schema
 from pytrackdat.generation.errors import GenerationError
 
 
@@ -43,3 +47,92 @@ class TestDesignFileParsing(unittest.TestCase):
             with open("./tests/design_files/point_field.csv") as tf:
                 # GIS mode is off, so an error should be raised.
                 design_to_relations(tf, False)
+
+    def test_coded_text_fields(self):
+        with open("./tests/design_files/coded_text.csv") as tf:
+            relation = design_to_relations(tf, False)[0]
+
+        self.assertTupleEqual(relation.fields[1].choices, ("F", "M", "U"))
+        self.assertTrue(is_coded_text_field(relation.fields[1].data_type, relation.fields[1].additional_fields))
+        self.assertFalse(is_coded_text_field(relation.fields[2].data_type, relation.fields[2].additional_fields))
+
+        self.assertEqual(
+            formatters.DJANGO_TYPE_FORMATTERS["text"](relation.fields[1]),
+            "models.PositiveSmallIntegerField(help_text='', blank=True, null=True, default=2, "
+            "choices=((1, 'F'), (2, 'M'), (3, 'U')))")
+
+        for design_file in ("coded_text_without_options.csv", "unknown_text_storage.csv"):
+            with self.assertRaises(GenerationError):
+                with open("./tests/design_files/{}".format(design_file)) as tf:
+                    design_to_relations(tf, False)
+
+    def test_unsigned_integer_fields(self):
+        with open("./tests/design_files/unsigned_integer.csv") as tf:
+            relation = design_to_relations(tf, False)[0]
+
+        self.assertEqual(formatters.DJANGO_TYPE_FORMATTERS["integer"](relation.fields[1]),
+                         "models.PositiveSmallIntegerField(help_text='', blank=False, null=False)")
+        self.assertEqual(formatters.DJANGO_TYPE_FORMATTERS["integer"](relation.fields[2]),
+                         "models.SmallIntegerField(help_text='', blank=False, null=False)")
+
+        for design_file in ("unsigned_integer_negative.csv", "unknown_integer_storage.csv"):
+            with self.assertRaises(GenerationError):
+                with open("./tests/design_files/{}".format(design_file)) as tf:
+                    design_to_relations(tf, False)
+
+    def test_key_repeats(self):
+        with open("./tests/design_files/merged_key.csv") as tf:
+            relation = design_to_relations(tf, False)[0]
+
+        self.assertTrue(merges_repeated_keys(relation.fields[0].data_type, relation.fields[0].additional_fields))
+
+        with self.assertRaises(GenerationError):
+            with open("./tests/design_files/unknown_key_repeats.csv") as tf:
+                design_to_relations(tf, False)
+
+    def test_coded_text_blank_option(self):
+        # ptd-analyze lists a blank option first for nullable fields; it must not take up a code.
+        with open("./tests/design_files/coded_text_blank_option.csv") as tf:
+            relation = design_to_relations(tf, False)[0]
+
+        with create_models([relation], False) as mf:
+            self.assertIn("choices=((1, 'F'), (2, 'M'))", mf.read())
+
+        # The site's importer codes values from the field's settings, as stored in the model.
+        additional_fields = [a.strip() for a in dict(relation.fields[1])["additional_fields"] if a.strip() != ""]
+        codes = dict((v, c) for c, v in choice_codes(parse_choices(additional_fields[1])))
+        self.assertDictEqual(codes, {"F": 1, "M": 2})
+        self.assertIsNone(codes.get(""))
+
+    def test_compiled_schema(self):
+        directory = tempfile.mkdtemp()
+        try:
+            design_file = os.path.join(directory, "design.csv")
+            schema_file = os.path.join(directory, "design.schema")
+            shutil.copy("./tests/design_files/coded_text.csv", design_file)
+
+            relations = load_design(design_file, False, schema_file)
+            compiled = schema.read_schema(schema_file)
+            self.assertTrue(compiled.matches(compiled.design_hash, False))
+            self.assertFalse(compiled.matches(compiled.design_hash, True))
+            self.assertListEqual([dict(r) for r in compiled.relations], [dict(r) for r in relations])
+
+            # Loaded from the schema while the design file is unchanged
+            schema.write_schema(schema_file, schema.CompiledSchema(compiled.design_hash, False, relations[:0]))
+            self.assertListEqual(load_design(design_file, False, schema_file), [])
+
+            # Compiled again by another version of PyTrackDat
+            schema.write_schema(schema_file, schema.CompiledSchema(compiled.design_hash, False, relations[:0], "0.0.1"))
+            self.assertListEqual([dict(r) for r in load_design(design_file, False, schema_file)],
+                                 [dict(r) for r in relations])
+            self.assertEqual(schema.read_schema(schema_file).version, VERSION)
+
+            # Compiled again once it changes
+            with open(design_file, "a") as df:
+                df.write("\n")
+            self.assertListEqual([dict(r) for r in load_design(design_file, False, schema_file)],
+                                 [dict(r) for r in relations])
+            self.assertNotEqual(schema.read_schema(schema_file).design_hash, compiled.design_hash)
+
+        finally:
+            shutil.rmtree(directory)
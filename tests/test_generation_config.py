@@ -0,0 +1,94 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytrackdat.generation.config import read_build_config
+from pytrackdat.generation.errors import GenerationError
+
+
+PACKAGE_DIR = "./pytrackdat"
+
+
+class TestGenerationConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.directory, "site.ini")
+
+        with open(os.path.join(self.directory, "admin_password"), "w") as pf:
+            pf.write("correct horse battery staple\n")
+        os.chmod(os.path.join(self.directory, "admin_password"), 0o600)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_config(self, contents: str):
+        with open(self.config_path, "w") as cf:
+            cf.write(contents)
+
+    def test_config_file(self):
+        self.write_config("[site]\nproduction = yes\nurl = example.org\n\n"
+                          "[admin]\nusername = admin\nemail = admin@example.org\npassword_file = admin_password\n")
+
+        config = read_build_config(self.config_path, PACKAGE_DIR, environ={})
+        self.assertTrue(config.is_production_build)
+        self.assertEqual(config.site_url, "example.org")
+        self.assertEqual(config.admin_username, "admin")
+        self.assertEqual(config.admin_email, "admin@example.org")
+        self.assertEqual(config.admin_password, "correct horse battery staple")
+        self.assertNotIn("staple", repr(config))
+
+    def test_environment(self):
+        self.write_config("[site]\nproduction = yes\nurl = example.org\n\n[admin]\nusername = admin\n")
+
+        config = read_build_config(self.config_path, PACKAGE_DIR, environ={
+            "PTD_PRODUCTION": "no",
+            "PTD_ADMIN_USERNAME": "ci",
+            "PTD_ADMIN_PASSWORD_FILE": os.path.join(self.directory, "admin_password"),
+        })
+        self.assertFalse(config.is_production_build)
+        self.assertEqual(config.site_url, "localhost")
+        self.assertEqual(config.admin_username, "ci")
+        self.assertEqual(config.admin_email, "")
+
+        config = read_build_config(None, PACKAGE_DIR, environ={
+            "PTD_ADMIN_USERNAME": "ci",
+            "PTD_ADMIN_PASSWORD_FILE": os.path.join(self.directory, "admin_password"),
+        })
+        self.assertFalse(config.is_production_build)
+
+    def test_invalid_config(self):
+        for contents in ("[site]\nproduction = maybe\n",
+                         "[site]\nproduction = yes\nurl = https://example.org\n",
+                         "[admin]\npassword_file = admin_password\n",
+                         "[admin]\nusername = admin\n",
+                         "[admin]\nusername = admin\npassword_file = missing\n",
+                         "production = yes\n"):
+            self.write_config(contents)
+            with self.assertRaises(GenerationError):
+                read_build_config(self.config_path, PACKAGE_DIR, environ={})
+
+        with open(os.path.join(self.directory, "admin_password"), "w") as pf:
+            pf.write("password\n")
+        self.write_config("[admin]\nusername = admin\npassword_file = admin_password\n")
+        with self.assertRaises(GenerationError):
+            read_build_config(self.config_path, PACKAGE_DIR, environ={})
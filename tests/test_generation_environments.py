@@ -0,0 +1,65 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytrackdat.generation import environments
+
+
+class TestGenerationEnvironments(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_environment_key(self):
+        files = environments.requirement_files("./pytrackdat", False)
+        gis_files = environments.requirement_files("./pytrackdat", True)
+
+        self.assertTrue(all(os.path.isfile(f) for f in gis_files))
+        self.assertEqual(environments.environment_key(files), environments.environment_key(files))
+        self.assertNotEqual(environments.environment_key(files), environments.environment_key(gis_files))
+
+        requirements = os.path.join(self.directory, "requirements.txt")
+        with open(requirements, "w") as rf:
+            rf.write("Django>=2.2.15,<3.0\n")
+        key = environments.environment_key([requirements])
+        with open(requirements, "a") as rf:
+            rf.write("six\n")
+        self.assertNotEqual(environments.environment_key([requirements]), key)
+
+    def test_offline_requirements(self):
+        requirements = os.path.join(self.directory, "requirements.txt")
+        with open(requirements, "w") as rf:
+            rf.write("# Site requirements\n"
+                     "-i https://pypi.org/simple\n"
+                     "Django>=2.2.15,<3.0  # LTS\n"
+                     "\n"
+                     "git+https://github.com/pytrackdat/pytrackdat_snapshot_manager.git\n"
+                     "git+https://example.org/repo.git@v1.0#egg=some-package\n")
+
+        self.assertListEqual(environments.offline_requirements([requirements]), [
+            "Django>=2.2.15,<3.0",
+            "pytrackdat_snapshot_manager",
+            "some-package",
+        ])
@@ -46,3 +46,40 @@ class TestGenerationFormatters(unittest.TestCase):
             pgf.auto_key_formatter(AUTO_KEY_FIELD),
             "models.AutoField(primary_key=True, help_text='test \\\\\\'auto\\\\\\' key')"
         )
+
+    def test_integer_field_types(self):
+        def integer_field(additional_fields, default=None):
+            return pc.RelationField(csv_names=("Count",), name="count", data_type="integer", nullable=False,
+                                    null_values=(), default=default, description="", show_in_table=True,
+                                    additional_fields=additional_fields)
+
+        # The most compact signed type which fits the range, widened by INTEGER_RANGE_HEADROOM
+        cases = [
+            ((), None, "IntegerField"),
+            (("0", "120"), None, "SmallIntegerField"),
+            (("-5", "120"), None, "SmallIntegerField"),
+            (("0", "120"), -5, "SmallIntegerField"),
+            (("0", "16000"), None, "SmallIntegerField"),
+            (("0", "20000"), None, "IntegerField"),
+            (("0", "40000"), None, "IntegerField"),
+            (("-1", "40000"), None, "IntegerField"),
+            (("1", "70000"), None, "IntegerField"),
+            (("-70000", "1"), None, "IntegerField"),
+            (("0", str(2 ** 31)), None, "BigIntegerField"),
+            (("0", str(2 ** 40)), None, "BigIntegerField"),
+            (("not", "numbers"), None, "IntegerField"),
+            # Positive types only when asked for
+            (("0", "120", "unsigned"), None, "PositiveSmallIntegerField"),
+            (("1", "70000", "Unsigned"), None, "PositiveIntegerField"),
+            (("0", str(2 ** 40), "unsigned"), None, "BigIntegerField"),
+        ]
+
+        for additional_fields, default, field_type in cases:
+            self.assertEqual(pgf.basic_number_formatter(integer_field(additional_fields, default)),
+                             "models.{}(help_text='', blank=False, null=False{})".format(
+                                 field_type, "" if default is None else ", default={}".format(default)))
+
+        self.assertEqual(pgf.basic_number_formatter(integer_field(("0", str(10 ** 20)))),
+                         "models.DecimalField(help_text='', blank=False, null=False, max_digits=21, decimal_places=0)")
+        self.assertEqual(pgf.basic_number_formatter(integer_field(("0", str(6 * 10 ** 20)))),
+                         "models.DecimalField(help_text='', blank=False, null=False, max_digits=22, decimal_places=0)")
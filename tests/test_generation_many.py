@@ -0,0 +1,64 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytrackdat.generation import many
+from pytrackdat.generation.errors import GenerationError
+
+
+class TestGenerationMany(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_manifest(self):
+        manifest = os.path.join(self.directory, "sites.csv")
+        with open(manifest, "w") as mf:
+            mf.write("# design file, site name, build configuration\n"
+                     "designs/a.csv, site_a\n"
+                     "\n"
+                     "designs/b.csv,site_b,configs/b.ini\n")
+
+        builds = many.read_manifest(manifest)
+        self.assertListEqual([(b.design_file, b.site_name, b.config_file) for b in builds], [
+            (os.path.join(self.directory, "designs/a.csv"), "site_a", None),
+            (os.path.join(self.directory, "designs/b.csv"), "site_b", os.path.join(self.directory, "configs/b.ini")),
+        ])
+
+        with open(manifest, "a") as mf:
+            mf.write("designs/c.csv\n")
+        with self.assertRaises(GenerationError):
+            many.read_manifest(manifest)
+
+    def test_failed_build_logged(self):
+        log_path = os.path.join(self.directory, "build.log")
+        status, _ = many.build_site(["--config", os.path.join(self.directory, "missing.ini"),
+                                     "--work-dir", os.path.join(self.directory, "tmp"),
+                                     "./tests/design_files/coded_text.csv", "site_a"], self.directory, log_path)
+
+        self.assertEqual(status, 1)
+        self.assertEqual(os.getcwd(), os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        with open(log_path) as lf:
+            self.assertIn("Build configuration file could not be read", lf.read())
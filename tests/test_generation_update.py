@@ -0,0 +1,101 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytrackdat.common import Relation, RelationField
+from pytrackdat.generation import design_to_relations, update
+
+
+class TestGenerationUpdate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_diff_relations(self):
+        with open("./tests/design_files/coded_text.csv") as tf:
+            relations = design_to_relations(tf, False)
+
+        self.assertListEqual(update.diff_relations(relations, relations), [])
+        self.assertListEqual(update.diff_relations([], relations), ["Added relation 'PyTrackDatSpecimen'"])
+        self.assertListEqual(update.diff_relations(relations, []), ["Removed relation 'PyTrackDatSpecimen'"])
+
+        relation = relations[0]
+        fields = list(relation.fields)
+        fields[1] = fields[1].with_choices(("F", "M"))
+        fields.append(RelationField(("Notes",), "notes", "text", False, (), "", "", False, ()))
+        changed = Relation(relation.design_name, fields[:1] + fields[2:], relation.id_type)
+
+        self.assertListEqual(update.diff_relations(relations, [changed]), [
+            "Removed field 'PyTrackDatSpecimen.{}'".format(relation.fields[1].name),
+            "Added field 'PyTrackDatSpecimen.notes'",
+        ])
+        self.assertListEqual(
+            update.diff_relations(relations, [Relation(relation.design_name, fields[:3], relation.id_type)]),
+            ["Changed field 'PyTrackDatSpecimen.{}'".format(relation.fields[1].name)])
+
+    def test_fields_needing_defaults(self):
+        with open("./tests/design_files/coded_text.csv") as tf:
+            relations = design_to_relations(tf, False)
+
+        relation = relations[0]
+        added = [
+            RelationField(("Notes",), "notes", "text", False, (), None, "", False, ()),
+            RelationField(("Count",), "count", "integer", False, (), None, "", False, ()),
+            RelationField(("Mass",), "mass", "float", True, (), None, "", False, ()),
+            RelationField(("Tags",), "tags", "integer", False, (), 0, "", False, ()),
+            RelationField(("Kind",), "kind", "text", False, (), None, "", False, ("1", "A; B")).with_choices(
+                ("A", "B")),
+        ]
+        changed = [Relation(relation.design_name, list(relation.fields) + added, relation.id_type)]
+
+        # Only non-nullable fields without a default, other than text fields which can be blank
+        self.assertListEqual(update.fields_needing_defaults(relations, changed),
+                             ["PyTrackDatSpecimen.count", "PyTrackDatSpecimen.kind"])
+        # New relations have no rows yet
+        self.assertListEqual(update.fields_needing_defaults([], changed), [])
+
+    def test_files_only_written_when_changed(self):
+        path = os.path.join(self.directory, "models.py")
+
+        self.assertTrue(update.write_if_changed(io.StringIO("a = 1\n"), path))
+        self.assertFalse(update.write_if_changed(io.StringIO("a = 1\n"), path))
+        self.assertTrue(update.write_if_changed(io.StringIO("a = 2\n"), path))
+
+        source = os.path.join(self.directory, "source")
+        os.makedirs(os.path.join(source, "templates", "__pycache__"))
+        for f in ("import_csv.py", os.path.join("templates", "form.html"), os.path.join("templates", "__pycache__",
+                                                                                          "x.pyc")):
+            with open(os.path.join(source, f), "w") as fh:
+                fh.write(f)
+
+        destination = os.path.join(self.directory, "core")
+        self.assertListEqual(sorted(update.refresh_tree(source, destination)),
+                             sorted(["import_csv.py", os.path.join("templates", "form.html")]))
+        self.assertListEqual(update.refresh_tree(source, destination), [])
+
+        with open(os.path.join(source, "import_csv.py"), "a") as fh:
+            fh.write("\n")
+        self.assertListEqual(update.refresh_tree(source, destination), ["import_csv.py"])
@@ -0,0 +1,75 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import contextlib
+import io
+import os
+import subprocess
+import unittest
+
+from unittest import mock
+
+from pytrackdat.profiling import *
+
+
+class TestProfiling(unittest.TestCase):
+    def test_timer_from_args(self):
+        with mock.patch.dict(os.environ, {PROFILE_ENV_VAR: ""}):
+            args, timer = timer_from_args("ptd-test", ["site"])
+            self.assertListEqual(args, ["site"])
+            self.assertFalse(timer.enabled)
+
+            args, timer = timer_from_args("ptd-test", ["--profile", "site"])
+            self.assertListEqual(args, ["site"])
+            self.assertTrue(timer.enabled)
+            self.assertIsNone(timer.dump_path)
+
+        with mock.patch.dict(os.environ, {PROFILE_ENV_VAR: "true"}):
+            self.assertTrue(timer_from_args("ptd-test", ["site"])[1].enabled)
+
+    def test_phases(self):
+        timer = PhaseTimer("ptd-test", enabled=True)
+        with timer.phase("outer") as phase:
+            phase.items = 10
+            with timer.phase("inner"):
+                pass
+
+        self.assertListEqual([p.name for p in timer.phases], ["outer", "inner"])
+        self.assertEqual(timer.phases[0].items, 10)
+        self.assertGreaterEqual(timer.phases[0].seconds, timer.phases[1].seconds)
+
+        disabled = PhaseTimer("ptd-test")
+        with disabled.phase("outer"):
+            pass
+        self.assertListEqual(disabled.phases, [])
+
+    @unittest.skipIf(os.name == "nt", "Phase markers are tested with a POSIX shell")
+    def test_script_phase_markers(self):
+        script = 'echo "{m}one"; echo output; echo "{m}two"; exit $1'.format(m=PHASE_MARKER)
+        timer = PhaseTimer("ptd-test", enabled=True)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            run_script(("/bin/sh", "-c", script, "sh", "0"), timer, "script")
+
+        self.assertEqual(output.getvalue(), "output\n")
+        self.assertListEqual([p.name for p in timer.phases], ["script", "script: one", "script: two"])
+
+        with self.assertRaises(subprocess.CalledProcessError), contextlib.redirect_stdout(io.StringIO()):
+            run_script(("/bin/sh", "-c", script, "sh", "1"), timer, "script")
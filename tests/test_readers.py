@@ -0,0 +1,170 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import bz2
+import csv
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import date, datetime, time
+from unittest import mock
+
+import pytrackdat.analysis as pa
+import pytrackdat.readers as pr
+
+from pytrackdat.analysis_cache import ends_at_record_boundary
+
+
+# Quoted values with line breaks and doubled quotes, CRLF line endings and a byte order mark
+MULTI_LINE_CSV = "﻿ID,Collector(s),Notes\r\n" + "".join(
+    '{i},"Smith, J.\r\nDoe, ""Jay"" {i}",note {i}\r\n{j},Lee,"line\nbreak"\r\n'.format(i=i, j=i + 1000)
+    for i in range(200))
+
+
+class TestReaders(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_file = os.path.join(self.directory, "data.csv")
+        with open(self.data_file, "w", encoding="utf-8", newline="") as df:
+            df.write(MULTI_LINE_CSV)
+
+        with open(self.data_file, "r", encoding="utf-8-sig") as df:
+            self.expected_rows = list(csv.reader(df))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rows_match_csv_reader(self):
+        with pr.MappedCSVFile(self.data_file) as mf:
+            self.assertListEqual(list(mf.iter_rows()), self.expected_rows)
+            self.assertEqual(len(mf), len(self.expected_rows))
+            self.assertListEqual(mf[1], self.expected_rows[1])
+            self.assertListEqual(mf[-1], self.expected_rows[-1])
+
+        with mock.patch.object(pr, "BLOCK_BYTES", 7):
+            with pr.MappedCSVFile(self.data_file) as mf:
+                self.assertListEqual(list(mf.iter_rows()), self.expected_rows)
+
+    def test_split_on_record_boundaries(self):
+        with pr.MappedCSVFile(self.data_file) as mf:
+            for n in (1, 2, 7, 1000):
+                ranges = mf.split(n, mf.header_end)
+                self.assertLessEqual(len(ranges), n)
+                self.assertEqual(ranges[0][0], mf.header_end)
+                self.assertEqual(ranges[-1][1], mf.size)
+
+                rows = []
+                for start, end in ranges:
+                    self.assertIn(start, mf.row_offsets())
+                    rows.extend(mf.iter_rows(start, end))
+                self.assertListEqual(rows, self.expected_rows[1:])
+
+    def test_stray_quote(self):
+        # A quote in an unquoted value is read as it is by csv.reader, so it cannot be counted to find the end of the
+        # quoted values with line breaks after it, which span the boundaries of several blocks.
+        with open(self.data_file, "w", encoding="utf-8", newline="") as df:
+            df.write("id,notes,n\n0,5\" long,0\n")
+            for i in range(1, 60000):
+                df.write('{0},"multi\nline {0}",{0}\n'.format(i) if i % 100 == 0 else "{0},plain {0},{0}\n".format(i))
+
+        with open(self.data_file, "r", encoding="utf-8-sig") as df:
+            expected_rows = list(csv.reader(df))
+
+        with pr.MappedCSVFile(self.data_file) as mf:
+            self.assertGreater(mf.size, pr.BLOCK_BYTES)
+            self.assertFalse(mf.is_well_quoted())
+
+            self.assertListEqual(list(mf.iter_rows()), expected_rows)
+            self.assertEqual(len(mf), len(expected_rows))
+            self.assertListEqual(mf[34901], expected_rows[34901])
+
+            ranges = mf.split(4, mf.header_end)
+            self.assertListEqual([r for start, end in ranges for r in mf.iter_rows(start, end)], expected_rows[1:])
+
+            start = mf.row_offsets()[34901]  # Of a row with a line break in a quoted value
+            self.assertTrue(ends_at_record_boundary(self.data_file, mf.header_end, start))
+            self.assertFalse(ends_at_record_boundary(self.data_file, mf.header_end, mf._mm.find(b"\n", start) + 1))
+
+        with mock.patch.object(pa, "MIN_BYTES_PER_JOB", 1):
+            profiles = {jobs: pa.profile_relations((("rel", self.data_file),), jobs=jobs)["rel"] for jobs in (1, 4)}
+        for fields, profile in profiles.values():
+            self.assertTupleEqual(fields, tuple(expected_rows[0]))
+            profile[0].flush()
+            self.assertEqual(profile[0].total, len(expected_rows) - 1)
+
+    def test_empty_file(self):
+        open(self.data_file, "w").close()
+        with pr.MappedCSVFile(self.data_file) as mf:
+            self.assertListEqual(list(mf.iter_rows()), [])
+            self.assertEqual(len(mf), 0)
+
+    def test_compressed_files(self):
+        data, fields = pa.extract_data_from_relation_file(self.data_file)
+
+        with open(self.data_file, "rb") as df:
+            contents = df.read()
+
+        for compression, compress in (("gzip", gzip.compress), ("bz2", bz2.compress), ("xz", lzma.compress)):
+            compressed_file = "{}.{}".format(self.data_file, compression)
+            with open(compressed_file, "wb") as cf:
+                cf.write(compress(contents))
+
+            self.assertEqual(pr.detect_file_compression(compressed_file), compression)
+            self.assertTupleEqual(pa.extract_data_from_relation_file(compressed_file), (data, fields))
+
+            with mock.patch.object(pa, "MIN_BYTES_PER_JOB", 1):
+                profile = pa.profile_relations((("rel", compressed_file),), jobs=2)["rel"][1][0]
+            profile.flush()
+            self.assertEqual(profile.total, len(data))
+
+        self.assertIsNone(pr.detect_file_compression(self.data_file))
+
+    @unittest.skipIf(pr.openpyxl is None, "openpyxl is not installed")
+    def test_workbook_sheets(self):
+        workbook_file = os.path.join(self.directory, "data.xlsx")
+
+        wb = pr.openpyxl.Workbook(write_only=True)
+        wb.create_sheet("Notes").append(["Unrelated"])
+        ws = wb.create_sheet("Sample Data")
+        for row in self.expected_rows:
+            ws.append([int(v) if v.isdigit() else v for v in row])
+        ws.append([1, 2.5, 3.0, True, None, date(2020, 3, 1), datetime(2020, 3, 1, 12, 30), time(9, 15)])
+        wb.save(workbook_file)
+
+        self.assertTrue(pr.is_workbook_path(workbook_file + "#Sample Data"))
+        self.assertTupleEqual(pr.split_sheet_path(workbook_file + "#Sample Data"), (workbook_file, "Sample Data"))
+        self.assertTupleEqual(pr.split_sheet_path(self.data_file + "#x"), (self.data_file + "#x", None))
+
+        rows = list(pr.iter_workbook_rows(workbook_file + "#sample data"))
+        self.assertListEqual(rows[:-1], self.expected_rows)
+        self.assertListEqual(rows[-1], ["1", "2.5", "3", "TRUE", "", "2020-03-01", "2020-03-01 12:30:00", "09:15:00"])
+
+        # The first sheet is read by default
+        self.assertListEqual(list(pr.iter_workbook_rows(workbook_file)), [["Unrelated"]])
+
+        data, fields = pa.extract_data_from_relation_file(workbook_file + "#Sample Data")
+        self.assertTupleEqual(fields, tuple(self.expected_rows[0]))
+        self.assertEqual(len(data), len(self.expected_rows))
+
+        with self.assertRaises(pa.AnalysisError):
+            pa.extract_data_from_relation_file(workbook_file + "#Missing")
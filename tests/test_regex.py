@@ -49,3 +49,20 @@ class TestRegex(unittest.TestCase):
         for i in VALID_HUMAN_INTEGERS:
             self.assertRegex(i, pc.RE_DECIMAL_HUMAN)
             self.assertRegex(i.replace(",", " "), pc.RE_DECIMAL_HUMAN)
+
+    def test_value_classifier(self):
+        for i in VALID_INTEGERS:
+            self.assertEqual(pc.classify_value(i), (pc.VC_INTEGER, None))
+        for i in VALID_HUMAN_INTEGERS:
+            self.assertEqual(pc.classify_value(i), (pc.VC_INTEGER_HUMAN, None))
+        for i in VALID_DECIMALS + VALID_HUMAN_DECIMALS:
+            self.assertIn(pc.classify_value(i)[0], pc.VC_DECIMAL_CLASSES)
+
+        self.assertEqual(pc.classify_value("-1.23E10"), (pc.VC_FLOAT, None))
+        self.assertEqual(pc.classify_value("1,000.5"), (pc.VC_DECIMAL_HUMAN, None))
+        self.assertEqual(pc.classify_value("2019-01-31"), (pc.VC_DATE, 0))
+        self.assertEqual(pc.classify_value("31/01/2019"), (pc.VC_DATE, 3))
+        self.assertEqual(pc.classify_value("12:30:15"), (pc.VC_TIME, 1))
+
+        for v in ("", "abc", "1.2.3", "2019-01-31T00:00", "1:30"):
+            self.assertEqual(pc.classify_value(v), (pc.VC_OTHER, None))
@@ -0,0 +1,94 @@
+# PyTrackDat is a utility for assisting in online database creation.
+# Copyright (C) 2018-2020 the PyTrackDat authors.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Contact information:
+#     David Lougheed (david.lougheed@gmail.com)
+
+import functools
+import unittest
+
+from unittest import mock
+
+import pytrackdat.analysis as pa
+import pytrackdat.sketches as ps
+
+
+class TestSketches(unittest.TestCase):
+    def test_stable_hash(self):
+        self.assertEqual(ps.stable_hash("abc"), ps.stable_hash("abc"))
+        self.assertNotEqual(ps.stable_hash("abc"), ps.stable_hash("abd"))
+
+    def test_hyperloglog_estimate(self):
+        hll = ps.HyperLogLog()
+        for i in range(50000):
+            hll.add(ps.stable_hash(str(i % 20000)))
+        self.assertAlmostEqual(hll.estimate(), 20000, delta=20000 * 3 * hll.relative_error)
+
+    def test_bloom_filter_duplicates(self):
+        bf = ps.BloomFilter(size_bits=1 << 16)
+        for i in range(1000):
+            bf.add(ps.stable_hash(str(i)))
+        self.assertTrue(bf.consistent_with_unique())
+        for i in range(1000):
+            self.assertIn(ps.stable_hash(str(i)), bf)  # No false negatives
+        for i in range(100):
+            self.assertTrue(bf.add(ps.stable_hash(str(i))))
+        self.assertFalse(bf.consistent_with_unique())
+
+    def test_reservoir_sample(self):
+        sample = ps.ReservoirSample(100)
+        for i in range(10000):
+            sample.add(i)
+        self.assertEqual(sample.seen, 10000)
+        self.assertEqual(len(sample.items), 100)
+        self.assertEqual(len(set(sample.items)), 100)
+        self.assertGreater(max(sample.items), 5000)
+
+        small_sample = ps.ReservoirSample(100)
+        for i in range(10):
+            small_sample.add(i)
+        self.assertListEqual(small_sample.items, list(range(10)))
+
+    def test_sampled_relation_profile(self):
+        fields, profiles = pa.profile_relation_file("./example/data/specimens.csv", sample_size=20)
+        self.assertEqual(profiles[0].total, 20)
+        self.assertEqual(profiles[0].population, 100)
+        self.assertTrue(pa.infer_column_type_from_profile("specimen", "specimen_number", profiles[0])["is_key"])
+        self.assertIn("sample of 20 of 100 rows", pa.describe_sample(profiles[0]))
+
+        _, exact_profiles = pa.profile_relation_file("./example/data/specimens.csv", sample_size=1000)
+        self.assertIsNone(pa.describe_sample(exact_profiles[0]))
+
+    def test_saturated_bloom_filter_key(self):
+        # A few real duplicates past the first half of the rows, with a Bloom filter far too small for the column: the
+        # distinct value estimate is within its error of the row count, but the column must not be inferred as a key.
+        def rows(n):
+            for i in range(n):
+                yield [str(i - 1 if i > n // 2 and i % 200 == 0 else i), "x"]
+
+        with mock.patch.object(pa, "BloomFilter", functools.partial(ps.BloomFilter, size_bits=1 << 16)), \
+                mock.patch.object(pa, "MAX_EXACT_KEY_CHECK_VALUES", 1000):
+            analysis = pa.analyze_rows("measurement", ("ID", "Note"), rows(40000), sample_size=500)
+            exact_analysis = pa.analyze_rows("measurement", ("ID", "Note"), ([str(i), "x"] for i in range(500)),
+                                             sample_size=500)
+
+        self.assertIsNone(analysis.key)
+        self.assertNotEqual(analysis.inferences[0]["detected_type"], "manual key")
+        self.assertTrue(analysis.profiles[0].probable_key)
+        self.assertIn("probably a key", pa.describe_sample(analysis.profiles[0]))
+
+        # A sample of every row is exact, whatever the sketch says.
+        self.assertEqual(exact_analysis.key[0], "id")